@@ -4,7 +4,9 @@ Handles API_ID/API_HASH pair upload, listing, and management
 API pairs stored in data/api_pairs.json
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Body
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
 from typing import Dict, Any, List
 from pydantic import BaseModel
 from pathlib import Path
@@ -13,7 +15,11 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from api.admin_auth import require_admin
-from bot.api_pairs import load_api_pairs, save_api_pairs
+from bot.api_pairs import load_api_pairs, save_api_pairs, get_pair_registry, MAX_SESSIONS_PER_PAIR
+from bot.pair_balancer import (
+    get_pair_telemetry, score_pairs, plan_rebalance, apply_rebalance,
+    PAIR_STRATEGY, MAX_REBALANCE_MOVES,
+)
 
 router = APIRouter()
 
@@ -133,6 +139,9 @@ async def delete_api_pair(
         # Save
         save_api_pairs(pairs)
         
+        # Pair indexes after the deleted one shifted - recount usage
+        get_pair_registry().rebuild_usage()
+        
         return {
             "success": True,
             "message": f"API pair {api_id} deleted successfully"
@@ -146,3 +155,92 @@ async def delete_api_pair(
             detail=f"Failed to delete API pair: {str(e)}"
         )
 
+
+
+@router.get("/usage")
+async def get_api_pair_usage(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Live session count and free capacity per API pair
+    """
+    registry = get_pair_registry()
+    pairs = registry.get_pairs()
+    usage = registry.get_usage()
+    
+    return {
+        "success": True,
+        "max_sessions_per_pair": MAX_SESSIONS_PER_PAIR,
+        "pairs": [
+            {
+                "index": idx,
+                "api_id": pair.get("api_id"),
+                "sessions": usage.get(idx, 0),
+                "free": max(0, MAX_SESSIONS_PER_PAIR - usage.get(idx, 0))
+            }
+            for idx, pair in enumerate(pairs)
+        ],
+        "total_free": sum(max(0, MAX_SESSIONS_PER_PAIR - usage.get(idx, 0)) for idx in range(len(pairs)))
+    }
+
+
+@router.post("/usage/rebuild")
+async def rebuild_api_pair_usage(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Recount API pair usage from users.json (after manual edits)
+    """
+    usage = get_pair_registry().rebuild_usage()
+    return {
+        "success": True,
+        "usage": usage
+    }
+
+
+@router.get("/telemetry")
+async def get_api_pair_telemetry(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Live load per API pair (sessions, connections, requests/min, flood-wait rate) and balancer score
+    """
+    registry = get_pair_registry()
+    scored = score_pairs(registry.get_pairs(), registry.get_usage(), MAX_SESSIONS_PER_PAIR)
+    return {
+        "success": True,
+        "strategy": PAIR_STRATEGY,
+        "window_seconds": get_pair_telemetry().window,
+        "pairs": scored
+    }
+
+
+@router.get("/rebalance/plan")
+async def get_rebalance_plan(
+    max_moves: int = Query(MAX_REBALANCE_MOVES, ge=1, le=500),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Dry run: session moves that would even out API pair load (nothing is changed)
+    """
+    plan = await asyncio.to_thread(plan_rebalance, max_moves)
+    return {
+        "success": True,
+        **plan
+    }
+
+
+@router.post("/rebalance")
+async def rebalance_api_pairs(
+    max_moves: int = Query(MAX_REBALANCE_MOVES, ge=1, le=500),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Move sessions of users between cycles from the hottest API pairs to the coolest
+    Takes effect from each user's next cycle
+    """
+    result = await asyncio.to_thread(apply_rebalance, max_moves)
+    return {
+        "success": True,
+        **result
+    }
@@ -0,0 +1,72 @@
+"""
+Admin Event Log API
+Queries the structured forwarding event log (events/*.jsonl segments)
+"""
+
+import asyncio
+import time
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Dict, Any, Optional
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.admin_auth import require_admin
+from bot.event_log import get_event_log, EVENT_QUERY_MAX
+
+router = APIRouter()
+
+
+@router.get("/")
+async def query_events(
+    hours: float = Query(24, gt=0, description="Look back this many hours"),
+    user_id: Optional[str] = Query(None),
+    session: Optional[str] = Query(None),
+    group: Optional[str] = Query(None),
+    outcome: Optional[str] = Query(None, description="success | failure | error | failed (failure or error)"),
+    error_class: Optional[str] = Query(None, description="flood_wait | banned | group | account"),
+    limit: int = Query(500, ge=1, le=EVENT_QUERY_MAX),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Forwarding events matching the filters, newest first
+    Only segments whose index matches the time range / user / session / group are read
+    """
+    if outcome is not None and outcome not in ("success", "failure", "error", "failed"):
+        raise HTTPException(status_code=400, detail=f"Invalid outcome: {outcome}")
+
+    try:
+        result = await asyncio.to_thread(
+            get_event_log().query,
+            start=time.time() - hours * 3600,
+            user_id=user_id,
+            session_name=session,
+            group=group,
+            outcome=outcome,
+            error_class=error_class,
+            limit=limit
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to query events: {str(e)}"
+        )
+
+    return {
+        "success": True,
+        "count": len(result["events"]),
+        **result
+    }
+
+
+@router.get("/metrics")
+async def event_log_metrics(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Event writer throughput, dropped events and index size"""
+    return {
+        "success": True,
+        "event_log": get_event_log().get_metrics()
+    }
@@ -3,7 +3,10 @@ Admin Group File Management API
 Handles reading and writing to starter_groups.txt and enterprise_groups.txt
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Body, Query
+import asyncio
+import os
+
+from fastapi import APIRouter, HTTPException, Depends, Body, Query, Request
 from typing import Dict, Any, List
 from pathlib import Path
 
@@ -17,11 +20,19 @@ from bot.group_file_manager import (
     ensure_groups_dir,
     STARTER_GROUPS_FILE,
     ENTERPRISE_GROUPS_FILE,
-    parse_group_file
+    group_id_error,
+    apply_group_edit,
+    GroupBulkParser,
 )
+from bot.group_health import get_group_health
+from bot.group_metadata import get_group_metadata
+from bot.chatlist_import import start_chatlist_import, get_chatlist_job, list_chatlist_jobs
 
 router = APIRouter()
 
+# Largest accepted bulk upload (bytes)
+GROUP_BULK_MAX_BYTES = int(os.getenv("GROUP_BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+
 # Ensure directories exist
 ensure_groups_dir()
 
@@ -46,6 +57,10 @@ async def list_groups(
     try:
         groups = get_groups_for_plan(plan_type)
         
+        # Titles / forum topics / member counts from the metadata store (no Telegram calls)
+        metadata_store = get_group_metadata()
+        metadata = metadata_store.get_many(groups)
+        
         # Get file info
         file_path = STARTER_GROUPS_FILE if plan_type == "STARTER" else ENTERPRISE_GROUPS_FILE
         file_exists = file_path.exists()
@@ -58,7 +73,9 @@ async def list_groups(
             "count": len(groups),
             "file_path": str(file_path),
             "file_exists": file_exists,
-            "file_size": file_size
+            "file_size": file_size,
+            "metadata": metadata,
+            "metadata_summary": metadata_store.summary(groups)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read groups: {str(e)}")
@@ -94,6 +111,7 @@ async def update_groups(
         raise HTTPException(status_code=400, detail="action must be 'replace', 'add', or 'remove'")
     
     # Validate all groups are numeric IDs
+    cleaned = []
     for group in groups:
         if not isinstance(group, str):
             raise HTTPException(status_code=400, detail=f"Invalid group format: {group}. Must be string")
@@ -102,87 +120,79 @@ async def update_groups(
         if not group:
             raise HTTPException(status_code=400, detail="Groups cannot be empty strings")
         
-        # Must be -100xxxxx format (Telegram supergroup ID)
-        if not group.startswith('-100'):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid group ID: {group}. Must start with -100 (e.g., -1001234567890)"
-            )
-        
-        # Check that after -100, there are only digits
-        numeric_part = group[4:]  # Everything after -100
-        if not numeric_part or not numeric_part.isdigit():
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid group ID: {group}. Must be in format -100 followed by digits (e.g., -1001234567890)"
-            )
-        
-        # Ensure minimum length (at least -100 + some digits)
-        if len(group) < 7:  # -100 + at least 3 digits
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid group ID: {group}. Too short, must be at least -100xxx"
-            )
+        error = group_id_error(group)
+        if error:
+            raise HTTPException(status_code=400, detail=f"Invalid group ID: {group}. {error[0].upper()}{error[1:]}")
+        cleaned.append(group)
     
     try:
-        file_path = STARTER_GROUPS_FILE if plan_type == "STARTER" else ENTERPRISE_GROUPS_FILE
-        
-        # Get current groups
-        current_groups = []
-        if file_path.exists():
-            try:
-                current_groups = parse_group_file(file_path)
-            except Exception as e:
-                # If file is corrupted, start fresh
-                current_groups = []
-        
-        # Apply action
-        if action == "replace":
-            new_groups = groups
-        elif action == "add":
-            # Add groups, avoiding duplicates
-            new_groups = list(current_groups)
-            for group in groups:
-                if group not in new_groups:
-                    new_groups.append(group)
-        elif action == "remove":
-            # Remove groups
-            new_groups = [g for g in current_groups if g not in groups]
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_groups = []
-        for group in new_groups:
-            if group not in seen:
-                seen.add(group)
-                unique_groups.append(group)
-        
-        # Write to file
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            for group in unique_groups:
-                f.write(f"{group}\n")
-        
-        # Clear cache to force reload
-        group_cache = get_group_cache()
-        if plan_type == "STARTER":
-            group_cache.get_starter_groups(force_reload=True)
-        else:
-            group_cache.get_enterprise_groups(force_reload=True)
+        result = await asyncio.to_thread(apply_group_edit, plan_type, action, cleaned)
+        unique_groups = list(get_group_cache().get_snapshot(plan_type).groups)
         
         return {
             "success": True,
             "plan_type": plan_type,
+            "version": result["version"],
             "action": action,
             "groups": unique_groups,
             "count": len(unique_groups),
-            "added": len(groups) if action == "add" else None,
-            "removed": len([g for g in current_groups if g not in unique_groups]) if action == "remove" else None
+            "added": result["added"] if action == "add" else None,
+            "removed": result["removed"] if action == "remove" else None
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update groups: {str(e)}")
 
 
+@router.post("/bulk")
+async def bulk_update_groups(
+    request: Request,
+    plan_type: str = Query(default="STARTER", description="Plan type: STARTER or ENTERPRISE"),
+    action: str = Query(default="add", description="replace | add | remove"),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Bulk-edit a plan's group file from a streamed newline-delimited upload
+    (one group ID per line, blank lines and # comments ignored)
+    
+    The body is parsed as it arrives; the edit is only applied if every line is valid.
+    Returns counts and (up to MAX_REPORTED_ERRORS) errors - never the group list
+    """
+    if plan_type not in ["STARTER", "ENTERPRISE"]:
+        raise HTTPException(status_code=400, detail="plan_type must be 'STARTER' or 'ENTERPRISE'")
+    
+    if action not in ["replace", "add", "remove"]:
+        raise HTTPException(status_code=400, detail="action must be 'replace', 'add', or 'remove'")
+    
+    parser = GroupBulkParser()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > GROUP_BULK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {GROUP_BULK_MAX_BYTES} bytes")
+        parser.feed(chunk)
+    parser.close()
+    
+    summary = {
+        "plan_type": plan_type,
+        "action": action,
+        "lines": parser.lines,
+        "valid": len(parser.groups),
+        "duplicates": parser.duplicates,
+        "invalid": parser.invalid,
+        "errors": parser.errors,
+    }
+    
+    if parser.invalid:
+        return {"success": False, "applied": False, **summary}
+    
+    try:
+        result = await asyncio.to_thread(apply_group_edit, plan_type, action, parser.groups)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update groups: {str(e)}")
+    
+    return {"success": True, "applied": True, **summary, **result}
+
+
 @router.post("/validate")
 async def validate_groups(
     body: Dict[str, Any] = Body(...),
@@ -255,3 +265,155 @@ async def validate_groups(
         "invalid": invalid
     }
 
+
+@router.get("/health")
+async def group_health_report(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Global group health report (shared across all sessions and users)
+    
+    Returns:
+        Quarantined / suspect groups and the number of wasted RPCs avoided
+    """
+    return {
+        "success": True,
+        "report": get_group_health().get_report()
+    }
+
+
+@router.post("/health/release")
+async def release_group_health(
+    body: Dict[str, Any] = Body(...),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Clear a group's health record (admin override - group is retried by everyone)
+    
+    Body:
+        group_id: Group ID to release
+    """
+    group_id = body.get("group_id")
+    if not group_id or not isinstance(group_id, str):
+        raise HTTPException(status_code=400, detail="group_id is required")
+    
+    released = get_group_health().release(group_id.strip())
+    if not released:
+        raise HTTPException(status_code=404, detail=f"Group {group_id} has no health record")
+    
+    return {
+        "success": True,
+        "message": f"Group {group_id} released from group health index",
+        "group_id": group_id
+    }
+
+
+@router.get("/metadata")
+async def group_metadata_report(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Group metadata coverage per plan file (titles, forum topics, member counts)
+    """
+    store = get_group_metadata()
+    cache = get_group_cache()
+    return {
+        "success": True,
+        "plans": {
+            plan_type: store.summary(cache.get_snapshot(plan_type).groups)
+            for plan_type in ("STARTER", "ENTERPRISE")
+        },
+        "store": store.summary()
+    }
+
+
+@router.post("/metadata/refresh")
+async def refresh_group_metadata(
+    body: Dict[str, Any] = Body(default={}),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Mark group metadata stale so running sessions re-fetch it during their next cycles
+    
+    Body:
+        groups: Optional list of group IDs (default: all)
+    """
+    groups = body.get("groups")
+    if groups is not None and not isinstance(groups, list):
+        raise HTTPException(status_code=400, detail="groups must be an array")
+    
+    invalidated = get_group_metadata().invalidate(groups)
+    return {
+        "success": True,
+        "invalidated": invalidated
+    }
+
+
+@router.post("/chatlist-import")
+async def import_chatlists(
+    body: Dict[str, Any] = Body(...),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Extract groups from chatlist (folder) links into a plan's group file (runs in the background)
+    
+    Body:
+        links: List of chatlist links (https://t.me/addlist/...) or slugs
+        plan_type: "STARTER" | "ENTERPRISE"
+        action: "add" | "replace" (default: "add")
+        sessions: Optional session filenames to extract with (default: ready unused sessions)
+    
+    Returns:
+        Import job (poll GET /chatlist-import/{job_id} for progress)
+    """
+    links = body.get("links", [])
+    sessions = body.get("sessions")
+    if not isinstance(links, list) or not links:
+        raise HTTPException(status_code=400, detail="links must be a non-empty array")
+    if sessions is not None and not isinstance(sessions, list):
+        raise HTTPException(status_code=400, detail="sessions must be an array")
+    
+    try:
+        job = start_chatlist_import(
+            links,
+            body.get("plan_type", "STARTER"),
+            body.get("action", "add"),
+            sessions
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "success": True,
+        "job": job
+    }
+
+
+@router.get("/chatlist-import")
+async def list_chatlist_imports(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Recent chatlist import jobs
+    """
+    return {
+        "success": True,
+        "jobs": list_chatlist_jobs()
+    }
+
+
+@router.get("/chatlist-import/{job_id}")
+async def get_chatlist_import(
+    job_id: str,
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Progress and per-link results of a chatlist import job
+    """
+    job = get_chatlist_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Chatlist import {job_id} not found")
+    return {
+        "success": True,
+        "job": job
+    }
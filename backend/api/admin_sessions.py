@@ -5,23 +5,29 @@ Sessions stored in /sessions/unused, /sessions/assigned, /sessions/banned, /sess
 """
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Body
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List
 from pathlib import Path
-import shutil
 import sqlite3
 import zipfile
 import tempfile
 import asyncio
+import json
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from api.admin_auth import require_admin
 from bot.session_manager import (
-    UNUSED_DIR, ASSIGNED_DIR, BANNED_DIR, 
+    UNUSED_DIR, ASSIGNED_DIR,
     get_unused_sessions, get_banned_sessions, ensure_dirs,
-    assign_sessions_to_user, unassign_sessions_from_user
+    assign_sessions_to_user, unassign_sessions_from_user, assign_session_file,
+    SessionReservedError
 )
+from bot.session_inventory import get_session_inventory
+from bot.session_health import get_session_health_checker, summarize_health, HEALTH_CACHE_TTL
+from bot.session_validator import get_pool_readiness, get_last_validation_pass, validate_pool_once
+from bot.session_import import start_import, get_import_job, list_import_jobs
 
 # Import SESSIONS_BASE directly from session_manager module
 from bot import session_manager
@@ -32,56 +38,43 @@ router = APIRouter()
 # Ensure directories exist
 ensure_dirs()
 
-FROZEN_DIR = SESSIONS_BASE / "frozen"
-FROZEN_DIR.mkdir(parents=True, exist_ok=True)
-
 
 @router.get("/list")
 async def list_sessions(
     admin: dict = Depends(require_admin)
 ) -> Dict[str, Any]:
     """
-    List all sessions with file counts (source of truth from filesystem)
-    Returns physical file counts, not database counts
+    List all sessions with file counts
+    Served from the in-memory session inventory (reconciled against the filesystem)
     """
     ensure_dirs()
-    
-    # Count files in each directory (source of truth)
-    unused_count = len(list(UNUSED_DIR.glob("*.session")))
-    banned_count = len(list(BANNED_DIR.glob("*.session")))
-    frozen_count = len(list(FROZEN_DIR.glob("*.session")))
-    
-    # Count assigned sessions (in user subdirectories)
-    assigned_count = 0
+    inventory = get_session_inventory()
+    counts = inventory.counts()
+
     assigned_sessions = []
-    if ASSIGNED_DIR.exists():
-        for user_dir in ASSIGNED_DIR.iterdir():
-            if user_dir.is_dir():
-                user_sessions = list(user_dir.glob("*.session"))
-                assigned_count += len(user_sessions)
-                for session_file in user_sessions:
-                    assigned_sessions.append({
-                        "filename": session_file.name,
-                        "user_id": user_dir.name,
-                        "path": str(session_file)
-                    })
-    
-    total_count = unused_count + assigned_count + banned_count + frozen_count
-    
+    for filename, record in sorted(inventory.snapshot().items()):
+        if record["location"] == "assigned":
+            assigned_sessions.append({
+                "filename": filename,
+                "user_id": record["owner"],
+                "path": str(ASSIGNED_DIR / record["owner"] / filename)
+            })
+
     return {
         "success": True,
         "counts": {
-            "total": total_count,
-            "unused": unused_count,
-            "assigned": assigned_count,
-            "banned": banned_count,
-            "frozen": frozen_count,
+            "total": counts["total"],
+            "unused": counts["unused"],
+            "assigned": counts["assigned"],
+            "banned": counts["banned"],
+            "frozen": counts["frozen"],
         },
+        "unused_readiness": get_pool_readiness(),
         "sessions": {
-            "unused": sorted([f.name for f in UNUSED_DIR.glob("*.session")]),
+            "unused": sorted(inventory.in_location("unused")),
             "assigned": assigned_sessions,
-            "banned": sorted([f.name for f in BANNED_DIR.glob("*.session")]),
-            "frozen": sorted([f.name for f in FROZEN_DIR.glob("*.session")]),
+            "banned": sorted(inventory.in_location("banned")),
+            "frozen": sorted(inventory.in_location("frozen")),
         }
     }
 
@@ -107,35 +100,24 @@ async def assign_session(
     
     ensure_dirs()
     
-    # Check if file exists in unused
-    src = UNUSED_DIR / filename
-    if not src.exists():
-        raise HTTPException(status_code=404, detail=f"Session file {filename} not found in unused folder")
-    
-    # Move to assigned folder
-    user_dir = ASSIGNED_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    dst = user_dir / filename
-    
     try:
-        # Move session file
-        shutil.move(str(src), str(dst))
-        
-        # Move journal file if exists
-        journal_src = UNUSED_DIR / f"{filename}-journal"
-        journal_dst = user_dir / f"{filename}-journal"
-        if journal_src.exists():
-            shutil.move(str(journal_src), str(journal_dst))
-        
-        return {
-            "success": True,
-            "message": f"Session {filename} moved to assigned folder for user {user_id}",
-            "filename": filename,
-            "user_id": user_id,
-            "path": str(dst)
-        }
+        # Move session file (+ journal) and update the inventory
+        dst = assign_session_file(user_id, filename)
+    except SessionReservedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to move session file: {str(e)}")
+    
+    if dst is None:
+        raise HTTPException(status_code=404, detail=f"Session file {filename} not found in unused folder")
+    
+    return {
+        "success": True,
+        "message": f"Session {filename} moved to assigned folder for user {user_id}",
+        "filename": filename,
+        "user_id": user_id,
+        "path": str(dst)
+    }
 
 
 @router.post("/unassign")
@@ -159,42 +141,32 @@ async def unassign_session(
     
     ensure_dirs()
     
-    # Check if file exists in assigned folder
     user_dir = ASSIGNED_DIR / user_id
-    src = user_dir / filename
-    
-    if not src.exists():
-        raise HTTPException(status_code=404, detail=f"Session file {filename} not found in assigned folder for user {user_id}")
-    
-    # Move back to unused
     dst = UNUSED_DIR / filename
     
     try:
-        # Move session file
-        shutil.move(str(src), str(dst))
-        
-        # Move journal file if exists
-        journal_src = user_dir / f"{filename}-journal"
-        journal_dst = UNUSED_DIR / f"{filename}-journal"
-        if journal_src.exists():
-            shutil.move(str(journal_src), str(journal_dst))
-        
-        # Clean up empty user directory
-        try:
-            if user_dir.exists() and not any(user_dir.iterdir()):
-                user_dir.rmdir()
-        except:
-            pass  # Ignore errors when removing directory
-        
-        return {
-            "success": True,
-            "message": f"Session {filename} moved back to unused folder",
-            "filename": filename,
-            "user_id": user_id,
-            "path": str(dst)
-        }
+        # Move session file (+ journal) back to unused and update the inventory
+        moved = unassign_sessions_from_user(user_id, [filename])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to move session file: {str(e)}")
+    
+    if not moved:
+        raise HTTPException(status_code=404, detail=f"Session file {filename} not found in assigned folder for user {user_id}")
+    
+    # Clean up empty user directory
+    try:
+        if user_dir.exists() and not any(user_dir.iterdir()):
+            user_dir.rmdir()
+    except:
+        pass  # Ignore errors when removing directory
+    
+    return {
+        "success": True,
+        "message": f"Session {filename} moved back to unused folder",
+        "filename": filename,
+        "user_id": user_id,
+        "path": str(dst)
+    }
 
 
 @router.post("/verify")
@@ -216,8 +188,11 @@ async def verify_session(
     
     ensure_dirs()
     
-    # Check in unused
-    if (UNUSED_DIR / filename).exists():
+    # O(1) inventory lookup instead of probing every directory
+    record = get_session_inventory().get(filename)
+    location = record["location"] if record else None
+    
+    if location == "unused":
         return {
             "success": True,
             "valid": True,
@@ -226,38 +201,24 @@ async def verify_session(
             "filename": filename
         }
     
-    # Check in assigned
-    for user_dir in ASSIGNED_DIR.iterdir():
-        if user_dir.is_dir() and (user_dir / filename).exists():
-            return {
-                "success": True,
-                "valid": True,
-                "exists": True,
-                "location": "assigned",
-                "user_id": user_dir.name,
-                "filename": filename
-            }
-    
-    # Check in banned
-    if (BANNED_DIR / filename).exists():
+    if location == "assigned":
         return {
             "success": True,
-            "valid": False,
+            "valid": True,
             "exists": True,
-            "location": "banned",
-            "filename": filename,
-            "reason": "Session is banned"
+            "location": "assigned",
+            "user_id": record["owner"],
+            "filename": filename
         }
     
-    # Check in frozen
-    if (FROZEN_DIR / filename).exists():
+    if location in ("banned", "frozen"):
         return {
             "success": True,
             "valid": False,
             "exists": True,
-            "location": "frozen",
+            "location": location,
             "filename": filename,
-            "reason": "Session is frozen"
+            "reason": f"Session is {location}"
         }
     
     # Not found
@@ -275,10 +236,16 @@ async def verify_session(
 async def health_check_sessions(
     body: Dict[str, Any] = Body(...),
     admin: dict = Depends(require_admin)
-) -> Dict[str, Any]:
+):
     """
-    Check health status of sessions using Telegram spam bot
-    Returns: banned, unauthorized, active, frozen, limited
+    Check health status of sessions via @SpamBot (parallel, bounded per API pair)
+    Returns: active, limited, frozen, banned, unauthorized, unknown, failed per session
+    
+    Body:
+        session_filenames: Sessions to check
+        force: Re-probe even if a fresh cached result exists (default False)
+        max_age: Max cached result age in seconds (default SESSION_HEALTH_TTL)
+        stream: Return NDJSON, one line per session as each check completes (default False)
     """
     session_filenames = body.get("session_filenames", [])
     
@@ -289,46 +256,132 @@ async def health_check_sessions(
             "message": "No sessions provided"
         }
     
-    results = {}
+    # Security: prevent path traversal
+    session_filenames = [
+        f for f in session_filenames
+        if isinstance(f, str) and ".." not in f and "/" not in f and "\\" not in f
+    ]
     
-    # This would integrate with Telegram spam bot API
-    # For now, we'll check file status and return mock health data
-    # In production, this would call the spam bot service
+    checker = get_session_health_checker()
+    force = bool(body.get("force", False))
+    max_age = body.get("max_age", HEALTH_CACHE_TTL)
     
-    for filename in session_filenames:
-        if ".." in filename or "/" in filename or "\\" in filename:
-            continue
-        
-        # Check file location
-        status = "unknown"
-        if (UNUSED_DIR / filename).exists():
-            status = "unused"
-        elif (BANNED_DIR / filename).exists():
-            status = "banned"
-        elif (FROZEN_DIR / filename).exists():
-            status = "frozen"
-        else:
-            # Check in assigned
-            for user_dir in ASSIGNED_DIR.iterdir():
-                if user_dir.is_dir() and (user_dir / filename).exists():
-                    status = "assigned"
-                    break
+    if body.get("stream"):
+        async def _stream():
+            results = {}
+            async for filename, result in checker.check_sessions(session_filenames, max_age=max_age, force=force):
+                results[filename] = result
+                yield json.dumps({"filename": filename, **result}) + "\n"
+            yield json.dumps({"done": True, "counts": summarize_health(results)}) + "\n"
         
-        # TODO: Integrate with Telegram spam bot API to get actual health status
-        # For now, return based on file location
-        health_status = "active"
-        if status == "banned":
-            health_status = "banned"
-        elif status == "frozen":
-            health_status = "frozen"
-        
-        results[filename] = {
-            "status": health_status,  # banned, unauthorized, active, frozen, limited
-            "location": status,
-            "checked_at": None  # Would be timestamp from spam bot
-        }
+        return StreamingResponse(_stream(), media_type="application/x-ndjson")
+    
+    results = await checker.check_all(session_filenames, max_age=max_age, force=force)
+    
+    return {
+        "success": True,
+        "results": results,
+        "counts": summarize_health(results)
+    }
+
+
+@router.get("/health-cache")
+async def get_health_cache(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Cached session health results (no probing)
+    """
+    results = get_session_health_checker().get_cache()
+    return {
+        "success": True,
+        "results": results,
+        "counts": summarize_health(results)
+    }
+
+
+@router.get("/pool-readiness")
+async def pool_readiness(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Readiness of the unused pool (ready / dead / frozen / unchecked) and the last validation pass
+    """
+    return {
+        "success": True,
+        "readiness": get_pool_readiness(),
+        "last_pass": get_last_validation_pass()
+    }
+
+
+@router.post("/pool-readiness/validate")
+async def validate_pool(
+    body: Dict[str, Any] = Body(default={}),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Run a validation pass over the unused pool now
+    
+    Body:
+        max_sessions: Probe at most this many sessions (default: all due)
+    """
+    summary = await validate_pool_once(max_sessions=body.get("max_sessions"))
+    return {
+        "success": True,
+        **summary
+    }
+
+
+@router.post("/import")
+async def import_sessions(
+    file: UploadFile = File(...),
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Bulk import .session files from a zip archive
+    The upload is streamed to disk; entries are extracted and validated concurrently
+    in the background and sorted into unused / banned / frozen
+    Poll GET /import/{job_id} for progress and per-file results
+    """
+    if not file.filename or not file.filename.lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="A .zip archive is required")
+    
+    job = await start_import(file)
+    if job["state"] == "failed":
+        raise HTTPException(status_code=400, detail=job["error"])
+    
+    return {
+        "success": True,
+        "job": job
+    }
+
+
+@router.get("/import")
+async def list_imports(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Recent import jobs (without per-file results)
+    """
+    return {
+        "success": True,
+        "jobs": list_import_jobs()
+    }
+
+
+@router.get("/import/{job_id}")
+async def get_import(
+    job_id: str,
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """
+    Progress and per-file results of an import job
+    """
+    job = get_import_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
     
     return {
         "success": True,
-        "results": results
+        "job": job
     }
@@ -3,7 +3,7 @@ Bot Control API - Start/Stop/Status endpoints
 Auth: Extract user_id ONLY from JWT (never trust X-User-Id header)
 """
 
-from fastapi import APIRouter, HTTPException, Header, Depends, Body
+from fastapi import APIRouter, HTTPException, Header, Depends, Body, Query, Response
 from typing import Dict, Any, Optional
 from pydantic import BaseModel
 import jwt
@@ -14,17 +14,31 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from bot.data_manager import get_user_data, update_user_data, get_user_stats, is_read_only_mode, get_read_only_reason, load_users, load_stats
-from bot.session_manager import assign_sessions_to_user, get_banned_sessions
-from bot.api_pairs import assign_pair_to_sessions, load_api_pairs, get_pair_usage
+from bot.data_manager import get_user_data, update_user_data, get_user_stats, is_read_only_mode, get_read_only_reason, USERS_FILE, STATS_FILE
+from bot.session_manager import assign_sessions_to_user
+from bot.api_pairs import reserve_pairs, release_pairs
 from bot.scheduler import get_scheduler
 from bot.engine import parse_post_link
 from bot.heartbeat_manager import get_status_from_heartbeat, clear_heartbeat
+from bot.cycle_timetable import get_cycle_progress, clear_cycle_progress
+from bot.cancellation import cancel_user_run
+from bot.session_inventory import get_session_inventory
+from bot.state_versions import get_state_versions, make_etag, etag_matches, ALL_USER_FIELDS
+from bot.fleet_metrics import get_fleet_metrics
 
 router = APIRouter()
 
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
 
+# /state keys a since= request omits unless their source field changed
+BOT_STATE_DELTA_FIELDS = {
+    "post_type": "user.post_type",
+    "post_content": "user.post_content",
+    "groups": "user.groups",
+    "sessions": "user.assigned_sessions",
+    "stats": "stats",
+}
+
 
 # Pydantic models for request bodies
 class RegisterUserRequest(BaseModel):
@@ -155,10 +169,9 @@ async def start_bot(
         
         # CRITICAL: Check session availability BEFORE assignment
         # Prevents "running but doing nothing" state
-        from bot.session_manager import get_unused_sessions, get_banned_sessions
-        unused_sessions = get_unused_sessions()
-        banned_sessions = get_banned_sessions()
-        available_sessions = [s for s in unused_sessions if s not in banned_sessions]
+        # Only sessions not known to be dead/frozen (see bot/session_validator.py)
+        from bot.session_manager import get_assignable_sessions
+        available_sessions = get_assignable_sessions()
         
         if not available_sessions:
             raise HTTPException(
@@ -170,21 +183,29 @@ async def start_bot(
             # Not enough sessions, use what's available
             num_sessions = len(available_sessions)
         
-        # Get all users for API pair usage calculation
-        from bot.data_manager import load_users
-        all_users = load_users()
+        # Reserve API pair slots first (atomic - respects the 7-session limit per pair
+        # even with concurrent /start calls); never assign more sessions than slots
+        api_pairs = reserve_pairs(user_id, num_sessions)
+        if not api_pairs:
+            raise HTTPException(
+                status_code=409,
+                detail="No API pair capacity available. Please contact support."
+            )
         
-        assigned_sessions = assign_sessions_to_user(user_id, num_sessions)
+        assigned_sessions = assign_sessions_to_user(user_id, len(api_pairs))
         
         # CRITICAL: Verify sessions were actually assigned
         if not assigned_sessions:
+            release_pairs(user_id)
             raise HTTPException(
                 status_code=409,
                 detail="Failed to assign sessions. No sessions available in the pool."
             )
         
-        # Assign API pairs (respecting 7-session limit)
-        api_pairs = assign_pair_to_sessions(all_users, user_id, num_sessions)
+        # Fewer sessions than reserved slots (pool ran short) - give the extra slots back
+        if len(assigned_sessions) < len(api_pairs):
+            release_pairs(user_id, len(api_pairs) - len(assigned_sessions))
+            api_pairs = api_pairs[:len(assigned_sessions)]
         
         try:
             update_user_data(user_id, {
@@ -193,7 +214,10 @@ async def start_bot(
             })
         except RuntimeError as e:
             # Read-only mode error
+            release_pairs(user_id)
             raise HTTPException(status_code=503, detail=str(e))
+        
+        get_session_inventory().set_api_pairs(assigned_sessions, api_pairs)
     
     # CRITICAL: Final check - ensure assigned_sessions is not empty before setting status to "running"
     # This prevents the misleading "running but doing nothing" state
@@ -285,7 +309,7 @@ async def start_bot(
 async def stop_bot(
     user_id: str = Depends(verify_auth_and_get_user_id)
 ) -> Dict[str, Any]:
-    """Stop bot for user (graceful stop - finishes current cycle)"""
+    """Stop bot for user (graceful stop - the in-flight send finishes, no further sends)"""
     user_data = get_user_data(user_id)
     
     if not user_data:
@@ -312,6 +336,7 @@ async def stop_bot(
     
     # Clear heartbeat (worker will stop naturally, but clear immediately)
     clear_heartbeat(user_id)
+    clear_cycle_progress(user_id)
     
     # Clean up error tracking for this user's sessions
     from bot.error_tracker import get_error_tracker
@@ -320,11 +345,9 @@ async def stop_bot(
     for session_filename in assigned_sessions:
         error_tracker.reset_session(session_filename)
     
-    # Cancel scheduler task for this user (if running)
-    scheduler = get_scheduler()
-    if scheduler and scheduler.is_user_active(user_id):
-        # Task will check bot_status and exit gracefully
-        pass
+    # Trip the run's cancellation token - the engine checks it before every group
+    # and in-flight waits between sends wake up immediately
+    cancel_user_run(user_id, "stopped via API")
     
     return {
         "success": True,
@@ -578,42 +601,24 @@ async def update_groups(
 
 @router.get("/health")
 async def get_bot_health() -> Dict[str, Any]:
-    """Get backend health metrics (no authentication required for monitoring)"""
+    """
+    Get backend health metrics (no authentication required for monitoring)
+    Served from the in-memory fleet metrics and session inventory - no file reads
+    """
     try:
-        # Count active sessions (sessions assigned to users with bot_status="running")
-        users = load_users()
-        active_sessions_count = 0
-        for user_id, user_data in users.items():
-            if user_data.get("bot_status") == "running":
-                assigned_sessions = user_data.get("assigned_sessions", [])
-                active_sessions_count += len(assigned_sessions)
-        
-        # Count banned sessions
-        banned_sessions_set = get_banned_sessions()
-        banned_sessions_count = len(banned_sessions_set)
-        
-        # Get last cycle time (most recent last_activity from stats)
-        stats = load_stats()
-        last_cycle_time = None
-        if stats:
-            # Find most recent last_activity across all users
-            for user_id, user_stats in stats.items():
-                user_last_activity = user_stats.get("last_activity")
-                if user_last_activity:
-                    if last_cycle_time is None or user_last_activity > last_cycle_time:
-                        last_cycle_time = user_last_activity
-        
-        # Last error: Not currently tracked (would require scheduler/worker changes)
-        # Return None to indicate not available
-        last_error = None
+        fleet = get_fleet_metrics().snapshot()
+        last_error = fleet["last_error"]
         
         return {
             "success": True,
             "health": {
-                "active_sessions": active_sessions_count,
-                "banned_sessions": banned_sessions_count,
-                "last_cycle_time": last_cycle_time,
-                "last_error": last_error
+                "active_sessions": fleet["active_sessions"],
+                "banned_sessions": get_session_inventory().counts().get("banned", 0),
+                "last_cycle_time": fleet["last_cycle_time"],
+                "last_error": last_error["message"] if last_error else None,
+                "last_error_time": last_error["time"] if last_error else None,
+                "forwards_per_minute": fleet["forwards_per_minute"],
+                "failures_per_minute": fleet["failures_per_minute"]
             }
         }
     except Exception as e:
@@ -672,12 +677,25 @@ async def get_bot_status(
 
 @router.get("/state")
 async def get_bot_state(
+    response: Response,
+    since: Optional[int] = Query(None, description="Version from a previous response: omit unchanged config and stats"),
+    if_none_match: Optional[str] = Header(None),
     user_id: str = Depends(verify_auth_and_get_user_id)
 ) -> Dict[str, Any]:
     """
     Get complete bot state for user (WORKER-BASED STATUS)
     Status is derived from heartbeat, not JSON or Supabase
+    Conditional: If-None-Match answers 304 while the state version, heartbeat status
+    and cycle progress are unchanged (last_heartbeat alone does not change the ETag)
+    Delta: since=<version> omits post_type / post_content / groups / sessions / stats
+    unless they changed - status fields are always returned
     """
+    versions = get_state_versions()
+    versions.check_file(USERS_FILE, ALL_USER_FIELDS)
+    versions.check_file(STATS_FILE, "stats")
+    # Version first: everything read below is at least this new
+    version = versions.version(user_id)
+    
     user_data = get_user_data(user_id)
     
     if not user_data:
@@ -689,9 +707,26 @@ async def get_bot_state(
     # Get REAL status from heartbeat (what is actually happening)
     heartbeat_status = get_status_from_heartbeat(user_id, intent_status)
     
-    stats = get_user_stats(user_id)
     scheduler = get_scheduler()
     is_active = scheduler.is_user_active(user_id) if scheduler else False
+    cycle_progress = get_cycle_progress(user_id)
+    
+    # Live cycle progress changes every send: a running cycle is keyed by its
+    # completed sends, a finished one only by its start
+    progress_key = "none"
+    if cycle_progress is not None:
+        progress_key = f"{cycle_progress['started_at']}:{int(cycle_progress['finished'])}"
+        if not cycle_progress["finished"]:
+            progress_key += f":{cycle_progress['completed_sends']}"
+    etag = make_etag(
+        version, int(is_active), heartbeat_status["status"], int(heartbeat_status["is_fresh"]),
+        heartbeat_status["cycle_state"], progress_key
+    )
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    stats = get_user_stats(user_id)
     
     assigned_sessions = user_data.get("assigned_sessions", [])
     groups = user_data.get("groups", [])
@@ -721,8 +756,9 @@ async def get_bot_state(
             else:
                 last_error_reason = "Execution failures detected"
     
-    return {
+    state = {
         "success": True,
+        "version": version,
         "status": heartbeat_status["status"],  # RUNNING | STOPPED | CRASHED (REAL status)
         "intent": intent_status,  # What system wants (for debugging)
         "is_active": is_active,
@@ -731,6 +767,7 @@ async def get_bot_state(
         "cycle_state": heartbeat_status["cycle_state"],
         "is_idle": is_idle,  # Health signal: running but cannot execute
         "last_error_reason": last_error_reason,  # Health signal: recent error reason
+        "cycle_progress": cycle_progress,  # Live cycle progress / ETA (None before first cycle)
         "post_type": user_data.get("post_type", "link"),
         "post_content": post_content,
         "groups": groups,
@@ -742,3 +779,11 @@ async def get_bot_state(
             "total_flood_waits": stats.get("total_flood_waits", 0)
         }
     }
+    
+    changed = versions.changed_since(user_id, since) if since is not None else None
+    if changed is not None:
+        state["delta"] = True
+        for key, field in BOT_STATE_DELTA_FIELDS.items():
+            if field not in changed and ALL_USER_FIELDS not in changed:
+                del state[key]
+    return state
@@ -2,7 +2,7 @@
 Health API - Backend health check
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from typing import Dict, Any
 
 import sys
@@ -10,7 +10,13 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from bot.scheduler import get_scheduler
-from bot.data_manager import get_active_users, is_read_only_mode, get_read_only_reason
+from bot.data_manager import is_read_only_mode, get_read_only_reason
+from bot.fleet_metrics import get_fleet_metrics
+from bot.spare_pool import get_spare_pool
+from bot.log_saver import get_log_writer
+from bot.log_stream import get_log_stream
+from bot.notifier import get_notifier
+from api.admin_auth import require_admin
 
 router = APIRouter()
 
@@ -19,15 +25,54 @@ router = APIRouter()
 async def health() -> Dict[str, Any]:
     """Health check endpoint (works even in read-only mode)"""
     scheduler = get_scheduler()
-    active_users = get_active_users()
+    fleet = get_fleet_metrics().snapshot()
     read_only = is_read_only_mode()
     read_only_reason = get_read_only_reason() if read_only else None
     
     return {
         "status": "healthy" if not read_only else "read_only",
         "scheduler_running": scheduler.running if scheduler else False,
-        "active_users": len(active_users),
+        "active_users": fleet["active_users"],
         "read_only_mode": read_only,
         "read_only_reason": read_only_reason
     }
 
+
+@router.get("/spare-pool")
+async def spare_pool_metrics() -> Dict[str, Any]:
+    """Warm spare session pool utilisation (swaps, misses, fill ratio)"""
+    return {
+        "success": True,
+        "spare_pool": get_spare_pool().get_metrics()
+    }
+
+
+
+@router.get("/logging")
+async def logging_metrics() -> Dict[str, Any]:
+    """Per-user log writer queue depth, throughput and dropped records; live stream subscribers"""
+    return {
+        "success": True,
+        "log_writer": get_log_writer().get_metrics(),
+        "log_stream": get_log_stream().get_metrics()
+    }
+
+
+@router.get("/notifications")
+async def notification_metrics(
+    admin: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Outbound alert delivery per destination (sent, retrying, dead-lettered) - admin only"""
+    return {
+        "success": True,
+        "notifier": get_notifier().get_metrics()
+    }
+
+
+@router.get("/fleet")
+async def fleet_metrics() -> Dict[str, Any]:
+    """Fleet aggregates: active users / sessions, last cycle and error, forwards per minute"""
+    return {
+        "success": True,
+        "fleet": get_fleet_metrics().snapshot()
+    }
@@ -3,7 +3,8 @@ Sync API - Full dashboard state for frontend
 Returns EVERYTHING frontend needs in ONE call
 """
 
-from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi import APIRouter, HTTPException, Header, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, Optional
 import jwt
 import os
@@ -12,14 +13,32 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from bot.data_manager import get_user_data, get_user_stats
+from bot.data_manager import get_user_data, get_user_stats, USERS_FILE, STATS_FILE
 from bot.scheduler import get_scheduler
-from bot.log_saver import get_user_logs
+from bot.log_saver import user_log_version, read_user_log_tail, read_user_log_range
+from bot.log_stream import get_log_stream, stream_user_events
+from bot.state_versions import get_state_versions, make_etag, etag_matches, ALL_USER_FIELDS
 
 router = APIRouter()
 
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
 
+# Log lines returned by a full /state response
+SYNC_LOG_LINES = 100
+
+# user keys returned by /state (defaults for keys missing from users.json)
+SYNC_USER_FIELDS = {
+    "bot_status": "stopped",
+    "assigned_sessions": [],
+    "api_pairs": [],
+    "groups": [],
+    "post_type": "link",
+    "post_content": "",
+    "delay_between_posts": 5,
+    "delay_between_cycles": 300,
+    "banned_sessions": [],
+}
+
 
 def verify_auth_and_get_user_id(authorization: Optional[str] = Header(None)) -> str:
     """
@@ -29,8 +48,27 @@ def verify_auth_and_get_user_id(authorization: Optional[str] = Header(None)) ->
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header required")
     
+    return _user_id_from_token(authorization.replace("Bearer ", ""))
+
+
+def verify_stream_auth(
+    authorization: Optional[str] = Header(None),
+    token: Optional[str] = Query(None)
+) -> str:
+    """
+    Verify JWT for the live stream
+    Browsers' EventSource cannot send headers, so the token may come as ?token= instead
+    """
+    if authorization:
+        return _user_id_from_token(authorization.replace("Bearer ", ""))
+    if token:
+        return _user_id_from_token(token)
+    raise HTTPException(status_code=401, detail="Authorization header or token required")
+
+
+def _user_id_from_token(token: str) -> str:
+    """Decode a JWT and extract user_id"""
     try:
-        token = authorization.replace("Bearer ", "")
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         user_id = payload.get("user_id") or payload.get("sub")
         
@@ -46,48 +84,118 @@ def verify_auth_and_get_user_id(authorization: Optional[str] = Header(None)) ->
 
 @router.get("/state")
 async def get_sync_state(
+    response: Response,
+    since: Optional[int] = Query(None, description="Version from a previous response: return only what changed"),
+    if_none_match: Optional[str] = Header(None),
     user_id: str = Depends(verify_auth_and_get_user_id)
 ) -> Dict[str, Any]:
-    """Get full dashboard state for user (EVERYTHING in ONE call)"""
+    """
+    Get full dashboard state for user (EVERYTHING in ONE call)
+    Conditional: If-None-Match with the last ETag answers 304 when nothing changed
+    Delta: since=<version> returns only changed user keys, stats if they changed and
+    only the log lines appended since (logs_append) - or the full tail with
+    logs_reset when the log cannot be continued (new day, too much text, too old)
+    """
+    versions = get_state_versions()
+    versions.check_file(USERS_FILE, ALL_USER_FIELDS)
+    versions.check_file(STATS_FILE, "stats")
+    # Version first: everything read below is at least this new
+    version, log_date, log_size = user_log_version(user_id)
+    
     user_data = get_user_data(user_id)
     
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
     
-    stats = get_user_stats(user_id)
     scheduler = get_scheduler()
     is_active = scheduler.is_user_active(user_id) if scheduler else False
     
-    # Get latest logs (last 100 lines)
-    logs = get_user_logs(user_id, lines=100)
+    etag = make_etag(version, int(is_active))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    changed = versions.changed_since(user_id, since) if since is not None else None
+    if changed is None:
+        return {
+            "success": True,
+            "version": version,
+            "user": _user_section(user_data, is_active),
+            "stats": _stats_section(get_user_stats(user_id)),
+            "logs": read_user_log_tail(user_id, log_date, log_size, SYNC_LOG_LINES)
+        }
     
+    state: Dict[str, Any] = {
+        "success": True,
+        "version": version,
+        "delta": True,
+        "user": _user_section(user_data, is_active, changed),
+    }
+    if "stats" in changed:
+        state["stats"] = _stats_section(get_user_stats(user_id))
+    if "logs" in changed:
+        appended = None
+        position = versions.log_position(user_id, since)
+        if position is not None and position[0] == log_date:
+            appended = read_user_log_range(user_id, log_date, position[1], log_size)
+        if appended is not None:
+            state["logs_append"] = appended
+        else:
+            state["logs"] = read_user_log_tail(user_id, log_date, log_size, SYNC_LOG_LINES)
+            state["logs_reset"] = True
+    return state
+
+
+def _user_section(user_data: Dict[str, Any], is_active: bool, changed: Optional[set] = None) -> Dict[str, Any]:
+    """User part of /state (only keys in `changed` for a delta)"""
+    section: Dict[str, Any] = {}
+    for key, default in SYNC_USER_FIELDS.items():
+        if changed is None or ALL_USER_FIELDS in changed or f"user.{key}" in changed:
+            section[key] = user_data.get(key, default)
+    section["is_active"] = is_active
+    return section
+
+
+def _stats_section(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Stats part of /state"""
     # Calculate success rate
     total_posts = stats.get("total_posts", 0)
     total_success = stats.get("total_success", 0)
     success_rate = (total_success / total_posts * 100) if total_posts > 0 else 0.0
     
     return {
-        "success": True,
-        "user": {
-            "bot_status": user_data.get("bot_status", "stopped"),
-            "is_active": is_active,
-            "assigned_sessions": user_data.get("assigned_sessions", []),
-            "api_pairs": user_data.get("api_pairs", []),
-            "groups": user_data.get("groups", []),
-            "post_type": user_data.get("post_type", "link"),
-            "post_content": user_data.get("post_content", ""),
-            "delay_between_posts": user_data.get("delay_between_posts", 5),
-            "delay_between_cycles": user_data.get("delay_between_cycles", 300),
-            "banned_sessions": user_data.get("banned_sessions", []),
-        },
-        "stats": {
-            "total_posts": total_posts,
-            "total_success": total_success,
-            "total_failures": stats.get("total_failures", 0),
-            "total_flood_waits": stats.get("total_flood_waits", 0),
-            "total_messages_sent": stats.get("total_messages_sent", 0),
-            "success_rate": round(success_rate, 2),
-            "last_activity": stats.get("last_activity"),
-        },
-        "logs": logs
+        "total_posts": total_posts,
+        "total_success": total_success,
+        "total_failures": stats.get("total_failures", 0),
+        "total_flood_waits": stats.get("total_flood_waits", 0),
+        "total_messages_sent": stats.get("total_messages_sent", 0),
+        "success_rate": round(success_rate, 2),
+        "last_activity": stats.get("last_activity"),
     }
+
+
+@router.get("/stream")
+async def stream_logs(
+    lines: int = Query(100, ge=0, le=1000),
+    user_id: str = Depends(verify_stream_auth),
+    last_event_id: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Live dashboard stream (Server-Sent Events) - replaces polling /state for logs
+    Events: "snapshot" (last `lines` log lines), then "log" (new lines), "send" (each
+    forward's outcome), "cycle" (cycle state changes), "stats" (totals after a cycle),
+    "lagged" (items this client was too slow to receive)
+    Reconnects with Last-Event-ID resume from the buffer when possible
+    """
+    if not get_user_data(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    subscriber, resumed = get_log_stream().subscribe(user_id, last_event_id)
+    if subscriber is None:
+        raise HTTPException(status_code=429, detail="Too many live streams open")
+    
+    return StreamingResponse(
+        stream_user_events(user_id, subscriber, resumed, lines),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,104 @@
+"""
+Log Tail Benchmark
+Compares reading the last lines of a large user log: full read vs reverse-seek tail
+vs cached incremental poll (what /api/sync/state does on every poll)
+
+Usage:
+    python benchmark_log_tail.py [size_mb] [lines]
+"""
+
+import sys
+import os
+import time
+import tempfile
+from pathlib import Path
+from collections import deque
+
+from bot.log_saver import tail_lines, LogTailCache
+
+LINE = "2024-01-01 12:00:00 - INFO - Forwarded message to -1001234567890 (Some Group Name) - ok\n"
+
+
+def write_log(path: Path, size_mb: int) -> int:
+    """Write a log of roughly size_mb megabytes, return its line count"""
+    block = LINE * 10000
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            f.write(block)
+            written += len(block)
+    return written // len(LINE)
+
+
+def timed(func, repeat: int = 5) -> float:
+    """Best wall time in milliseconds over repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> int:
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / "2024-01-01.log"
+        print(f"[*] Writing {size_mb}MB log...")
+        total_lines = write_log(log_file, size_mb)
+        print(f"    {total_lines} lines, {log_file.stat().st_size / 1024 / 1024:.1f}MB")
+        print()
+
+        def full_read():
+            with open(log_file, 'r', encoding='utf-8') as f:
+                return "".join(f.readlines()[-lines:])
+
+        def deque_read():
+            with open(log_file, 'r', encoding='utf-8') as f:
+                return "".join(deque(f, maxlen=lines))
+
+        def reverse_tail():
+            return b"".join(tail_lines(log_file, lines)).decode('utf-8')
+
+        expected = full_read()
+        if reverse_tail() != expected:
+            print("[FAIL] Reverse tail does not match full read")
+            return 1
+
+        cache = LogTailCache()
+        cache.tail("bench", "2024-01-01", log_file, lines)
+
+        def cached_poll():
+            return cache.tail("bench", "2024-01-01", log_file, lines)
+
+        def cached_poll_after_append():
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(LINE * 5)
+            return cache.tail("bench", "2024-01-01", log_file, lines)
+
+        results = [
+            ("readlines() (old)", timed(full_read, 3)),
+            ("deque over file", timed(deque_read, 3)),
+            ("reverse-seek tail", timed(reverse_tail)),
+            ("cached poll, unchanged", timed(cached_poll)),
+            ("cached poll, 5 new lines", timed(cached_poll_after_append)),
+        ]
+
+        if cached_poll() != full_read():
+            print("[FAIL] Cached tail does not match full read after appends")
+            return 1
+
+        print(f"Last {lines} lines of a {size_mb}MB log (best of runs):")
+        for name, ms in results:
+            print(f"  {name:<28} {ms:10.3f} ms")
+        print()
+        print(f"Cache: {cache.get_metrics()}")
+    return 0
+
+
+if __name__ == "__main__":
+    os.chdir(Path(__file__).parent)
+    sys.exit(main())
@@ -1,15 +1,21 @@
 """
 API_ID / API_HASH Pool Manager
 Manages API pairs with 7-session limit per pair
+
+Pairs are cached in memory (re-read only when api_pairs.json changes) and per-pair
+usage is kept as live counters, so lookups never re-read the file or scan users.json.
+reserve_pairs / release_pairs are atomic: concurrent /start calls cannot push a pair
+past MAX_SESSIONS_PER_PAIR
 """
 
 import json
+import os
+import sys
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from threading import Lock
 
 API_PAIRS_FILE = Path(__file__).parent.parent / "data" / "api_pairs.json"
-api_pairs_lock = Lock()
 
 # Default API pairs (loaded from config)
 DEFAULT_API_PAIRS: List[Dict[str, str]] = [
@@ -23,30 +29,215 @@ DEFAULT_API_PAIRS: List[Dict[str, str]] = [
 MAX_SESSIONS_PER_PAIR = 7
 
 
-def load_api_pairs() -> List[Dict[str, str]]:
-    """Load API pairs from file or use defaults"""
-    if API_PAIRS_FILE.exists():
+class ApiPairRegistry:
+    """
+    Cached API pairs + live usage counters
+    Usage semantics match get_pair_usage: one unit per entry in a user's api_pairs list
+    """
+
+    def __init__(self, pairs_file: Path):
+        self._file = pairs_file
+        self._lock = Lock()
+        self._pairs: List[Dict[str, str]] = []
+        self._file_sig: Optional[Tuple[int, int]] = None
+        self._loaded = False
+        # {pair_idx: sessions}, {user_id: [pair_idx, ...]}; built lazily from users.json
+        self._usage: Dict[int, int] = {}
+        self._user_pairs: Dict[str, List[int]] = {}
+        self._usage_loaded = False
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
         try:
-            with api_pairs_lock:
-                with open(API_PAIRS_FILE, 'r', encoding='utf-8') as f:
+            st = os.stat(self._file)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _read_file(self) -> List[Dict[str, str]]:
+        if self._file.exists():
+            try:
+                with open(self._file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     return data.get("pairs", DEFAULT_API_PAIRS)
-        except Exception:
-            pass
-    return DEFAULT_API_PAIRS.copy()
+            except Exception:
+                pass
+        return DEFAULT_API_PAIRS.copy()
+
+    def _refresh(self) -> None:
+        """Re-read the pairs file if it changed (call with lock held)"""
+        sig = self._signature()
+        if self._loaded and sig == self._file_sig:
+            return
+        self._pairs = self._read_file()
+        self._file_sig = sig
+        self._loaded = True
+
+    def get_pairs(self) -> List[Dict[str, str]]:
+        """Current pairs (copy - callers may modify and save)"""
+        with self._lock:
+            self._refresh()
+            return [dict(pair) for pair in self._pairs]
+
+    def get_pair(self, pair_idx: int) -> Optional[Dict[str, str]]:
+        """One pair by index (None if out of range)"""
+        with self._lock:
+            self._refresh()
+            if 0 <= pair_idx < len(self._pairs):
+                return dict(self._pairs[pair_idx])
+            return None
+
+    def save_pairs(self, pairs: List[Dict[str, str]]) -> None:
+        """Write pairs atomically (temp file + rename) and update the cache"""
+        with self._lock:
+            self._file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self._file.with_suffix('.json.tmp')
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"pairs": pairs}, f, indent=2)
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+            temp_file.replace(self._file)
+            self._pairs = [dict(pair) for pair in pairs]
+            self._file_sig = self._signature()
+            self._loaded = True
+
+    # ------------------------------------------------------------------
+    # Usage accounting
+    # ------------------------------------------------------------------
+
+    def _ensure_usage(self) -> None:
+        """Build counters from users.json once (call with lock held)"""
+        if self._usage_loaded:
+            return
+        from bot.data_manager import load_users
+        self._usage = {}
+        self._user_pairs = {}
+        for user_id, user_data in load_users().items():
+            pairs = list(user_data.get("api_pairs", []))
+            if pairs:
+                self._user_pairs[user_id] = pairs
+                for pair_idx in pairs:
+                    self._usage[pair_idx] = self._usage.get(pair_idx, 0) + 1
+        self._usage_loaded = True
+
+    def _release(self, user_id: str, count: Optional[int] = None) -> None:
+        pairs = self._user_pairs.get(user_id, [])
+        count = len(pairs) if count is None else min(count, len(pairs))
+        for pair_idx in pairs[len(pairs) - count:]:
+            remaining = self._usage.get(pair_idx, 0) - 1
+            if remaining > 0:
+                self._usage[pair_idx] = remaining
+            else:
+                self._usage.pop(pair_idx, None)
+        if count >= len(pairs):
+            self._user_pairs.pop(user_id, None)
+        else:
+            self._user_pairs[user_id] = pairs[:len(pairs) - count]
+
+    def reserve(self, user_id: str, num_sessions: int) -> List[int]:
+        """
+        Atomically reserve pair slots for a user's sessions (replaces any previous reservation)
+        Pairs are chosen by the load-aware balancer (bot/pair_balancer.py)
+
+        Returns:
+            Pair index per session - shorter than num_sessions if capacity ran out
+        """
+        with self._lock:
+            self._refresh()
+            self._ensure_usage()
+            self._release(user_id)
+
+            from bot.pair_balancer import choose_pairs
+            reserved = choose_pairs(num_sessions, self._pairs, self._usage, MAX_SESSIONS_PER_PAIR)
+            for idx in reserved:
+                self._usage[idx] = self._usage.get(idx, 0) + 1
+
+            if reserved:
+                self._user_pairs[user_id] = reserved
+            return list(reserved)
+
+    def release(self, user_id: str, count: Optional[int] = None) -> None:
+        """Release a user's reserved slots (last `count` of them, or all)"""
+        with self._lock:
+            self._ensure_usage()
+            self._release(user_id, count)
+
+    def move_slot(self, user_id: str, position: int, from_idx: int, to_idx: int) -> bool:
+        """
+        Atomically move one of a user's slots to another pair (online rebalancing)
+        Fails if the slot changed meanwhile or the target pair is full
+        """
+        with self._lock:
+            self._ensure_usage()
+            pairs = self._user_pairs.get(user_id)
+            if not pairs or position >= len(pairs) or pairs[position] != from_idx:
+                return False
+            if self._usage.get(to_idx, 0) >= MAX_SESSIONS_PER_PAIR:
+                return False
+            pairs[position] = to_idx
+            self._usage[from_idx] = self._usage.get(from_idx, 0) - 1
+            if self._usage[from_idx] <= 0:
+                self._usage.pop(from_idx, None)
+            self._usage[to_idx] = self._usage.get(to_idx, 0) + 1
+            return True
+
+    def get_all_user_pairs(self) -> Dict[str, List[int]]:
+        """{user_id: [pair_idx, ...]} for every user holding slots"""
+        with self._lock:
+            self._ensure_usage()
+            return {user_id: list(pairs) for user_id, pairs in self._user_pairs.items()}
+
+    def get_usage(self) -> Dict[int, int]:
+        """Live usage per pair index: {pair_idx: session_count}"""
+        with self._lock:
+            self._ensure_usage()
+            return dict(self._usage)
+
+    def get_user_pairs(self, user_id: str) -> List[int]:
+        """Pair indexes reserved for a user"""
+        with self._lock:
+            self._ensure_usage()
+            return list(self._user_pairs.get(user_id, []))
+
+    def rebuild_usage(self) -> Dict[int, int]:
+        """Recount usage from users.json (after external edits or pair deletion)"""
+        with self._lock:
+            self._usage_loaded = False
+            self._ensure_usage()
+            return dict(self._usage)
+
+
+_registry = ApiPairRegistry(API_PAIRS_FILE)
+
+
+def get_pair_registry() -> ApiPairRegistry:
+    """Get the global API pair registry"""
+    return _registry
+
+
+def load_api_pairs() -> List[Dict[str, str]]:
+    """Load API pairs (cached; re-read only when the file changes)"""
+    return _registry.get_pairs()
 
 
 def save_api_pairs(pairs: List[Dict[str, str]]):
     """Save API pairs to file"""
     try:
-        with api_pairs_lock:
-            API_PAIRS_FILE.parent.mkdir(parents=True, exist_ok=True)
-            with open(API_PAIRS_FILE, 'w', encoding='utf-8') as f:
-                json.dump({"pairs": pairs}, f, indent=2)
+        _registry.save_pairs(pairs)
     except Exception as e:
         print(f"Error saving API pairs: {e}")
 
 
+def reserve_pairs(user_id: str, num_sessions: int) -> List[int]:
+    """Atomically reserve API pair slots for a user's sessions (see ApiPairRegistry.reserve)"""
+    return _registry.reserve(user_id, num_sessions)
+
+
+def release_pairs(user_id: str, count: Optional[int] = None) -> None:
+    """Release a user's API pair slots (last `count`, or all)"""
+    _registry.release(user_id, count)
+
+
 def get_pair_usage(session_assignments: Dict[str, Dict]) -> Dict[int, int]:
     """
     Calculate current usage per API pair
@@ -127,16 +318,11 @@ def assign_pair_to_sessions(session_assignments: Dict[str, Dict], user_id: str,
 
 def get_pair_for_session(session_filename: str, user_data: Dict) -> Optional[Dict[str, str]]:
     """Get API pair dict for a specific session"""
-    pairs = load_api_pairs()
     api_pairs = user_data.get("api_pairs", [])
     
     if not api_pairs:
         return None
     
     # Get first pair (sessions are distributed across pairs)
-    pair_idx = api_pairs[0]
-    if pair_idx < len(pairs):
-        return pairs[pair_idx]
-    
-    return None
+    return _registry.get_pair(api_pairs[0])
 
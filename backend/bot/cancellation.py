@@ -0,0 +1,117 @@
+"""
+Cancellation Tokens - In-memory stop signal per user run
+Replaces the is_running() callback that re-read users.json before every group
+Checked in O(1) by the engine; sleeps wake up immediately when the token is tripped
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class CancellationToken:
+    """
+    Stop signal for ONE user run
+    Tripped by the scheduler (user stopped / plan expired / shutdown) or the stop API
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[str] = None
+        self._cancelled = False
+        self._event = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def cancelled(self) -> bool:
+        """True once the token has been tripped"""
+        return self._cancelled
+
+    def is_running(self) -> bool:
+        """O(1) replacement for the old file-reading is_running() callback"""
+        return not self._cancelled
+
+    def cancel(self, reason: str = "stopped") -> None:
+        """Trip the token (idempotent, safe to call from any thread)"""
+        if self._cancelled:
+            return
+        self._cancelled = True
+        self.reason = reason
+        self.cancelled_at = datetime.now().isoformat()
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                # Wake sleepers on the worker's loop from another thread
+                loop.call_soon_threadsafe(self._event.set)
+                return
+        self._event.set()
+
+    async def sleep(self, seconds: float) -> bool:
+        """
+        Interruptible sleep
+
+        Returns:
+            True if the full duration elapsed, False if the token was tripped
+        """
+        if self._cancelled:
+            return False
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        if seconds <= 0:
+            return True
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=seconds)
+            return False
+        except asyncio.TimeoutError:
+            return True
+
+
+# Active token per user (latest run)
+_tokens: Dict[str, CancellationToken] = {}
+_tokens_lock = threading.Lock()
+
+
+def create_cancellation_token(user_id: str) -> CancellationToken:
+    """Create a fresh token for a new user run (replaces any previous one)"""
+    token = CancellationToken(user_id)
+    with _tokens_lock:
+        _tokens[user_id] = token
+    return token
+
+
+def get_cancellation_token(user_id: str) -> Optional[CancellationToken]:
+    """Get the current token for a user (None if no run was started)"""
+    with _tokens_lock:
+        return _tokens.get(user_id)
+
+
+def cancel_user_run(user_id: str, reason: str = "stopped") -> bool:
+    """
+    Trip the current token for a user
+
+    Returns:
+        True if a token existed and was tripped
+    """
+    with _tokens_lock:
+        token = _tokens.pop(user_id, None)
+    if token is None:
+        return False
+    token.cancel(reason)
+    return True
+
+
+def cancel_all_runs(reason: str = "shutdown") -> int:
+    """Trip every active token (scheduler shutdown). Returns number of tokens tripped"""
+    with _tokens_lock:
+        tokens = list(_tokens.values())
+        _tokens.clear()
+    for token in tokens:
+        token.cancel(reason)
+    return len(tokens)
@@ -0,0 +1,380 @@
+"""
+Chatlist Import - Bulk group extraction from Telegram chatlist (folder) links
+Backend version of the archive's extract_groups_from_chatlist, without the bot UI
+
+- Links are queued and spread across a few sessions (one worker per session, each
+  reusing its connection for many links), so extraction runs concurrently but each
+  account sends at most one chatlist RPC every CHATLIST_LINK_DELAY seconds
+- Import sessions are held (session_manager.hold_sessions) until the job finishes, so
+  assignment, pool validation and the spare pool never open them concurrently; sessions
+  a running bot or the spare pool has open are refused
+- Each session connects on the coolest API pair (pair registry usage + live telemetry)
+- Groups are collected from the invite's chat entities: supergroups (incl. forums) are
+  kept as -100 ids; broadcast channels and legacy basic groups are counted and skipped
+  (the plan files only accept -100 supergroup ids)
+- Results are de-duplicated across links and written into the plan group file in one
+  atomic edit (apply_group_edit); titles seed the group metadata store
+- Progress and per-link results are kept per import job
+- The Telegram client factory is swappable (set_client_factory) for tests
+"""
+
+import asyncio
+import os
+import re
+import uuid
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+# Sessions (= concurrent workers) used per import
+CHATLIST_IMPORT_SESSIONS = int(os.getenv("CHATLIST_IMPORT_SESSIONS", "4"))
+
+# Seconds between chatlist RPCs on the same session
+CHATLIST_LINK_DELAY = float(os.getenv("CHATLIST_LINK_DELAY", "1.5"))
+
+# Seconds allowed per chatlist lookup / connection
+CHATLIST_TIMEOUT = 30
+
+# Largest number of links per import
+MAX_CHATLIST_LINKS = 1000
+
+# Finished jobs kept for progress queries
+MAX_FINISHED_JOBS = 20
+
+# t.me/addlist/<slug>, tg://addlist?slug=<slug>, or a bare slug
+_LINK_RE = re.compile(r"(?:(?:https?://)?t(?:elegram)?\.me/addlist/|tg://addlist\?slug=)?([A-Za-z0-9_-]+)/?$")
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_lock = Lock()
+
+
+def _telethon_client_factory(session_path: str, api_id: int, api_hash: str):
+    """Default client factory (real Telethon)"""
+    from telethon import TelegramClient
+    return TelegramClient(session_path, api_id, api_hash)
+
+
+_client_factory: Callable = _telethon_client_factory
+
+
+def set_client_factory(factory: Optional[Callable]) -> None:
+    """Swap the Telegram client factory (None restores Telethon)"""
+    global _client_factory
+    _client_factory = factory or _telethon_client_factory
+
+
+def parse_chatlist_link(link: str) -> Optional[str]:
+    """Chatlist slug from a link (None if it is not a chatlist link)"""
+    match = _LINK_RE.match(link.strip()) if isinstance(link, str) else None
+    return match.group(1) if match else None
+
+
+def classify_chat(entity) -> Tuple[str, Optional[str]]:
+    """
+    Classify a chatlist chat entity
+
+    Returns:
+        ("group", "-100...") | ("channel", None) | ("basic_group", None)
+    """
+    if not hasattr(entity, "megagroup"):
+        # Legacy Chat (basic group) - no -100 id, not postable from plan files
+        return ("basic_group", None)
+    if getattr(entity, "broadcast", False) and not getattr(entity, "megagroup", False):
+        return ("channel", None)
+    return ("group", f"-100{entity.id}")
+
+
+async def extract_groups_from_chatlist(client, slug: str) -> Dict[str, Any]:
+    """
+    Look up one chatlist invite and collect its groups
+
+    Returns:
+        {"groups": ["-100..."], "metadata": {group_id: {...}}, "channels": n, "basic_groups": n}
+    """
+    from telethon.tl.functions.chatlists import CheckChatlistInviteRequest
+
+    invite = await client(CheckChatlistInviteRequest(slug=slug))
+    groups: Dict[str, None] = {}
+    metadata: Dict[str, Dict[str, Any]] = {}
+    skipped = {"channel": 0, "basic_group": 0}
+
+    chats = list(getattr(invite, "chats", None) or [])
+    for entity in chats:
+        kind, group_id = classify_chat(entity)
+        if kind != "group":
+            skipped[kind] += 1
+            continue
+        groups[group_id] = None
+        metadata[group_id] = {
+            "title": getattr(entity, "title", None),
+            "username": getattr(entity, "username", None),
+            "is_forum": bool(getattr(entity, "forum", False)),
+            "topic_id": None,
+            "members": getattr(entity, "participants_count", None),
+        }
+
+    if not chats:
+        # No resolved chats in the reply - fall back to raw channel peers
+        peers = list(getattr(invite, "peers", None) or [])
+        peers += list(getattr(invite, "missing_peers", None) or [])
+        peers += list(getattr(invite, "already_peers", None) or [])
+        for peer in peers:
+            channel_id = getattr(peer, "channel_id", None)
+            if channel_id:
+                groups[f"-100{channel_id}"] = None
+
+    return {
+        "groups": list(groups),
+        "metadata": metadata,
+        "channels": skipped["channel"],
+        "basic_groups": skipped["basic_group"],
+    }
+
+
+def get_chatlist_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Progress and per-link results of a chatlist import job (None if unknown)"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = {k: v for k, v in job.items() if k != "_groups"}
+        snapshot["counts"] = dict(job["counts"])
+        snapshot["results"] = list(job["results"])
+        snapshot["unique_groups"] = len(job["_groups"])
+        return snapshot
+
+
+def list_chatlist_jobs() -> List[Dict[str, Any]]:
+    """Summaries of recent chatlist import jobs (newest first)"""
+    with _jobs_lock:
+        jobs = [
+            {**{k: v for k, v in job.items() if k not in ("results", "_groups")}, "unique_groups": len(job["_groups"])}
+            for job in _jobs.values()
+        ]
+    return sorted(jobs, key=lambda j: j["created_at"], reverse=True)
+
+
+def _new_job(job_id: str, plan_type: str, action: str, slugs: List[str], invalid: List[str]) -> Dict[str, Any]:
+    job = {
+        "job_id": job_id,
+        "plan_type": plan_type,
+        "action": action,
+        "state": "running",     # running | done | failed
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "error": None,
+        "links": len(slugs),
+        "processed": 0,
+        "sessions": [],
+        "counts": {"ok": 0, "failed": 0, "invalid": len(invalid), "groups_found": 0, "channels": 0, "basic_groups": 0},
+        "results": [{"link": link, "error": "Not a chatlist link"} for link in invalid],
+        "edit": None,
+        "_groups": {},
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        finished = [j for j in _jobs.values() if j["state"] in ("done", "failed")]
+        for old in sorted(finished, key=lambda j: j["created_at"])[:-MAX_FINISHED_JOBS]:
+            _jobs.pop(old["job_id"], None)
+    return job
+
+
+def _record_link(job: Dict[str, Any], slug: str, session: str, extracted: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+    with _jobs_lock:
+        job["processed"] += 1
+        if error is not None:
+            job["counts"]["failed"] += 1
+            job["results"].append({"link": slug, "session": session, "error": error})
+            return
+        job["counts"]["ok"] += 1
+        job["counts"]["groups_found"] += len(extracted["groups"])
+        job["counts"]["channels"] += extracted["channels"]
+        job["counts"]["basic_groups"] += extracted["basic_groups"]
+        for group_id in extracted["groups"]:
+            job["_groups"][group_id] = None
+        job["results"].append({"link": slug, "session": session, "groups": len(extracted["groups"])})
+
+
+def _pick_sessions(requested: Optional[List[str]], holder: str) -> List[Tuple[str, str]]:
+    """
+    (session name, path) for the sessions an import runs on, held for the job
+
+    Raises:
+        ValueError: If a requested session is open in a running bot, the spare pool or another import
+    """
+    from bot.session_health import session_in_use
+    from bot.session_inventory import get_session_inventory
+    from bot.session_manager import session_lock, get_assignable_sessions, hold_sessions
+
+    inventory = get_session_inventory()
+    with session_lock:
+        if requested:
+            names = list(dict.fromkeys(requested))
+            busy = [name for name in names if session_in_use(name, inventory.get(name))]
+            if busy:
+                raise ValueError(f"Sessions in use: {', '.join(busy)}")
+        else:
+            names = get_assignable_sessions()[:CHATLIST_IMPORT_SESSIONS]
+        picked = []
+        for name in names:
+            path = inventory.path_of(name)
+            if path is not None:
+                picked.append((name, str(path)))
+        hold_sessions([name for name, _ in picked], holder)
+    return picked
+
+
+def _choose_pairs(count: int) -> List[Dict[str, str]]:
+    """API pair per import session, coolest first, re-scored after each pick"""
+    from bot.api_pairs import get_pair_registry, MAX_SESSIONS_PER_PAIR
+    from bot.pair_balancer import get_pair_telemetry, score_pairs
+
+    registry = get_pair_registry()
+    pairs = registry.get_pairs()
+    if not pairs:
+        return []
+    usage = registry.get_usage()
+    telemetry = get_pair_telemetry().snapshot()
+    chosen = []
+    for _ in range(count):
+        best = min(score_pairs(pairs, usage, MAX_SESSIONS_PER_PAIR, telemetry), key=lambda e: (e["score"], e["index"]))
+        chosen.append(pairs[best["index"]])
+        # Count the import connection so the next session prefers another pair
+        projected = telemetry.setdefault(best["api_id"], {"connections": 0, "rpm": 0.0, "flood_rate": 0.0})
+        projected["connections"] += 1
+    return chosen
+
+
+async def run_chatlist_import(job: Dict[str, Any], slugs: List[str], sessions: List[Tuple[str, str]]) -> None:
+    """
+    Extract groups from every chatlist (one worker per session) and write them into the plan file
+    Links whose session drops out are retried on the remaining sessions
+    """
+    from bot.group_file_manager import apply_group_edit, group_id_error
+    from bot.group_metadata import get_group_metadata
+    from bot.pair_balancer import get_pair_telemetry
+    from bot.session_manager import release_sessions
+
+    telemetry = get_pair_telemetry()
+    pairs: List[Dict[str, str]] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for slug in slugs:
+        queue.put_nowait(slug)
+    metadata_store = get_group_metadata()
+
+    async def worker(worker_idx: int, session_name: str, session_path: str) -> None:
+        pair = pairs[worker_idx]
+        api_id = int(pair["api_id"])
+        client = _client_factory(session_path, api_id, pair["api_hash"])
+        connected = False
+        try:
+            await asyncio.wait_for(client.connect(), timeout=CHATLIST_TIMEOUT)
+            telemetry.connection_opened(api_id)
+            connected = True
+            if not await asyncio.wait_for(client.is_user_authorized(), timeout=CHATLIST_TIMEOUT):
+                raise RuntimeError("not authorized")
+            with _jobs_lock:
+                job["sessions"].append(session_name)
+
+            while True:
+                try:
+                    slug = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    extracted = await asyncio.wait_for(extract_groups_from_chatlist(client, slug), timeout=CHATLIST_TIMEOUT)
+                except asyncio.TimeoutError:
+                    telemetry.record_request(api_id)
+                    _record_link(job, slug, session_name, None, f"Timed out after {CHATLIST_TIMEOUT}s")
+                except Exception as e:
+                    telemetry.record_request(api_id, flood_wait="FloodWait" in type(e).__name__)
+                    _record_link(job, slug, session_name, None, str(e)[:100])
+                else:
+                    telemetry.record_request(api_id)
+                    _record_link(job, slug, session_name, extracted, None)
+                    for group_id, meta in extracted["metadata"].items():
+                        # Forum topics are resolved later by the metadata refresher
+                        if not meta["is_forum"] and metadata_store.get(group_id) is None:
+                            metadata_store.update(group_id, meta)
+                if not queue.empty():
+                    await asyncio.sleep(CHATLIST_LINK_DELAY)
+        except Exception as e:
+            print(f"WARNING: Chatlist import {job['job_id']}: session {session_name} unusable: {e}")
+        finally:
+            if connected:
+                telemetry.connection_closed(api_id)
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+    try:
+        pairs = _choose_pairs(len(sessions))
+        if not pairs:
+            raise RuntimeError("No API pairs configured")
+        if not sessions:
+            raise RuntimeError("No usable sessions for chatlist import")
+
+        await asyncio.gather(*(worker(idx, name, path) for idx, (name, path) in enumerate(sessions)))
+
+        # Every session dropped out - remaining links could not be processed
+        while not queue.empty():
+            _record_link(job, queue.get_nowait(), None, None, "No usable session left")
+
+        with _jobs_lock:
+            groups = [group_id for group_id in job["_groups"] if group_id_error(group_id) is None]
+        if groups or job["action"] != "replace":
+            edit = await asyncio.to_thread(apply_group_edit, job["plan_type"], job["action"], groups)
+        else:
+            edit = None   # Never wipe a plan file because every link failed
+        metadata_store.maybe_checkpoint()
+        with _jobs_lock:
+            job.update(state="done", edit=edit, finished_at=datetime.now().isoformat())
+        print(f"INFO: Chatlist import {job['job_id']} finished: {job['counts']} -> {edit}")
+    except Exception as e:
+        with _jobs_lock:
+            job.update(state="failed", error=str(e), finished_at=datetime.now().isoformat())
+        print(f"ERROR: Chatlist import {job['job_id']} failed: {e}")
+    finally:
+        release_sessions([name for name, _ in sessions])
+
+
+def start_chatlist_import(links: List[str], plan_type: str, action: str = "add",
+                          sessions: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Start a chatlist import in the background
+
+    Args:
+        links: Chatlist links (t.me/addlist/...) or slugs
+        plan_type: "STARTER" | "ENTERPRISE"
+        action: "add" | "replace"
+        sessions: Session filenames to use (default: the first ready unused sessions);
+                  sessions open in a running bot, the spare pool or another import are refused
+
+    Returns:
+        Job snapshot (poll get_chatlist_job for progress)
+
+    Raises:
+        ValueError: On invalid arguments
+    """
+    if plan_type not in ("STARTER", "ENTERPRISE"):
+        raise ValueError("plan_type must be 'STARTER' or 'ENTERPRISE'")
+    if action not in ("add", "replace"):
+        raise ValueError("action must be 'add' or 'replace'")
+    if len(links) > MAX_CHATLIST_LINKS:
+        raise ValueError(f"At most {MAX_CHATLIST_LINKS} links per import")
+
+    slugs: Dict[str, None] = {}
+    invalid = []
+    for link in links:
+        slug = parse_chatlist_link(link)
+        if slug is None:
+            invalid.append(str(link)[:100])
+        else:
+            slugs[slug] = None
+
+    job_id = uuid.uuid4().hex[:12]
+    picked = _pick_sessions(sessions, f"chatlist:{job_id}")
+    job = _new_job(job_id, plan_type, action, list(slugs), invalid)
+    asyncio.create_task(run_chatlist_import(job, list(slugs), picked))
+    return get_chatlist_job(job["job_id"])
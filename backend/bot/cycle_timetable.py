@@ -0,0 +1,259 @@
+"""
+Cycle Timetable - Deadline-driven send scheduling per session
+Each session's cycle is planned as explicit send deadlines (start + i * interval)
+Sends are dispatched against those deadlines instead of sleeping after each forward,
+so RPC latency, skipped groups and retries no longer stretch the cycle
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, Optional, List
+
+# A send dispatched more than this many seconds after its deadline counts as late
+LATE_TOLERANCE_SECONDS = 1.0
+
+# When running behind, catch-up sends are never closer than this fraction of the interval
+# (prevents bursts after a slow RPC or FloodWait)
+MIN_SPACING_RATIO = 0.5
+
+
+def _now() -> float:
+    """Monotonic clock (safe to read from API handlers and workers alike)"""
+    return time.monotonic()
+
+
+def planned_duration(num_sends: int, interval: float) -> float:
+    """
+    Planned time from first to last send deadline
+    The first send is due at the start of the cycle, so N sends span (N - 1) intervals
+    """
+    if num_sends <= 0:
+        return 0.0
+    return (num_sends - 1) * interval
+
+
+class SendTimetable:
+    """
+    Timetable of send deadlines for ONE session in ONE cycle
+    Deadline for slot i = start_time + i * interval
+    """
+
+    def __init__(
+        self,
+        session_name: str,
+        num_sends: int,
+        interval: float,
+        start_time: Optional[float] = None,
+        slack_budget: Optional[float] = None
+    ):
+        self.session_name = session_name
+        self.num_sends = num_sends
+        self.interval = max(0.0, float(interval))
+        self.start_time = start_time if start_time is not None else _now()
+        # Time available before the next session's offset (starter: per_session_offset)
+        self.slack_budget = slack_budget
+
+        self.completed = 0
+        self.late_sends = 0
+        self.total_drift = 0.0
+        self.max_drift = 0.0
+        self.last_dispatch: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def deadline(self, index: int) -> float:
+        """Absolute deadline for slot index (0-based)"""
+        return self.start_time + index * self.interval
+
+    @property
+    def planned_end(self) -> float:
+        """Deadline of the last send"""
+        return self.start_time + planned_duration(self.num_sends, self.interval)
+
+    async def wait_for_slot(self, index: int, sleep=None) -> float:
+        """
+        Wait until slot's deadline and record dispatch
+
+        Args:
+            index: Slot index (0-based)
+            sleep: Optional awaitable sleep(seconds) (defaults to asyncio.sleep)
+
+        Returns:
+            Drift in seconds (dispatch time - deadline, >= 0)
+        """
+        sleep = sleep or asyncio.sleep
+        target = self.deadline(index)
+
+        # Running late: dispatch now, but keep a minimum spacing from the previous send
+        if self.last_dispatch is not None:
+            target = max(target, self.last_dispatch + self.interval * MIN_SPACING_RATIO)
+
+        wait_time = target - _now()
+        if wait_time > 0:
+            await sleep(wait_time)
+
+        dispatched_at = _now()
+        drift = max(0.0, dispatched_at - self.deadline(index))
+
+        self.last_dispatch = dispatched_at
+        self.total_drift += drift
+        self.max_drift = max(self.max_drift, drift)
+        if drift > LATE_TOLERANCE_SECONDS:
+            self.late_sends += 1
+
+        return drift
+
+    def add_sends(self, delta: int) -> None:
+        """Grow (or shrink) the plan mid-cycle - groups added to / removed from the plan file"""
+        self.num_sends = max(self.completed, self.num_sends + delta)
+
+    def complete_slot(self) -> None:
+        """Mark the current slot as done (success or failure)"""
+        self.completed += 1
+
+    def finish(self) -> None:
+        """Mark the timetable as finished (cycle complete or stopped)"""
+        if self.finished_at is None:
+            self.finished_at = _now()
+
+    def eta_seconds(self) -> float:
+        """Seconds until the last planned send"""
+        if self.finished_at is not None or self.completed >= self.num_sends:
+            return 0.0
+        remaining = self.num_sends - self.completed
+        # Never estimate earlier than the remaining slots allow
+        projected = max(self.planned_end, _now() + (remaining - 1) * self.interval)
+        return max(0.0, projected - _now())
+
+    def summary(self) -> Dict[str, Any]:
+        """Timetable metrics for this session"""
+        end = self.finished_at if self.finished_at is not None else _now()
+        elapsed = end - self.start_time
+        dispatched = self.completed
+
+        # Slack left before the budget (projected to the last send while still running)
+        slack = None
+        if self.slack_budget is not None:
+            slack = round(self.slack_budget - (elapsed + self.eta_seconds()), 2)
+
+        return {
+            "session": self.session_name,
+            "planned_sends": self.num_sends,
+            "completed": self.completed,
+            "interval": round(self.interval, 2),
+            "planned_duration": round(planned_duration(self.num_sends, self.interval), 2),
+            "elapsed": round(elapsed, 2),
+            "avg_drift": round(self.total_drift / dispatched, 3) if dispatched else 0.0,
+            "max_drift": round(self.max_drift, 3),
+            "late_sends": self.late_sends,
+            "slack": slack,
+            "eta_seconds": round(self.eta_seconds(), 1),
+            "finished": self.finished_at is not None
+        }
+
+
+class CycleProgress:
+    """
+    Live progress of ONE user cycle across all sessions
+    Sessions are registered as expected (before starter offset wait) and then planned
+    """
+
+    def __init__(self, user_id: str, cycle_start_time: Optional[float] = None, slack_budget: Optional[float] = None):
+        self.user_id = user_id
+        self.cycle_start_time = cycle_start_time if cycle_start_time is not None else _now()
+        self.started_at = datetime.now().isoformat()
+        self.slack_budget = slack_budget
+        self.finished = False
+        # Sessions not yet started: {session_name: (planned_sends, interval, start_at)}
+        self._expected: Dict[str, tuple] = {}
+        self._timetables: Dict[str, SendTimetable] = {}
+        self._lock = Lock()
+
+    def expect_session(self, session_name: str, planned_sends: int, interval: float, start_at: Optional[float] = None) -> None:
+        """Register a session that will start later (e.g. starter random offset)"""
+        with self._lock:
+            self._expected[session_name] = (planned_sends, interval, start_at)
+
+    def plan_session(self, session_name: str, num_sends: int, interval: float) -> SendTimetable:
+        """Create the timetable for a session that is starting now"""
+        timetable = SendTimetable(session_name, num_sends, interval, slack_budget=self.slack_budget)
+        with self._lock:
+            self._expected.pop(session_name, None)
+            self._timetables[session_name] = timetable
+        return timetable
+
+    def discard_session(self, session_name: str) -> None:
+        """Remove an expected session that will never run (not authorized, crashed)"""
+        with self._lock:
+            self._expected.pop(session_name, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Aggregate progress / ETA across all sessions"""
+        now = _now()
+        with self._lock:
+            timetables = list(self._timetables.values())
+            expected = list(self._expected.items())
+
+        total = sum(t.num_sends for t in timetables)
+        completed = sum(t.completed for t in timetables)
+        late_sends = sum(t.late_sends for t in timetables)
+        max_drift = max((t.max_drift for t in timetables), default=0.0)
+        eta = max((t.eta_seconds() for t in timetables), default=0.0)
+
+        for session_name, (planned_sends, interval, start_at) in expected:
+            total += planned_sends
+            start = start_at if start_at is not None else now
+            session_eta = max(0.0, start - now) + planned_duration(planned_sends, interval)
+            eta = max(eta, session_eta)
+
+        slacks: List[float] = [t.summary()["slack"] for t in timetables if t.slack_budget is not None]
+
+        return {
+            "started_at": self.started_at,
+            "finished": self.finished,
+            "completed_sends": completed,
+            "planned_sends": total,
+            "percent": round(completed / total * 100, 1) if total else 0.0,
+            "eta_seconds": 0.0 if self.finished else round(eta, 1),
+            "elapsed_seconds": round(now - self.cycle_start_time, 1),
+            "sessions_running": sum(1 for t in timetables if t.finished_at is None),
+            "sessions_pending": len(expected),
+            "late_sends": late_sends,
+            "max_drift": round(max_drift, 3),
+            "min_slack": min(slacks) if slacks else None
+        }
+
+
+# Live cycle progress per user (in-memory, same process as API)
+_cycle_progress: Dict[str, CycleProgress] = {}
+_progress_lock = Lock()
+
+
+def start_cycle_progress(user_id: str, cycle_start_time: Optional[float] = None, slack_budget: Optional[float] = None) -> CycleProgress:
+    """Create (and publish) progress tracking for a new user cycle"""
+    progress = CycleProgress(user_id, cycle_start_time, slack_budget)
+    with _progress_lock:
+        _cycle_progress[user_id] = progress
+    return progress
+
+
+def finish_cycle_progress(user_id: str) -> None:
+    """Mark user's current cycle as finished (last snapshot stays readable)"""
+    with _progress_lock:
+        progress = _cycle_progress.get(user_id)
+    if progress:
+        progress.finished = True
+
+
+def clear_cycle_progress(user_id: str) -> None:
+    """Drop progress tracking for a user (bot stopped)"""
+    with _progress_lock:
+        _cycle_progress.pop(user_id, None)
+
+
+def get_cycle_progress(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get live cycle progress / ETA for a user (None if no cycle has run)"""
+    with _progress_lock:
+        progress = _cycle_progress.get(user_id)
+    return progress.snapshot() if progress else None
@@ -8,10 +8,13 @@ import json
 import os
 from pathlib import Path
 from typing import Dict, Any, Optional, List
-from threading import Lock
+from threading import RLock
 from datetime import datetime
 import sys
 
+from bot.state_versions import get_state_versions, ALL_USER_FIELDS
+from bot.fleet_metrics import get_fleet_metrics
+
 # Import fcntl only on Unix systems
 if sys.platform != "win32":
     import fcntl
@@ -21,8 +24,9 @@ USERS_FILE = DATA_DIR / "users.json"
 STATS_FILE = DATA_DIR / "stats.json"
 
 # Global locks for thread-safe access
-_users_lock = Lock()
-_stats_lock = Lock()
+# Re-entrant: update_user_data / update_user_stats hold them across load + save
+_users_lock = RLock()
+_stats_lock = RLock()
 
 # Read-only mode flag (set to True if data corruption detected)
 _read_only_mode = False
@@ -110,6 +114,7 @@ def save_users(users: Dict[str, Dict[str, Any]]):
             
             # Atomic rename
             temp_file.replace(USERS_FILE)
+            get_state_versions().note_file_written(USERS_FILE)
         except Exception as e:
             print(f"Error saving users.json: {e}")
             if temp_file.exists():
@@ -168,6 +173,7 @@ def save_stats(stats: Dict[str, Dict[str, Any]]):
             
             # Atomic rename
             temp_file.replace(STATS_FILE)
+            get_state_versions().note_file_written(STATS_FILE)
         except Exception as e:
             print(f"Error saving stats.json: {e}")
             if temp_file.exists():
@@ -190,7 +196,8 @@ def update_user_data(user_id: str, updates: Dict[str, Any]):
     with _users_lock:
         users = load_users()
         
-        if user_id not in users:
+        is_new = user_id not in users
+        if is_new:
             users[user_id] = {
                 "assigned_sessions": [],
                 "api_pairs": [],
@@ -202,8 +209,22 @@ def update_user_data(user_id: str, updates: Dict[str, Any]):
                 "delay_between_cycles": 300,
             }
         
-        users[user_id].update(updates)
+        previous = users[user_id]
+        changed = [key for key, value in updates.items() if key not in previous or previous[key] != value]
+        previous.update(updates)
         save_users(users)
+        
+        # Dashboards syncing with If-None-Match / since= only see what changed
+        if is_new:
+            get_state_versions().bump(user_id, [ALL_USER_FIELDS])
+        elif changed:
+            get_state_versions().bump(user_id, [f"user.{key}" for key in changed])
+        
+        # Health endpoints read active sessions from the fleet metrics
+        if is_new or "bot_status" in changed or "assigned_sessions" in changed:
+            get_fleet_metrics().update_user(
+                user_id, previous.get("bot_status"), len(previous.get("assigned_sessions", []))
+            )
 
 
 def is_read_only_mode() -> bool:
@@ -251,6 +272,7 @@ def update_user_stats(user_id: str, updates: Dict[str, Any]):
         stats[user_id].update(updates)
         stats[user_id]["last_activity"] = datetime.now().isoformat()
         save_stats(stats)
+        get_state_versions().bump(user_id, ["stats"])
 
 
 def get_active_users() -> List[str]:
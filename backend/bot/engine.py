@@ -6,6 +6,7 @@ Used by all users (no duplication)
 import asyncio
 import random
 import re
+import time
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Any
 from telethon import TelegramClient
@@ -110,10 +111,13 @@ async def forward_to_group(
     channel_username: str,
     message_id: int,
     group_identifier: str,
-    logger
+    logger,
+    group_meta: Optional[Dict[str, Any]] = None
 ) -> Tuple[bool, Optional[str], Optional[str]]:
     """
     Forward a message to a specific group
+    group_meta: the group's record from the metadata store (name for logs, forum topic
+    when the identifier has no #topic suffix) - no RPC is spent looking the group up
     Returns: (success, group_name, error_reason)
     """
     group_name = None
@@ -122,6 +126,13 @@ async def forward_to_group(
     try:
         # Parse group to extract group_id and topic_id
         group_id_str, topic_id = parse_group_with_topic(group_identifier)
+        if group_meta:
+            if group_meta.get("title"):
+                group_name = group_meta["title"]
+            elif group_meta.get("username"):
+                group_name = f"@{group_meta['username']}"
+            if topic_id is None and group_meta.get("is_forum"):
+                topic_id = group_meta.get("topic_id")
         
         # Ensure client is connected
         if not client.is_connected():
@@ -134,16 +145,6 @@ async def forward_to_group(
         if group_id_str.startswith('-100') and len(group_id_str) > 4 and group_id_str[4:].isdigit():
             group_id = int(group_id_str)
             
-            # Try to get entity for logging
-            try:
-                target_entity = await client.get_entity(group_id)
-                if hasattr(target_entity, 'title'):
-                    group_name = target_entity.title
-                elif hasattr(target_entity, 'username'):
-                    group_name = f"@{target_entity.username}"
-            except:
-                pass
-            
             # Forward message
             try:
                 if topic_id is not None:
@@ -228,6 +229,39 @@ async def forward_to_group(
         return (False, group_name, error_reason)
 
 
+def summarize_ordering_gain(success_positions: List[Tuple[int, int]], num_groups: int) -> Dict[str, Any]:
+    """
+    Summarize how far successful deliveries moved earlier in the cycle
+    
+    Args:
+        success_positions: (position sent at, position in file order) per successful send
+        num_groups: Number of groups in the cycle
+    
+    Returns:
+        Positions as fractions of the cycle (0.0 = start, 1.0 = end)
+    """
+    if not success_positions or num_groups <= 0:
+        return {
+            "successes": 0,
+            "avg_success_position": 0.0,
+            "baseline_success_position": 0.0,
+            "position_gain": 0.0,
+            "moved_earlier": 0
+        }
+    
+    count = len(success_positions)
+    avg_position = sum(sent for sent, _ in success_positions) / count / num_groups
+    baseline_position = sum(original for _, original in success_positions) / count / num_groups
+    
+    return {
+        "successes": count,
+        "avg_success_position": round(avg_position, 4),
+        "baseline_success_position": round(baseline_position, 4),
+        "position_gain": round(baseline_position - avg_position, 4),
+        "moved_earlier": sum(1 for sent, original in success_positions if sent < original)
+    }
+
+
 async def execute_forwarding_cycle(
     client: TelegramClient,
     session_name: str,
@@ -240,14 +274,21 @@ async def execute_forwarding_cycle(
     cycle_number: int = 0,
     error_tracker=None,
     on_success: callable = None,
-    on_failure: callable = None
+    on_failure: callable = None,
+    cycle_progress=None,
+    cancel_token=None,
+    group_health=None,
+    group_feed=None,
+    user_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Execute one forwarding cycle for a user's session
     Implements plan-specific behavior:
     - STARTER: All sessions post to all groups, duplicates allowed
     - ENTERPRISE: Each session posts only to assigned groups, no duplicates
-    - Error tracking: Skip groups after 2+ errors for that session
+    - Error tracking: Skip groups while their decaying failure score is high for that session
+    - Ordering: Each session's active groups are sent in success-probability order
+      (history per session/group), so a cycle cut short still reaches the best groups
     
     Args:
         client: Telethon client
@@ -256,27 +297,54 @@ async def execute_forwarding_cycle(
         assigned_groups: Groups assigned to this session
         delay_between_posts: Delay in seconds (already calculated based on plan)
         logger: Logger instance
-        is_running: Callable to check if still running
+        is_running: Callable to check if still running (O(1) - CancellationToken.is_running)
         execution_mode: "starter" | "enterprise"
         cycle_number: Current cycle number for this session
         error_tracker: ErrorTracker instance for per-session error tracking
         on_success: Optional callback on success
         on_failure: Optional callback on failure
+        cycle_progress: Optional CycleProgress for live progress / ETA reporting
+        cancel_token: Optional CancellationToken - waits between sends wake immediately on stop
+        group_health: GroupHealthIndex fed with every result (global, shared by all users)
+        group_feed: Optional CycleGroupFeed - plan file edits reach this cycle before each send
+        user_id: Owner of the session (recorded on every structured send event)
+    
+    Sends are dispatched against a timetable of deadlines (start + i * delay_between_posts)
+    instead of sleeping after each forward, so RPC latency does not stretch the cycle.
     
-    Returns: cycle stats
+    Returns: cycle stats (on ACCOUNT_BANNED, "remaining_groups" lists the groups not yet
+    delivered, starting with the failed one, for a hot spare to continue)
     """
     from bot.error_tracker import get_error_tracker
+    from bot.cycle_timetable import SendTimetable
+    from bot.group_health import get_group_health
+    from bot.pair_balancer import get_pair_telemetry
+    from bot.group_metadata import get_group_metadata
+    from bot.event_log import get_event_log
+    from bot.notifier import notify
+    from bot.fleet_metrics import get_fleet_metrics
     
     if error_tracker is None:
         error_tracker = get_error_tracker()
+    pair_telemetry = get_pair_telemetry()
+    api_id = getattr(client, "api_id", None)
+    if group_health is None:
+        group_health = get_group_health()
     
     stats = {
         "success": 0,
         "failures": 0,
         "flood_waits": 0,
         "errors": [],
-        "skipped_groups": 0
+        "skipped_groups": 0,
+        "groups_added": 0,
+        "groups_removed": 0
     }
+    timetable = None
+    group_metadata = get_group_metadata()
+    event_log = get_event_log()
+    fleet_metrics = get_fleet_metrics()
+    metadata_task = None
     
     try:
         # Parse post link
@@ -294,7 +362,7 @@ async def execute_forwarding_cycle(
             if error_tracker.should_skip_group(session_name, group, cycle_number):
                 stats["skipped_groups"] += 1
                 if logger:
-                    logger.debug(f"[{session_name}] Skipping group {group} (2+ errors, retry after N cycles)")
+                    logger.debug(f"[{session_name}] Skipping group {group} (failure score too high, retry after it decays)")
                 continue
             active_groups.append(group)
         
@@ -304,21 +372,84 @@ async def execute_forwarding_cycle(
                 f"due to errors, processing {len(active_groups)} active groups"
             )
         
-        # Forward to each active group
+        # Order by success probability (same group set - plan partitioning is unchanged)
+        file_positions = {group: idx for idx, group in enumerate(active_groups)}
+        active_groups = error_tracker.order_groups(session_name, active_groups)
+        success_positions = []  # (position sent at, position in file order)
+        
+        # Refresh missing / expired group metadata in the background on this connected client
+        if group_metadata.stale(active_groups):
+            metadata_task = asyncio.create_task(group_metadata.refresh_with_client(client, active_groups))
+        
+        # Plan send deadlines for this session's cycle
+        if cycle_progress is not None:
+            timetable = cycle_progress.plan_session(session_name, len(active_groups), delay_between_posts)
+        else:
+            timetable = SendTimetable(session_name, len(active_groups), delay_between_posts)
+        
+        # Forward to each active group (groups added mid-cycle are appended and picked up by the loop)
+        sends = 0
         for group_idx, group in enumerate(active_groups, 1):
             if not is_running():
                 break
             
+            # Apply plan file edits made since the cycle started
+            if group_feed is not None:
+                removed_groups, added_groups = group_feed.poll(session_name)
+                if added_groups:
+                    active_groups.extend(added_groups)
+                    timetable.add_sends(len(added_groups))
+                    stats["groups_added"] += len(added_groups)
+                    if logger:
+                        logger.info(f"[{session_name}] Cycle #{cycle_number}: {len(added_groups)} groups added to the plan, queued")
+                if group in removed_groups:
+                    timetable.add_sends(-1)
+                    stats["groups_removed"] += 1
+                    continue
+            
+            # Wait for this send's deadline (plan-specific delay already calculated)
+            await timetable.wait_for_slot(
+                sends,
+                sleep=cancel_token.sleep if cancel_token is not None else None
+            )
+            sends += 1
+            if not is_running():
+                break
+            
             try:
                 # Forward message
+                send_started = time.monotonic()
                 success, group_name, error_reason = await forward_to_group(
-                    client, channel_username, message_id, group, logger
+                    client, channel_username, message_id, group, logger,
+                    group_meta=group_metadata.get(group)
+                )
+                latency = time.monotonic() - send_started
+                pair_telemetry.record_request(api_id, flood_wait="FLOODWAIT" in (error_reason or ""))
+                event_log.record(
+                    user_id, session_name, group, cycle_number,
+                    "success" if success else "failure", error_reason, latency
                 )
+                fleet_metrics.record_forward(success)
+                
+                # Feed global group health (group-level failures quarantine the group for everyone)
+                health_change = group_health.record_result(session_name, group, success, error_reason)
+                if health_change == "quarantined":
+                    notify(
+                        "group_quarantined",
+                        f"Group {group_name or group} quarantined globally ({error_reason})",
+                        key=group, group=group, error=error_reason
+                    )
+                    if logger:
+                        logger.warning(
+                            f"[{session_name}] Group {group_name or group} quarantined globally "
+                            f"({error_reason} confirmed by multiple sessions)"
+                        )
                 
                 if success:
                     stats["success"] += 1
-                    # Record success - reset error count
-                    error_tracker.record_success(session_name, group)
+                    # Record success - reset error count, update delivery history
+                    error_tracker.record_success(session_name, group, latency)
+                    success_positions.append((group_idx - 1, file_positions.get(group, group_idx - 1)))
                     
                     if logger:
                         logger.info(
@@ -329,9 +460,9 @@ async def execute_forwarding_cycle(
                         on_success(session_name, group, group_name)
                 else:
                     stats["failures"] += 1
-                    # Record error
-                    error_tracker.record_error(session_name, group)
-                    error_count = error_tracker.get_error_count(session_name, group)
+                    # Record error (decaying score decides whether to skip)
+                    newly_skipped = error_tracker.record_error(session_name, group, latency)
+                    failure_score = error_tracker.get_failure_score(session_name, group)
                     
                     if "FLOODWAIT" in (error_reason or ""):
                         stats["flood_waits"] += 1
@@ -340,50 +471,48 @@ async def execute_forwarding_cycle(
                         logger.warning(
                             f"[{session_name}] Cycle #{cycle_number} [{group_idx}/{len(active_groups)}] "
                             f"✗ Failed to {group_name or group}: {error_reason} "
-                            f"(errors: {error_count}/2)"
+                            f"(failure score: {failure_score:.2f})"
                         )
                     
-                    # If 2+ errors, mark for skipping
-                    if error_count >= 2:
-                        error_tracker.mark_group_skipped(session_name, group, retry_after_cycles=3)
-                        if logger:
-                            logger.warning(
-                                f"[{session_name}] Group {group_name or group} marked for skipping "
-                                f"(2+ errors). Will retry after 3 cycles."
-                            )
+                    if newly_skipped and logger:
+                        logger.warning(
+                            f"[{session_name}] Group {group_name or group} marked for skipping "
+                            f"(failure score {failure_score:.2f}). Will retry after it decays."
+                        )
                     
                     if on_failure:
                         on_failure(session_name, group, group_name, error_reason)
                     
                     # Handle specific errors
                     if error_reason == "ACCOUNT_BANNED":
-                        # Stop immediately if banned
+                        # Stop immediately if banned; a hot spare can continue from this group
+                        stats["remaining_groups"] = active_groups[group_idx - 1:]
+                        timetable.complete_slot()
                         raise Exception("Account banned")
                 
-                # Delay between posts (plan-specific delay already calculated)
-                await asyncio.sleep(delay_between_posts)
+                timetable.complete_slot()
                 
             except Exception as e:
                 if "banned" in str(e).lower():
                     raise  # Re-raise banned errors
                 
+                timetable.complete_slot()
+                
                 stats["failures"] += 1
                 error_tracker.record_error(session_name, group)
-                error_count = error_tracker.get_error_count(session_name, group)
+                failure_score = error_tracker.get_failure_score(session_name, group)
                 
                 error_str = str(e)
                 stats["errors"].append(error_str)
+                event_log.record(user_id, session_name, group, cycle_number, "error", extract_short_reason(e))
+                fleet_metrics.record_forward(False)
                 
                 if logger:
                     logger.error(
                         f"[{session_name}] Cycle #{cycle_number} [{group_idx}/{len(active_groups)}] "
-                        f"Error forwarding to {group}: {error_str} (errors: {error_count}/2)"
+                        f"Error forwarding to {group}: {error_str} (failure score: {failure_score:.2f})"
                     )
                 
-                # If 2+ errors, mark for skipping
-                if error_count >= 2:
-                    error_tracker.mark_group_skipped(session_name, group, retry_after_cycles=3)
-                
                 continue
         
         if logger:
@@ -393,10 +522,39 @@ async def execute_forwarding_cycle(
                 f"{stats['skipped_groups']} skipped"
             )
         
+        # How much earlier in the cycle successful deliveries happened vs file order
+        stats["ordering"] = summarize_ordering_gain(success_positions, len(active_groups))
+        if logger and success_positions:
+            ordering = stats["ordering"]
+            logger.info(
+                f"[{session_name}] Cycle #{cycle_number} ordering: successes at avg position "
+                f"{ordering['avg_success_position']:.0%} of cycle (file order: "
+                f"{ordering['baseline_success_position']:.0%}), "
+                f"{ordering['moved_earlier']} deliveries moved earlier"
+            )
+        
     except Exception as e:
         if logger:
             logger.error(f"[{session_name}] Cycle #{cycle_number} error: {e}")
         stats["errors"].append(str(e))
+    finally:
+        if metadata_task is not None and not metadata_task.done():
+            metadata_task.cancel()
+        group_health.maybe_checkpoint()
+        group_metadata.maybe_checkpoint()
+        if timetable is not None:
+            timetable.finish()
+            stats["timetable"] = timetable.summary()
+            if logger:
+                summary = stats["timetable"]
+                slack_info = f", slack {summary['slack']:.1f}s" if summary["slack"] is not None else ""
+                logger.info(
+                    f"[{session_name}] Cycle #{cycle_number} timetable: "
+                    f"{summary['completed']}/{summary['planned_sends']} sends in {summary['elapsed']:.1f}s "
+                    f"(planned {summary['planned_duration']:.1f}s), "
+                    f"drift avg {summary['avg_drift']:.2f}s / max {summary['max_drift']:.2f}s, "
+                    f"{summary['late_sends']} late{slack_info}"
+                )
     
     return stats
 
@@ -1,125 +1,548 @@
 """
 Error Tracker - Track errors per (session, group) pair
-Implements skipping logic: skip group after 2+ errors for that session
+Implements skipping logic with an exponentially-decaying failure score:
+- Every failure adds 1.0 to the (session, group) score, the score decays per session cycle
+- Score >= SKIP_ENTER_SCORE: group is skipped until the score decays below SKIP_EXIT_SCORE
+  (two failures in a row -> skip ~3 cycles, repeated failures -> longer skips)
+Compact representation: interned integer ids for sessions and groups, array-backed counters,
+per-session index (reset is O(groups of that session)), checkpointed to data/error_tracker.json
+
+Also keeps per-(session, group) delivery history (success EWMA, last success, latency EWMA)
+used to order each session's groups by success probability (order_groups)
 """
 
-from typing import Dict, Set, Tuple
-from collections import defaultdict
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import threading
 
+DATA_DIR = Path(__file__).parent.parent / "data"
+ERROR_TRACKER_FILE = DATA_DIR / "error_tracker.json"
+
+# Score decay: score halves every N session cycles
+ERROR_SCORE_HALF_LIFE = float(os.getenv("ERROR_SCORE_HALF_LIFE", "2"))
+DECAY_PER_CYCLE = 0.5 ** (1.0 / ERROR_SCORE_HALF_LIFE) if ERROR_SCORE_HALF_LIFE > 0 else 0.0
+
+# Skip when score reaches ENTER, retry once it has decayed below EXIT (hysteresis)
+SKIP_ENTER_SCORE = 1.5
+SKIP_EXIT_SCORE = 0.75
+
+# Success multiplies the score by this factor (0.0 = forget past failures, like the old reset)
+SUCCESS_SCORE_FACTOR = 0.0
+
+# Entries whose score decayed below this (with no consecutive errors / skip) are pruned on checkpoint
+PRUNE_SCORE = 0.01
+
+# Minimum seconds between automatic checkpoints
+CHECKPOINT_INTERVAL = int(os.getenv("ERROR_TRACKER_CHECKPOINT_INTERVAL", "60"))
+
+# Upper bound for a computed skip (cycles)
+MAX_SKIP_CYCLES = 50
+
+# Group ordering score: success EWMA + recency bonus - latency penalty
+SUCCESS_EWMA_ALPHA = 0.3
+SUCCESS_PRIOR = 0.5             # unknown groups sit in the middle (still get explored)
+RECENCY_BONUS = 0.2             # bonus for a recent success, decays with RECENCY_WINDOW
+RECENCY_WINDOW = 24 * 3600
+LATENCY_EWMA_ALPHA = 0.3
+LATENCY_PENALTY = 0.1           # max penalty, reached at LATENCY_CEILING seconds
+LATENCY_CEILING = 10.0
+
+# History entries not touched for this long are pruned on checkpoint (whatever their score),
+# and sessions / groups left without entries release their interned ids
+HISTORY_RETENTION = 14 * 24 * 3600
+
 
 class ErrorTracker:
     """
     Track errors per (session, group) pair
     Thread-safe for concurrent session execution
     """
-    
-    def __init__(self):
-        # Structure: {(session_name, group_id): error_count}
-        self._error_counts: Dict[Tuple[str, str], int] = {}
+
+    def __init__(self, checkpoint_file: Optional[Path] = None):
         self._lock = threading.Lock()
-        # Structure: {(session_name, group_id): skip_until_cycle}
-        self._skipped_groups: Dict[Tuple[str, str], int] = {}
-        # Current cycle number per session
-        self._session_cycles: Dict[str, int] = {}
-    
-    def record_error(self, session_name: str, group_id: str) -> None:
-        """Record an error for a (session, group) pair"""
-        key = (session_name, group_id)
+        self._checkpoint_file = checkpoint_file
+
+        # Interning: name <-> integer id
+        self._session_ids: Dict[str, int] = {}
+        self._group_ids: Dict[str, int] = {}
+        self._group_names: List[str] = []
+        self._free_session_ids: List[int] = []
+        self._free_group_ids: List[int] = []
+
+        # Per-session cycle number and last activity (unix time), indexed by session id
+        self._session_cycles = array('l')
+        self._session_seen = array('d')
+
+        # Per-session index: {session_id: {group_id: slot}}
+        self._session_slots: Dict[int, Dict[int, int]] = {}
+
+        # Array-backed counters, indexed by slot
+        self._error_counts = array('H')   # consecutive errors (for logging)
+        self._scores = array('d')         # failure score at _score_cycles[slot]
+        self._score_cycles = array('l')   # session cycle the score was last updated at
+        self._skip_until = array('l')     # skip while session cycle < skip_until
+        self._success_rate = array('d')   # EWMA of success (1.0) / failure (0.0)
+        self._latency = array('d')        # EWMA of send latency (seconds)
+        self._last_success = array('d')   # unix time of last success (0 = never)
+        self._last_seen = array('d')      # unix time of last attempt
+        self._free_slots: List[int] = []
+
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Interning / slots (call with lock held)
+    # ------------------------------------------------------------------
+
+    def _session_id(self, session_name: str, create: bool = True) -> Optional[int]:
+        sid = self._session_ids.get(session_name)
+        if sid is None and create:
+            if self._free_session_ids:
+                sid = self._free_session_ids.pop()
+                self._session_cycles[sid] = 0
+                self._session_seen[sid] = time.time()
+            else:
+                sid = len(self._session_cycles)
+                self._session_cycles.append(0)
+                self._session_seen.append(time.time())
+            self._session_ids[session_name] = sid
+        return sid
+
+    def _group_id(self, group_id: str, create: bool = True) -> Optional[int]:
+        gid = self._group_ids.get(group_id)
+        if gid is None and create:
+            if self._free_group_ids:
+                gid = self._free_group_ids.pop()
+                self._group_names[gid] = group_id
+            else:
+                gid = len(self._group_names)
+                self._group_names.append(group_id)
+            self._group_ids[group_id] = gid
+        return gid
+
+    def _slot(self, session_name: str, group_id: str, create: bool = True) -> Optional[Tuple[int, int]]:
+        """Returns (session_id, slot) or None"""
+        sid = self._session_id(session_name, create)
+        if sid is None:
+            return None
+        gid = self._group_id(group_id, create)
+        if gid is None:
+            return None
+
+        slots = self._session_slots.get(sid)
+        if slots is None:
+            if not create:
+                return None
+            slots = self._session_slots[sid] = {}
+
+        slot = slots.get(gid)
+        if slot is None:
+            if not create:
+                return None
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot = len(self._scores)
+                self._error_counts.append(0)
+                self._scores.append(0.0)
+                self._score_cycles.append(0)
+                self._skip_until.append(0)
+                self._success_rate.append(SUCCESS_PRIOR)
+                self._latency.append(0.0)
+                self._last_success.append(0.0)
+                self._last_seen.append(0.0)
+            self._clear_slot(slot)
+            self._score_cycles[slot] = self._session_cycles[sid]
+            slots[gid] = slot
+        return sid, slot
+
+    def _clear_slot(self, slot: int) -> None:
+        self._error_counts[slot] = 0
+        self._scores[slot] = 0.0
+        self._score_cycles[slot] = 0
+        self._skip_until[slot] = 0
+        self._success_rate[slot] = SUCCESS_PRIOR
+        self._latency[slot] = 0.0
+        self._last_success[slot] = 0.0
+        self._last_seen[slot] = 0.0
+
+    def _record_attempt(self, slot: int, success: bool, latency: Optional[float], now: float) -> None:
+        """Update delivery history for a slot (call with lock held)"""
+        outcome = 1.0 if success else 0.0
+        self._success_rate[slot] += SUCCESS_EWMA_ALPHA * (outcome - self._success_rate[slot])
+        if latency is not None and latency >= 0:
+            if self._latency[slot] <= 0:
+                self._latency[slot] = latency
+            else:
+                self._latency[slot] += LATENCY_EWMA_ALPHA * (latency - self._latency[slot])
+        if success:
+            self._last_success[slot] = now
+        self._last_seen[slot] = now
+
+    def _priority(self, slot: int, now: float) -> float:
+        """Success-probability score for ordering (call with lock held)"""
+        score = self._success_rate[slot]
+        last_success = self._last_success[slot]
+        if last_success > 0:
+            score += RECENCY_BONUS * math.exp(-max(0.0, now - last_success) / RECENCY_WINDOW)
+        if self._latency[slot] > 0:
+            score -= LATENCY_PENALTY * min(1.0, self._latency[slot] / LATENCY_CEILING)
+        return score
+
+    def _decayed_score(self, sid: int, slot: int) -> float:
+        """Score decayed to the session's current cycle"""
+        elapsed = self._session_cycles[sid] - self._score_cycles[slot]
+        score = self._scores[slot]
+        if elapsed > 0 and score > 0:
+            score *= DECAY_PER_CYCLE ** elapsed
+        return score
+
+    def _cycles_until_below(self, score: float, threshold: float) -> int:
+        """Number of session cycles until score decays below threshold"""
+        if score < threshold:
+            return 0
+        if DECAY_PER_CYCLE <= 0:
+            return 1
+        cycles = math.floor(math.log(threshold / score) / math.log(DECAY_PER_CYCLE)) + 1
+        return max(1, min(MAX_SKIP_CYCLES, cycles))
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def record_error(self, session_name: str, group_id: str, latency: Optional[float] = None) -> bool:
+        """
+        Record an error for a (session, group) pair
+
+        Returns:
+            True if this error pushed the group into skipping
+        """
         with self._lock:
-            self._error_counts[key] = self._error_counts.get(key, 0) + 1
-    
-    def record_success(self, session_name: str, group_id: str) -> None:
-        """Record a success - reset error count (but don't unskip if already skipped)"""
-        key = (session_name, group_id)
+            sid, slot = self._slot(session_name, group_id)
+            current_cycle = self._session_cycles[sid]
+            now = time.time()
+            self._record_attempt(slot, False, latency, now)
+            self._session_seen[sid] = now
+
+            score = self._decayed_score(sid, slot) + 1.0
+            self._scores[slot] = score
+            self._score_cycles[slot] = current_cycle
+            if self._error_counts[slot] < 0xFFFF:
+                self._error_counts[slot] += 1
+            self._dirty = True
+
+            if score >= SKIP_ENTER_SCORE and self._skip_until[slot] <= current_cycle:
+                self._skip_until[slot] = current_cycle + self._cycles_until_below(score, SKIP_EXIT_SCORE)
+                return True
+            return False
+
+    def record_success(self, session_name: str, group_id: str, latency: Optional[float] = None) -> None:
+        """Record a success - reset consecutive errors and shrink the score (but don't unskip if already skipped)"""
         with self._lock:
-            # Reset error count on success
-            if key in self._error_counts:
-                self._error_counts[key] = 0
-    
+            sid, slot = self._slot(session_name, group_id)
+            now = time.time()
+            self._record_attempt(slot, True, latency, now)
+            self._session_seen[sid] = now
+            self._error_counts[slot] = 0
+            self._scores[slot] = self._decayed_score(sid, slot) * SUCCESS_SCORE_FACTOR
+            self._score_cycles[slot] = self._session_cycles[sid]
+            self._dirty = True
+
     def should_skip_group(self, session_name: str, group_id: str, current_cycle: int) -> bool:
         """
         Check if a group should be skipped for this session
-        
+
         Args:
             session_name: Session identifier
             group_id: Group identifier
             current_cycle: Current cycle number for this session
-        
+
         Returns:
             True if group should be skipped
         """
-        key = (session_name, group_id)
         with self._lock:
-            error_count = self._error_counts.get(key, 0)
-            
-            # If 2+ errors, skip this group
-            if error_count >= 2:
-                # Check if it's still in skip period (retry after N cycles)
-                skip_until = self._skipped_groups.get(key, 0)
-                if current_cycle < skip_until:
-                    return True
-                
-                # Retry period expired - reset and allow retry
-                if skip_until > 0:
-                    # Reset error count and allow retry
-                    self._error_counts[key] = 0
-                    del self._skipped_groups[key]
-                    return False
-            
+            located = self._slot(session_name, group_id, create=False)
+            if located is None:
+                return False
+            sid, slot = located
+
+            if current_cycle < self._skip_until[slot]:
+                return True
+
+            # Skip period expired - allow retry (consecutive count restarts)
+            if self._skip_until[slot] > 0:
+                self._skip_until[slot] = 0
+                self._error_counts[slot] = 0
+                self._dirty = True
             return False
-    
+
     def mark_group_skipped(self, session_name: str, group_id: str, retry_after_cycles: int = 3) -> None:
         """
-        Mark a group as skipped for this session
-        
+        Force-skip a group for this session for a fixed number of cycles
+        (normally skipping is decided by the decaying score in record_error)
+
         Args:
             session_name: Session identifier
             group_id: Group identifier
             retry_after_cycles: Number of cycles to wait before retrying (default: 3)
         """
-        key = (session_name, group_id)
         with self._lock:
-            current_cycle = self._session_cycles.get(session_name, 0)
-            self._skipped_groups[key] = current_cycle + retry_after_cycles
-    
+            sid, slot = self._slot(session_name, group_id)
+            current_cycle = self._session_cycles[sid]
+            self._skip_until[slot] = max(self._skip_until[slot], current_cycle + retry_after_cycles)
+            self._dirty = True
+
     def get_current_cycle(self, session_name: str) -> int:
         """Get current cycle number for a session"""
         with self._lock:
-            return self._session_cycles.get(session_name, 0)
-    
+            sid = self._session_id(session_name, create=False)
+            return self._session_cycles[sid] if sid is not None else 0
+
     def increment_cycle(self, session_name: str) -> None:
-        """Increment cycle number for a session"""
+        """Increment cycle number for a session (checkpoints periodically)"""
         with self._lock:
-            self._session_cycles[session_name] = self._session_cycles.get(session_name, 0) + 1
-    
+            sid = self._session_id(session_name)
+            self._session_cycles[sid] += 1
+            self._session_seen[sid] = time.time()
+            self._dirty = True
+        self.maybe_checkpoint()
+
     def get_error_count(self, session_name: str, group_id: str) -> int:
-        """Get error count for a (session, group) pair"""
-        key = (session_name, group_id)
+        """Get consecutive error count for a (session, group) pair"""
+        with self._lock:
+            located = self._slot(session_name, group_id, create=False)
+            if located is None:
+                return 0
+            return self._error_counts[located[1]]
+
+    def get_failure_score(self, session_name: str, group_id: str) -> float:
+        """Get the decayed failure score for a (session, group) pair"""
+        with self._lock:
+            located = self._slot(session_name, group_id, create=False)
+            if located is None:
+                return 0.0
+            return self._decayed_score(*located)
+
+    def order_groups(self, session_name: str, groups: List[str]) -> List[str]:
+        """
+        Order a session's groups by success probability (highest first)
+        Ties (e.g. groups never tried) keep their original file order
+
+        Args:
+            session_name: Session identifier
+            groups: Groups assigned to this session (plan constraints already applied)
+
+        Returns:
+            New list with the same groups, reordered
+        """
+        now = time.time()
         with self._lock:
-            return self._error_counts.get(key, 0)
-    
+            sid = self._session_id(session_name, create=False)
+            slots = self._session_slots.get(sid) if sid is not None else None
+            if not slots:
+                return list(groups)
+
+            scores = []
+            for group in groups:
+                gid = self._group_ids.get(group)
+                slot = slots.get(gid) if gid is not None else None
+                scores.append(self._priority(slot, now) if slot is not None else SUCCESS_PRIOR)
+
+        order = sorted(range(len(groups)), key=lambda i: -scores[i])
+        return [groups[i] for i in order]
+
     def reset_session(self, session_name: str) -> None:
-        """Reset all tracking for a session (when bot stops)"""
+        """
+        Reset error tracking for a session (when bot stops) - O(groups of that session)
+        Delivery history used for group ordering is kept (pruned by age on checkpoint)
+        """
         with self._lock:
-            # Remove all entries for this session
-            keys_to_remove = [k for k in self._error_counts.keys() if k[0] == session_name]
-            for key in keys_to_remove:
-                del self._error_counts[key]
-            
-            keys_to_remove = [k for k in self._skipped_groups.keys() if k[0] == session_name]
-            for key in keys_to_remove:
-                del self._skipped_groups[key]
-            
-            if session_name in self._session_cycles:
-                del self._session_cycles[session_name]
+            sid = self._session_id(session_name, create=False)
+            if sid is None:
+                return
+
+            for slot in self._session_slots.get(sid, {}).values():
+                self._error_counts[slot] = 0
+                self._scores[slot] = 0.0
+                self._score_cycles[slot] = 0
+                self._skip_until[slot] = 0
 
+            self._session_cycles[sid] = 0
+            self._dirty = True
 
-# Global error tracker instance
-_global_error_tracker = ErrorTracker()
+    def get_stats(self) -> Dict[str, int]:
+        """Size of the tracker (for monitoring)"""
+        with self._lock:
+            return {
+                "sessions": len(self._session_ids),
+                "groups": len(self._group_ids),
+                "entries": len(self._scores) - len(self._free_slots),
+                "free_slots": len(self._free_slots)
+            }
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _prune(self) -> None:
+        """
+        Free entries that carry no information any more (call with lock held)
+        An entry is freed once it has not been attempted for HISTORY_RETENTION, unless the
+        session is still cycling through an active skip; every entry of a session idle for
+        HISTORY_RETENTION is freed (banned / deleted sessions never come back). Sessions and
+        groups left without entries release their interned ids.
+        """
+        now = time.time()
+        for sid, slots in self._session_slots.items():
+            current_cycle = self._session_cycles[sid]
+            session_idle = now - self._session_seen[sid] > HISTORY_RETENTION
+            stale = [
+                gid for gid, slot in slots.items()
+                if now - self._last_seen[slot] > HISTORY_RETENTION
+                and (session_idle or self._skip_until[slot] <= current_cycle)
+            ]
+            for gid in stale:
+                slot = slots.pop(gid)
+                self._clear_slot(slot)
+                self._free_slots.append(slot)
+
+        used_groups = set()
+        for session_name, sid in list(self._session_ids.items()):
+            slots = self._session_slots.get(sid)
+            if slots:
+                used_groups.update(slots)
+            elif now - self._session_seen[sid] > HISTORY_RETENTION:
+                del self._session_ids[session_name]
+                self._session_slots.pop(sid, None)
+                self._session_cycles[sid] = 0
+                self._free_session_ids.append(sid)
+
+        for group_id, gid in list(self._group_ids.items()):
+            if gid not in used_groups:
+                del self._group_ids[group_id]
+                self._group_names[gid] = ""
+                self._free_group_ids.append(gid)
+
+    def _serialize(self) -> Dict:
+        """Compact JSON form: interned names + per-session rows (call with lock held)"""
+        sessions = {}
+        used_groups: Dict[int, int] = {}
+        group_names: List[str] = []
+
+        for session_name, sid in self._session_ids.items():
+            rows = []
+            for gid, slot in self._session_slots.get(sid, {}).items():
+                if gid not in used_groups:
+                    used_groups[gid] = len(group_names)
+                    group_names.append(self._group_names[gid])
+                rows.append([
+                    used_groups[gid],
+                    self._error_counts[slot],
+                    round(self._scores[slot], 4),
+                    self._score_cycles[slot],
+                    self._skip_until[slot],
+                    round(self._success_rate[slot], 4),
+                    round(self._latency[slot], 3),
+                    int(self._last_success[slot]),
+                    int(self._last_seen[slot])
+                ])
+            cycle = self._session_cycles[sid]
+            if rows or cycle:
+                sessions[session_name] = {"cycle": cycle, "entries": rows}
+
+        return {"version": 2, "groups": group_names, "sessions": sessions}
+
+    def checkpoint(self) -> bool:
+        """Write tracker state to disk atomically (temp file + rename)"""
+        if self._checkpoint_file is None:
+            return False
+
+        with self._lock:
+            self._prune()
+            data = self._serialize()
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+
+        temp_file = self._checkpoint_file.with_suffix('.json.tmp')
+        try:
+            self._checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+            temp_file.replace(self._checkpoint_file)
+            return True
+        except Exception as e:
+            print(f"WARNING: Failed to checkpoint error tracker: {e}")
+            try:
+                if temp_file.exists():
+                    temp_file.unlink()
+            except Exception:
+                pass
+            return False
+
+    def maybe_checkpoint(self) -> None:
+        """Checkpoint if dirty and CHECKPOINT_INTERVAL elapsed"""
+        if self._dirty and time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def load(self) -> bool:
+        """Load tracker state from the checkpoint file (missing/corrupt file -> empty tracker)"""
+        if self._checkpoint_file is None or not self._checkpoint_file.exists():
+            return False
+
+        try:
+            with open(self._checkpoint_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"WARNING: Failed to load error tracker checkpoint: {e}. Starting empty.")
+            return False
+
+        group_names = data.get("groups", [])
+        with self._lock:
+            for session_name, session_data in data.get("sessions", {}).items():
+                sid = self._session_id(session_name)
+                self._session_cycles[sid] = int(session_data.get("cycle", 0))
+                for row in session_data.get("entries", []):
+                    try:
+                        group_idx, errors, score, score_cycle, skip_until = row[:5]
+                        _, slot = self._slot(session_name, group_names[group_idx])
+                    except (ValueError, IndexError, TypeError):
+                        continue
+                    self._error_counts[slot] = min(int(errors), 0xFFFF)
+                    self._scores[slot] = float(score)
+                    self._score_cycles[slot] = int(score_cycle)
+                    self._skip_until[slot] = int(skip_until)
+                    # Delivery history (version 2+)
+                    if len(row) >= 9:
+                        self._success_rate[slot] = float(row[5])
+                        self._latency[slot] = float(row[6])
+                        self._last_success[slot] = float(row[7])
+                        self._last_seen[slot] = float(row[8])
+            self._dirty = False
+        return True
+
+
+# Global error tracker instance (loaded lazily from checkpoint)
+_global_error_tracker: Optional[ErrorTracker] = None
+_global_tracker_lock = threading.Lock()
 
 
 def get_error_tracker() -> ErrorTracker:
     """Get the global error tracker instance"""
-    return _global_error_tracker
+    global _global_error_tracker
 
+    if _global_error_tracker is None:
+        with _global_tracker_lock:
+            if _global_error_tracker is None:
+                tracker = ErrorTracker(checkpoint_file=ERROR_TRACKER_FILE)
+                tracker.load()
+                _global_error_tracker = tracker
+    return _global_error_tracker
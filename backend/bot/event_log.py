@@ -0,0 +1,542 @@
+"""
+Event Log - Structured forwarding outcomes
+Every send the engine makes is recorded as one JSON line (user, session, group, cycle,
+outcome, error, error class, latency, timestamp) next to the human-readable user log.
+
+Events are appended to hourly segments in events/YYYYMMDD-HH.jsonl. index.json keeps,
+per segment: the time range, the users / sessions / groups it contains, its failure count
+and a sparse (timestamp, byte offset) index every EVENT_INDEX_STRIDE events. A query
+like "failures for group X in the last 24h" opens only the segments whose time range
+overlaps and whose group set contains X, and seeks straight to the first relevant block.
+
+Writes never touch the disk on the caller's thread: events are queued and a background
+thread appends them in batches (same model as the per-user log writer).
+"""
+
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock, Condition, Thread
+from typing import Optional, List, Dict, Any, Deque
+
+from bot.log_stream import get_log_stream
+
+EVENTS_DIR = Path(__file__).parent.parent / "events"
+
+# Set to 0 to disable structured events
+EVENT_LOG_ENABLED = os.getenv("EVENT_LOG_ENABLED", "1") != "0"
+
+# Max events waiting for the writer thread (newer events are dropped when full)
+EVENT_QUEUE_MAX = int(os.getenv("EVENT_QUEUE_MAX", "100000"))
+
+# Seconds the writer waits to batch events before writing
+EVENT_FLUSH_INTERVAL = 0.5
+
+# One sparse index entry per this many events in a segment
+EVENT_INDEX_STRIDE = 256
+
+# Days of segments kept; 0 keeps everything
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS", "14"))
+
+# Minimum seconds between index checkpoints
+CHECKPOINT_INTERVAL = 30
+
+# Max events returned by one query
+EVENT_QUERY_MAX = 5000
+
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H"
+
+
+def _group_key(group: str) -> str:
+    """Events are indexed per group id (forum topic suffix ignored)"""
+    return group.split('#', 1)[0].strip()
+
+
+def classify_error(error_reason: Optional[str]) -> Optional[str]:
+    """
+    Error class for a forward_to_group error_reason
+
+    Returns:
+        None (no error) | "flood_wait" | "banned" | "group" | "account"
+    """
+    if not error_reason:
+        return None
+    if "FLOODWAIT" in error_reason:
+        return "flood_wait"
+    if error_reason == "ACCOUNT_BANNED" or "banned" in error_reason.lower():
+        return "banned"
+    from bot.group_health import classify_failure
+    return classify_failure(error_reason)
+
+
+def _segment_name(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime(SEGMENT_TIME_FORMAT) + ".jsonl"
+
+
+def _new_segment(name: str) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "start_ts": None,
+        "end_ts": None,
+        "events": 0,
+        "failures": 0,
+        "bytes": 0,
+        "users": set(),
+        "sessions": set(),
+        "groups": set(),
+        "sparse": [],  # [[ts, byte offset], ...]
+    }
+
+
+class EventLog:
+    """
+    Append-only structured event store with a segment index
+    record() is non-blocking; query() reads only the segments the index says can match
+    """
+
+    def __init__(self, events_dir: Path = EVENTS_DIR, max_size: int = EVENT_QUEUE_MAX, flush_interval: float = EVENT_FLUSH_INTERVAL):
+        self.events_dir = events_dir
+        self.index_file = events_dir / "index.json"
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._cond = Condition(Lock())
+        self._index_lock = Lock()
+        self._thread: Optional[Thread] = None
+        self._stopping = False
+        self._loaded = False
+        # {segment name: segment record} in time order
+        self._segments: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self._processed = 0
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "write_errors": 0,
+            "segments_pruned": 0,
+        }
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = Thread(target=self._run, name="event-log-writer", daemon=True)
+            self._thread.start()
+
+    def record(
+        self,
+        user_id: Optional[str],
+        session_name: str,
+        group: str,
+        cycle_number: int,
+        outcome: str,
+        error_reason: Optional[str] = None,
+        latency: Optional[float] = None,
+        ts: Optional[float] = None
+    ) -> bool:
+        """
+        Queue one forwarding outcome (False if disabled or dropped)
+        Also pushed to the user's live stream when someone is watching
+
+        Args:
+            outcome: "success" | "failure" (forward_to_group reported an error) | "error" (exception)
+            latency: Send latency in seconds
+        """
+        stream = get_log_stream()
+        watched = user_id is not None and stream.has_subscribers(user_id)
+        if not EVENT_LOG_ENABLED and not watched:
+            return False
+        event = {
+            "ts": round(ts if ts is not None else time.time(), 3),
+            "user": user_id,
+            "session": session_name,
+            "group": group,
+            "cycle": cycle_number,
+            "outcome": outcome,
+            "error": error_reason,
+            "error_class": classify_error(error_reason) if outcome != "success" else None,
+            "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+        }
+        if watched:
+            stream.publish(user_id, "send", event)
+        if not EVENT_LOG_ENABLED:
+            return False
+        with self._cond:
+            if len(self._queue) >= self.max_size:
+                self._metrics["dropped"] += 1
+                return False
+            self._queue.append(event)
+            self._metrics["enqueued"] += 1
+            self._ensure_thread()
+            self._cond.notify()
+        return True
+
+    def _run(self) -> None:
+        self._ensure_loaded()
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait(CHECKPOINT_INTERVAL)
+                    if not self._queue and self._dirty:
+                        break
+                if not self._queue and self._stopping:
+                    self.checkpoint()
+                    self._cond.notify_all()
+                    return
+            if self._queue and not self._stopping:
+                time.sleep(self.flush_interval)
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+            if batch:
+                self._write_batch(batch)
+            if self._dirty and time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+                self.checkpoint()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        by_segment: Dict[str, List[Dict[str, Any]]] = {}
+        for event in batch:
+            by_segment.setdefault(_segment_name(event["ts"]), []).append(event)
+
+        written = 0
+        new_segment = False
+        for name, events in by_segment.items():
+            path = self.events_dir / name
+            try:
+                self.events_dir.mkdir(parents=True, exist_ok=True)
+                with self._index_lock:
+                    segment = self._segments.get(name)
+                    offset = segment["bytes"] if segment is not None else 0
+                lines = []
+                positions = []
+                for event in events:
+                    line = (json.dumps(event, separators=(',', ':')) + "\n").encode('utf-8')
+                    positions.append(offset)
+                    offset += len(line)
+                    lines.append(line)
+                with open(path, 'ab') as f:
+                    f.write(b"".join(lines))
+                with self._index_lock:
+                    if segment is None:
+                        segment = self._segments.setdefault(name, _new_segment(name))
+                        new_segment = True
+                    for event, position in zip(events, positions):
+                        self._index_event(segment, event, position)
+                    segment["bytes"] = offset
+                    self._dirty = True
+                written += len(events)
+            except Exception as e:
+                self._metrics["write_errors"] += 1
+                print(f"WARNING: Failed to write events to {path}: {e}")
+
+        if new_segment:
+            self.prune()
+
+        with self._cond:
+            self._metrics["written"] += written
+            self._processed += len(batch)
+
+    def _index_event(self, segment: Dict[str, Any], event: Dict[str, Any], position: int) -> None:
+        ts = event["ts"]
+        if segment["events"] % EVENT_INDEX_STRIDE == 0:
+            segment["sparse"].append([ts, position])
+        segment["events"] += 1
+        segment["start_ts"] = ts if segment["start_ts"] is None else min(segment["start_ts"], ts)
+        segment["end_ts"] = ts if segment["end_ts"] is None else max(segment["end_ts"], ts)
+        if event.get("outcome") != "success":
+            segment["failures"] += 1
+        if event.get("user"):
+            segment["users"].add(event["user"])
+        segment["sessions"].add(event["session"])
+        segment["groups"].add(_group_key(event["group"]))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written (False on timeout)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._metrics["enqueued"]
+            while self._processed < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write everything queued, checkpoint the index and stop the writer thread"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def query(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        user_id: Optional[str] = None,
+        session_name: Optional[str] = None,
+        group: Optional[str] = None,
+        outcome: Optional[str] = None,
+        error_class: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict[str, Any]:
+        """
+        Events matching every given filter, newest first
+
+        Args:
+            start / end: Unix timestamps bounding the events (inclusive)
+            outcome: "success" | "failure" | "error", or "failed" for both failure kinds
+            limit: Max events returned (capped at EVENT_QUERY_MAX)
+
+        Returns:
+            {"events", "segments_scanned", "segments_total", "bytes_read", "truncated"}
+        """
+        self._ensure_loaded()
+        limit = max(1, min(limit, EVENT_QUERY_MAX))
+        group_key = _group_key(group) if group else None
+
+        with self._index_lock:
+            segments_total = len(self._segments)
+            candidates = []
+            for segment in self._segments.values():
+                if not segment["events"]:
+                    continue
+                if start is not None and segment["end_ts"] < start:
+                    continue
+                if end is not None and segment["start_ts"] > end:
+                    continue
+                if user_id is not None and user_id not in segment["users"]:
+                    continue
+                if session_name is not None and session_name not in segment["sessions"]:
+                    continue
+                if group_key is not None and group_key not in segment["groups"]:
+                    continue
+                if outcome is not None and outcome != "success" and not segment["failures"]:
+                    continue
+                candidates.append((segment["name"], segment["bytes"], list(segment["sparse"])))
+
+        def matches(event: Dict[str, Any]) -> bool:
+            ts = event.get("ts", 0)
+            if (start is not None and ts < start) or (end is not None and ts > end):
+                return False
+            if user_id is not None and event.get("user") != user_id:
+                return False
+            if session_name is not None and event.get("session") != session_name:
+                return False
+            if group_key is not None and _group_key(event.get("group", "")) != group_key:
+                return False
+            if outcome == "failed":
+                if event.get("outcome") == "success":
+                    return False
+            elif outcome is not None and event.get("outcome") != outcome:
+                return False
+            if error_class is not None and event.get("error_class") != error_class:
+                return False
+            return True
+
+        # Cheap byte checks against the serialized line before parsing it (events are
+        # written with compact separators, so each field appears as '"key":value')
+        needles = []
+        if user_id is not None:
+            needles.append(b'"user":' + json.dumps(user_id).encode('utf-8'))
+        if session_name is not None:
+            needles.append(b'"session":' + json.dumps(session_name).encode('utf-8'))
+        if group_key is not None:
+            needles.append(b'"group":' + json.dumps(group_key).encode('utf-8')[:-1])
+        if outcome is not None and outcome != "failed":
+            needles.append(b'"outcome":' + json.dumps(outcome).encode('utf-8'))
+        exclude = b'"outcome":"success"' if outcome == "failed" else None
+
+        events: List[Dict[str, Any]] = []
+        scanned = 0
+        bytes_read = 0
+        truncated = False
+        for name, size, sparse in sorted(candidates, reverse=True):
+            # Read only the blocks between the sparse entries around start and end
+            # (events are appended in time order)
+            offset, stop = 0, size
+            for entry_ts, entry_offset in sparse:
+                if start is not None and entry_ts <= start:
+                    offset = entry_offset
+                if end is not None and entry_ts > end:
+                    stop = entry_offset
+                    break
+            try:
+                with open(self.events_dir / name, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(stop - offset)
+            except FileNotFoundError:
+                continue
+            scanned += 1
+            bytes_read += len(data)
+
+            found = []
+            for line in data.splitlines():
+                if exclude is not None and exclude in line:
+                    continue
+                if needles and not all(needle in line for needle in needles):
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if matches(event):
+                    found.append(event)
+            found.reverse()
+            events.extend(found)
+            if len(events) >= limit:
+                truncated = len(events) > limit or scanned < len(candidates)
+                events = events[:limit]
+                break
+
+        return {
+            "events": events,
+            "segments_scanned": scanned,
+            "segments_total": segments_total,
+            "bytes_read": bytes_read,
+            "truncated": truncated,
+        }
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Delete segments older than EVENT_RETENTION_DAYS (returns segments deleted)"""
+        if EVENT_RETENTION_DAYS <= 0:
+            return 0
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=EVENT_RETENTION_DAYS)).strftime(SEGMENT_TIME_FORMAT) + ".jsonl"
+        with self._index_lock:
+            expired = [name for name in self._segments if name < cutoff]
+            for name in expired:
+                del self._segments[name]
+            if expired:
+                self._dirty = True
+        for name in expired:
+            try:
+                (self.events_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"WARNING: Failed to delete event segment {name}: {e}")
+        if expired:
+            with self._cond:
+                self._metrics["segments_pruned"] += len(expired)
+        return len(expired)
+
+    def checkpoint(self) -> bool:
+        """Write the segment index atomically (temp file + fsync + rename)"""
+        with self._index_lock:
+            data = {"segments": [
+                {
+                    **segment,
+                    "users": sorted(segment["users"]),
+                    "sessions": sorted(segment["sessions"]),
+                    "groups": sorted(segment["groups"]),
+                    "sparse": list(segment["sparse"]),
+                }
+                for segment in self._segments.values()
+            ]}
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+
+        temp_file = self.index_file.with_suffix('.json.tmp')
+        try:
+            self.events_dir.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+            temp_file.replace(self.index_file)
+            return True
+        except Exception as e:
+            print(f"WARNING: Failed to checkpoint event index: {e}")
+            try:
+                if temp_file.exists():
+                    temp_file.unlink()
+            except Exception:
+                pass
+            return False
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            with self._index_lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+
+    def _load(self) -> None:
+        """
+        Load the index and reconcile it with the segment files (caller holds _index_lock)
+        Bytes appended after the last checkpoint (crash) are indexed by scanning just that tail
+        """
+        indexed: Dict[str, Dict[str, Any]] = {}
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    for record in json.load(f).get("segments", []):
+                        record["users"] = set(record.get("users", []))
+                        record["sessions"] = set(record.get("sessions", []))
+                        record["groups"] = set(record.get("groups", []))
+                        indexed[record["name"]] = record
+            except Exception as e:
+                print(f"WARNING: Failed to load event index: {e}. Rebuilding from segments.")
+                indexed = {}
+
+        if not self.events_dir.exists():
+            return
+
+        rebuilt = 0
+        for path in sorted(self.events_dir.glob("*.jsonl")):
+            segment = indexed.get(path.name) or _new_segment(path.name)
+            size = path.stat().st_size
+            if segment["bytes"] > size:
+                segment = _new_segment(path.name)
+            if segment["bytes"] < size:
+                with open(path, 'rb') as f:
+                    f.seek(segment["bytes"])
+                    data = f.read(size - segment["bytes"])
+                # Drop an unterminated last line (torn write) - it is not indexed or queried
+                complete = data[:data.rfind(b"\n") + 1]
+                position = segment["bytes"]
+                for line in complete.splitlines(keepends=True):
+                    try:
+                        self._index_event(segment, json.loads(line), position)
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    position += len(line)
+                segment["bytes"] = position
+                rebuilt += 1
+            self._segments[path.name] = segment
+
+        if rebuilt:
+            self._dirty = True
+            print(f"INFO: Event index: re-indexed {rebuilt} segment(s)")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, throughput and index size"""
+        self._ensure_loaded()
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["depth"] = len(self._queue)
+        with self._index_lock:
+            metrics["segments"] = len(self._segments)
+            metrics["events_indexed"] = sum(s["events"] for s in self._segments.values())
+            metrics["bytes"] = sum(s["bytes"] for s in self._segments.values())
+        metrics["enabled"] = EVENT_LOG_ENABLED
+        metrics["writer_alive"] = self._thread is not None and self._thread.is_alive()
+        return metrics
+
+
+_event_log = EventLog()
+
+
+def get_event_log() -> EventLog:
+    """Get the global event log"""
+    return _event_log
@@ -0,0 +1,149 @@
+"""
+Fleet Metrics - Fleet-wide health aggregates kept up to date in memory
+Active sessions, last cycle time, last error and forwards per minute are maintained
+incrementally (data_manager on user writes, the worker per cycle, the engine per
+forward, the scheduler on failures) so /api/bot/health and /api/health answer without
+loading users.json / stats.json.
+
+Seeded once from users.json / stats.json on first use, and again if users.json is
+edited outside data_manager (detected through the state versions).
+"""
+
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Optional, Dict, Any, List
+
+from bot.state_versions import get_state_versions, ALL_USER_FIELDS
+
+# Width of the forwards-per-minute window (one bucket per second)
+FORWARD_RATE_WINDOW = 60
+
+
+class FleetMetrics:
+    """
+    In-process fleet aggregates (thread-safe, O(1) reads)
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._loaded = False
+        self._seeded_version = 0
+        self._updates = 0
+        # {user_id: assigned session count} for users with bot_status="running"
+        self._running: Dict[str, int] = {}
+        self._active_sessions = 0
+        self._last_cycle_time: Optional[str] = None
+        self._last_error: Optional[Dict[str, Any]] = None
+        self._cycles = 0
+        # [second, forwards, failures] per slot of the rate window
+        self._buckets: List[List[int]] = [[0, 0, 0] for _ in range(FORWARD_RATE_WINDOW)]
+
+    def ensure_loaded(self) -> None:
+        """Seed from users.json / stats.json (first use, or after an external users.json edit)"""
+        from bot.data_manager import load_users, load_stats, USERS_FILE
+
+        versions = get_state_versions()
+        versions.check_file(USERS_FILE, ALL_USER_FIELDS)
+        users_version = versions.global_version(ALL_USER_FIELDS)
+        if self._loaded and users_version <= self._seeded_version:
+            return
+
+        last_cycle_time = None
+        if not self._loaded:
+            for user_stats in load_stats().values():
+                last_activity = user_stats.get("last_activity")
+                if last_activity and (last_cycle_time is None or last_activity > last_cycle_time):
+                    last_cycle_time = last_activity
+
+        # Re-read if a user write landed while the file was being read
+        while True:
+            updates_seen = self._updates
+            running = {
+                user_id: len(user_data.get("assigned_sessions", []))
+                for user_id, user_data in load_users().items()
+                if user_data.get("bot_status") == "running"
+            }
+            with self._lock:
+                if self._updates != updates_seen:
+                    continue
+                self._running = running
+                self._active_sessions = sum(running.values())
+                if not self._loaded:
+                    self._last_cycle_time = last_cycle_time
+                self._seeded_version = users_version
+                self._loaded = True
+                return
+
+    def update_user(self, user_id: str, bot_status: Optional[str], assigned_sessions: int) -> None:
+        """A user's bot_status or assigned sessions changed (called by data_manager)"""
+        with self._lock:
+            self._updates += 1
+            if not self._loaded:
+                return  # The seed will read the saved file
+            self._active_sessions -= self._running.pop(user_id, 0)
+            if bot_status == "running":
+                self._running[user_id] = assigned_sessions
+                self._active_sessions += assigned_sessions
+
+    def record_cycle(self, user_id: str) -> None:
+        """A user's cycle completed (called by the worker after saving its stats)"""
+        with self._lock:
+            self._last_cycle_time = datetime.now().isoformat()
+            self._cycles += 1
+
+    def record_error(self, message: str, user_id: Optional[str] = None) -> None:
+        """
+        Remember the most recent fleet error
+        The message is shown on unauthenticated health endpoints: keep it generic (no user
+        IDs or exception text) - user_id is kept for internal use only
+        """
+        with self._lock:
+            self._last_error = {
+                "message": message,
+                "user_id": user_id,
+                "time": datetime.now().isoformat(),
+            }
+
+    def record_forward(self, success: bool) -> None:
+        """Count one forward attempt (called by the engine per send)"""
+        second = int(time.time())
+        with self._lock:
+            bucket = self._buckets[second % FORWARD_RATE_WINDOW]
+            if bucket[0] != second:
+                bucket[0], bucket[1], bucket[2] = second, 0, 0
+            bucket[1] += 1
+            if not success:
+                bucket[2] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current aggregates (safe to serve publicly)"""
+        self.ensure_loaded()
+        oldest = int(time.time()) - FORWARD_RATE_WINDOW
+        with self._lock:
+            forwards = failures = 0
+            for second, count, failed in self._buckets:
+                if second > oldest:
+                    forwards += count
+                    failures += failed
+            return {
+                "active_users": len(self._running),
+                "active_sessions": self._active_sessions,
+                "last_cycle_time": self._last_cycle_time,
+                # user_id stays internal - the snapshot is served without authentication
+                "last_error": {
+                    "message": self._last_error["message"],
+                    "time": self._last_error["time"],
+                } if self._last_error else None,
+                "cycles_completed": self._cycles,
+                "forwards_per_minute": forwards,
+                "failures_per_minute": failures,
+            }
+
+
+_fleet_metrics = FleetMetrics()
+
+
+def get_fleet_metrics() -> FleetMetrics:
+    """Get the global fleet metrics"""
+    return _fleet_metrics
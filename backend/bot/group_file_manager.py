@@ -1,11 +1,18 @@
 """
 Group File Manager - Loads groups from .txt files
 Supports STARTER and ENTERPRISE plan group files
+Loaded lists are served as shared, immutable, versioned snapshots (GroupSnapshot)
 """
 
 from pathlib import Path
-from typing import List, Optional
+from threading import Lock
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import codecs
 import os
+import re
+import sys
+import time
 from datetime import datetime
 
 
@@ -27,6 +34,37 @@ def ensure_groups_dir():
         ENTERPRISE_GROUPS_FILE.write_text("", encoding="utf-8")
 
 
+# Fast-path group ID check (compiled, C-speed); misses fall back to group_id_error
+GROUP_ID_RE = re.compile(r"-100[0-9]{3,}")
+
+
+def group_id_error(group: str) -> Optional[str]:
+    """
+    Validate one (stripped) group ID
+    
+    Returns:
+        None if valid, otherwise the reason it is invalid
+    """
+    if GROUP_ID_RE.fullmatch(group):
+        return None
+    
+    # Validate: Must be -100xxxxx format (Telegram supergroup ID)
+    # Format: -1001234567890 (must start with -100 and be followed by digits)
+    if not group.startswith('-100'):
+        return "must start with -100 (e.g., -1001234567890)"
+    
+    # Check that after -100, there are only digits
+    numeric_part = group[4:]  # Everything after -100
+    if not numeric_part or not numeric_part.isdigit():
+        return "must be in format -100 followed by digits (e.g., -1001234567890)"
+    
+    # Ensure minimum length (at least -100 + some digits)
+    if len(group) < 7:  # -100 + at least 3 digits
+        return "too short, must be at least -100xxx"
+    
+    return None
+
+
 def parse_group_file(file_path: Path) -> List[str]:
     """
     Parse group file - one numeric group ID per line
@@ -52,27 +90,10 @@ def parse_group_file(file_path: Path) -> List[str]:
             if not line or line.startswith('#'):
                 continue
             
-            # Validate: Must be -100xxxxx format (Telegram supergroup ID)
-            # Format: -1001234567890 (must start with -100 and be followed by digits)
-            if not line.startswith('-100'):
+            error = group_id_error(line)
+            if error:
                 raise ValueError(
-                    f"Invalid group ID at line {line_num} in {file_path.name}: "
-                    f"'{line}' - must start with -100 (e.g., -1001234567890)"
-                )
-            
-            # Check that after -100, there are only digits
-            numeric_part = line[4:]  # Everything after -100
-            if not numeric_part or not numeric_part.isdigit():
-                raise ValueError(
-                    f"Invalid group ID at line {line_num} in {file_path.name}: "
-                    f"'{line}' - must be in format -100 followed by digits (e.g., -1001234567890)"
-                )
-            
-            # Ensure minimum length (at least -100 + some digits)
-            if len(line) < 7:  # -100 + at least 3 digits
-                raise ValueError(
-                    f"Invalid group ID at line {line_num} in {file_path.name}: "
-                    f"'{line}' - too short, must be at least -100xxx"
+                    f"Invalid group ID at line {line_num} in {file_path.name}: '{line}' - {error}"
                 )
             
             groups.append(line)
@@ -80,6 +101,137 @@ def parse_group_file(file_path: Path) -> List[str]:
     return groups
 
 
+def write_group_file(file_path: Path, groups: Iterable[str]) -> int:
+    """
+    Write a group file atomically (temp file + fsync + rename)
+    
+    Returns:
+        Number of groups written
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = file_path.with_suffix('.txt.tmp')
+    count = 0
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        for group in groups:
+            f.write(group)
+            f.write("\n")
+            count += 1
+        f.flush()
+        if sys.platform != "win32":
+            os.fsync(f.fileno())
+    temp_file.replace(file_path)
+    return count
+
+
+# Max invalid entries reported back by a bulk edit (the count is always exact)
+MAX_REPORTED_ERRORS = 100
+
+# Serializes read-modify-write edits of group files
+_edit_lock = Lock()
+
+
+class GroupBulkParser:
+    """
+    Incremental parser for newline-delimited group ID uploads
+    Feed raw chunks; IDs are validated and de-duplicated as they arrive, so memory
+    holds only the unique valid IDs (never the whole upload)
+    """
+    
+    def __init__(self, max_errors: int = MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.groups: Dict[str, None] = {}   # Insertion-ordered set
+        self.errors: List[Dict[str, Any]] = []
+        self.lines = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial = ""
+    
+    def feed(self, chunk: bytes) -> None:
+        text = self._partial + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        self._parse_lines(lines)
+    
+    def close(self) -> "GroupBulkParser":
+        tail = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        if tail:
+            self._parse_lines([tail])
+        return self
+    
+    def _parse_lines(self, lines: List[str]) -> None:
+        groups = self.groups
+        fullmatch = GROUP_ID_RE.fullmatch
+        for raw in lines:
+            self.lines += 1
+            line = raw.strip()
+            if not line or line.startswith('#'):
+                continue
+            if fullmatch(line) is None:
+                error = group_id_error(line)
+                if error:
+                    self.invalid += 1
+                    if len(self.errors) < self.max_errors:
+                        self.errors.append({"line": self.lines, "group": line[:40], "error": error})
+                    continue
+            if line in groups:
+                self.duplicates += 1
+            else:
+                groups[line] = None
+
+
+def apply_group_edit(plan_type: str, action: str, groups: Iterable[str]) -> Dict[str, Any]:
+    """
+    Apply a replace / add / remove edit to a plan's group file (set semantics, linear time)
+    Groups must already be validated. The file is written atomically and the new
+    snapshot is published before returning
+    
+    Args:
+        plan_type: "STARTER" | "ENTERPRISE"
+        action: "replace" | "add" | "remove"
+        groups: Validated group IDs
+    
+    Returns:
+        {"before", "after", "added", "removed", "version"}
+    """
+    if plan_type not in _PLAN_FILES:
+        raise ValueError(f"Invalid plan_type: {plan_type}. Must be 'STARTER' or 'ENTERPRISE'")
+    if action not in ("replace", "add", "remove"):
+        raise ValueError(f"Invalid action: {action}. Must be 'replace', 'add' or 'remove'")
+    
+    file_path = _PLAN_FILES[plan_type]
+    incoming = dict.fromkeys(groups)   # Ordered de-duplication
+    
+    with _edit_lock:
+        try:
+            current = dict.fromkeys(parse_group_file(file_path))
+        except ValueError:
+            # Corrupted file - start fresh
+            current = {}
+        
+        if action == "replace":
+            new_groups = incoming
+        elif action == "add":
+            new_groups = dict(current)
+            new_groups.update(incoming)
+        else:
+            new_groups = {group: None for group in current if group not in incoming}
+        
+        added = sum(1 for group in new_groups if group not in current)
+        removed = sum(1 for group in current if group not in new_groups)
+        write_group_file(file_path, new_groups)
+        snapshot = get_group_cache().get_snapshot(plan_type, force_reload=True)
+    
+    return {
+        "before": len(current),
+        "after": len(new_groups),
+        "added": added,
+        "removed": removed,
+        "version": snapshot.version,
+    }
+
+
 def get_groups_for_plan(plan_type: str) -> List[str]:
     """
     Get groups for a specific plan type
@@ -107,54 +259,316 @@ def get_file_modification_time(file_path: Path) -> Optional[float]:
     return os.path.getmtime(file_path)
 
 
+def _file_signature(file_path: Path) -> Optional[Tuple[float, int]]:
+    """(mtime, size) of a group file, None if missing"""
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+# Seconds a snapshot is served without re-checking the file (force_reload bypasses it)
+GROUP_FILE_CHECK_INTERVAL = float(os.getenv("GROUP_FILE_CHECK_INTERVAL", "2"))
+
+# Partitions cached per snapshot (one per distinct session count / mode)
+MAX_CACHED_PARTITIONS = 64
+
+# Group diffs kept per plan for in-flight cycles to catch up on
+GROUP_DIFF_HISTORY = 50
+
+_PLAN_FILES = {
+    "STARTER": STARTER_GROUPS_FILE,
+    "ENTERPRISE": ENTERPRISE_GROUPS_FILE,
+}
+
+
+class GroupSnapshot:
+    """
+    Immutable, versioned view of one plan's group file
+    Shared by every worker on the plan - never copied per user. The version only
+    changes when the file content changes (a touch without edits keeps it)
+    """
+    
+    def __init__(self, plan_type: str, version: int, groups: Tuple[str, ...], signature: Optional[Tuple[float, int]]):
+        self.plan_type = plan_type
+        self.version = version
+        self.groups = groups
+        self.signature = signature
+        self.loaded_at = datetime.now().isoformat()
+        self._partitions: Dict[Tuple[str, int], Tuple[Tuple[str, ...], ...]] = {}
+        self._lock = Lock()
+    
+    def __len__(self) -> int:
+        return len(self.groups)
+    
+    def partition(self, num_sessions: int, execution_mode: str = "enterprise") -> Tuple[Tuple[str, ...], ...]:
+        """
+        Group distribution for num_sessions sessions, computed once per (mode, session count)
+        Uses engine.distribute_groups (starter: every session gets all groups; enterprise:
+        contiguous even slices); identical consecutive slices share one tuple
+        """
+        from bot.engine import distribute_groups
+        
+        key = (execution_mode, num_sessions)
+        with self._lock:
+            cached = self._partitions.get(key)
+        if cached is not None:
+            return cached
+        
+        slices: List[Tuple[str, ...]] = []
+        for session_groups in distribute_groups(list(self.groups), num_sessions, execution_mode):
+            session_groups = tuple(session_groups)
+            slices.append(slices[-1] if slices and session_groups == slices[-1] else session_groups)
+        partition: Tuple[Tuple[str, ...], ...] = tuple(slices)
+        
+        with self._lock:
+            if len(self._partitions) >= MAX_CACHED_PARTITIONS:
+                self._partitions.clear()
+            self._partitions.setdefault(key, partition)
+            return self._partitions[key]
+    
+    def info(self) -> Dict[str, Any]:
+        """Version metadata (no group list)"""
+        with self._lock:
+            cached = len(self._partitions)
+        return {
+            "plan_type": self.plan_type,
+            "version": self.version,
+            "count": len(self.groups),
+            "loaded_at": self.loaded_at,
+            "cached_partitions": cached,
+        }
+
+
 class GroupFileCache:
     """
     Cache for group files with modification time tracking
-    Enables reloading when files change
+    Holds one immutable GroupSnapshot per plan; a file change publishes a new
+    snapshot plus an add/remove diff against the previous version, which running
+    cycles consume through CycleGroupFeed
     """
     
-    def __init__(self):
-        self._starter_groups: List[str] = []
-        self._enterprise_groups: List[str] = []
-        self._starter_mtime: Optional[float] = None
-        self._enterprise_mtime: Optional[float] = None
+    def __init__(self, check_interval: float = GROUP_FILE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = Lock()
+        self._snapshots: Dict[str, GroupSnapshot] = {}
+        self._checked_at: Dict[str, float] = {}
+        # {plan_type: deque[{"from_version", "version", "added", "removed"}]}
+        self._diffs: Dict[str, Deque[Dict[str, Any]]] = {}
     
-    def get_starter_groups(self, force_reload: bool = False) -> List[str]:
-        """Get starter groups, reloading if file changed"""
-        ensure_groups_dir()
+    def get_snapshot(self, plan_type: str, force_reload: bool = False) -> GroupSnapshot:
+        """
+        Current snapshot for a plan, reloading if the file changed
+        The file is stat()ed at most once per check_interval unless force_reload
         
-        current_mtime = get_file_modification_time(STARTER_GROUPS_FILE)
+        Raises:
+            ValueError: If plan_type is invalid or the file contains invalid group IDs
+        """
+        if plan_type not in _PLAN_FILES:
+            raise ValueError(f"Invalid plan_type: {plan_type}. Must be 'STARTER' or 'ENTERPRISE'")
         
-        if force_reload or current_mtime != self._starter_mtime:
-            self._starter_groups = parse_group_file(STARTER_GROUPS_FILE)
-            self._starter_mtime = current_mtime
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(plan_type)
+            if (
+                snapshot is not None and not force_reload
+                and now - self._checked_at.get(plan_type, 0) < self.check_interval
+            ):
+                return snapshot
         
-        return self._starter_groups.copy()
-    
-    def get_enterprise_groups(self, force_reload: bool = False) -> List[str]:
-        """Get enterprise groups, reloading if file changed"""
         ensure_groups_dir()
+        file_path = _PLAN_FILES[plan_type]
+        signature = _file_signature(file_path)
         
-        current_mtime = get_file_modification_time(ENTERPRISE_GROUPS_FILE)
-        
-        if force_reload or current_mtime != self._enterprise_mtime:
-            self._enterprise_groups = parse_group_file(ENTERPRISE_GROUPS_FILE)
-            self._enterprise_mtime = current_mtime
+        with self._lock:
+            snapshot = self._snapshots.get(plan_type)
+            if snapshot is not None and not force_reload and snapshot.signature == signature:
+                self._checked_at[plan_type] = now
+                return snapshot
+            
+            groups = tuple(parse_group_file(file_path))
+            if snapshot is not None and snapshot.groups == groups:
+                # Same content (touched / rewritten unchanged) - keep version and partitions
+                snapshot.signature = signature
+            else:
+                previous = snapshot
+                version = previous.version + 1 if previous is not None else 1
+                snapshot = GroupSnapshot(plan_type, version, groups, signature)
+                self._snapshots[plan_type] = snapshot
+                if previous is not None:
+                    self._record_diff(previous, snapshot)
+            self._checked_at[plan_type] = now
+            return snapshot
+    
+    def _record_diff(self, previous: GroupSnapshot, current: GroupSnapshot) -> None:
+        """Store the add/remove diff between two consecutive versions (call with lock held)"""
+        old = set(previous.groups)
+        new = set(current.groups)
+        diff = {
+            "from_version": previous.version,
+            "version": current.version,
+            "added": tuple(group for group in current.groups if group not in old),
+            "removed": frozenset(old - new),
+        }
+        self._diffs.setdefault(current.plan_type, deque(maxlen=GROUP_DIFF_HISTORY)).append(diff)
+    
+    def get_diffs_since(self, plan_type: str, version: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Diffs taking a plan from version to the current one (oldest first)
         
-        return self._enterprise_groups.copy()
+        Returns:
+            List of {"from_version", "version", "added", "removed"} (empty if up to date),
+            or None if the history no longer reaches back to version
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(plan_type)
+            if snapshot is None or snapshot.version == version:
+                return []
+            diffs = [diff for diff in self._diffs.get(plan_type, ()) if diff["from_version"] >= version]
+        if not diffs or diffs[0]["from_version"] != version:
+            return None
+        return diffs
+    
+    def get_starter_groups(self, force_reload: bool = False) -> List[str]:
+        """Get starter groups, reloading if file changed (copy - prefer get_snapshot)"""
+        return list(self.get_snapshot("STARTER", force_reload).groups)
+    
+    def get_enterprise_groups(self, force_reload: bool = False) -> List[str]:
+        """Get enterprise groups, reloading if file changed (copy - prefer get_snapshot)"""
+        return list(self.get_snapshot("ENTERPRISE", force_reload).groups)
     
     def check_file_changed(self, plan_type: str) -> bool:
         """Check if group file has been modified"""
+        if plan_type not in _PLAN_FILES:
+            return False
         ensure_groups_dir()
+        with self._lock:
+            snapshot = self._snapshots.get(plan_type)
+        return snapshot is None or _file_signature(_PLAN_FILES[plan_type]) != snapshot.signature
+    
+    def get_versions(self) -> Dict[str, Dict[str, Any]]:
+        """Loaded snapshot metadata per plan"""
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        return {snapshot.plan_type: snapshot.info() for snapshot in snapshots}
+
+
+class CycleGroupFeed:
+    """
+    Live group changes for ONE user's running cycle
+    Sessions poll it before every send: groups removed from the plan file are skipped,
+    added groups are appended to a session's queue (starter: every session; enterprise:
+    the session with the fewest groups, keeping the partition disjoint). Only the diffs
+    are applied - the group list is never re-parsed or re-partitioned mid-cycle
+    """
+    
+    def __init__(self, plan_type: str, execution_mode: str, base_version: int,
+                 cache: Optional["GroupFileCache"] = None):
+        self.plan_type = plan_type
+        self.execution_mode = execution_mode
+        self.version = base_version
+        self._cache = cache
+        self._lock = Lock()
+        self._loads: Dict[str, int] = {}
+        # Enterprise: {group: session holding it} - removed groups lower that session's load
+        self._owners: Dict[str, str] = {}
+        self._pending: Dict[str, List[str]] = {}
+        self._removed: Set[str] = set()
+        # Removed groups dropped from pending queues: {group: [session names]}
+        self._pruned: Dict[str, List[str]] = {}
+        self.added_count = 0
+        self.removed_count = 0
+    
+    def register_session(self, session_name: str, groups: Sequence[str]) -> None:
+        """Add a session that takes part in the cycle with its slice of the partition actually used"""
+        with self._lock:
+            self._loads[session_name] = len(groups)
+            if self.execution_mode != "starter":
+                for group in groups:
+                    self._owners[group] = session_name
+    
+    def transfer_session(self, old_name: str, new_name: str) -> None:
+        """A spare continues a banned session: it inherits its pending groups and load"""
+        with self._lock:
+            self._loads[new_name] = self._loads.pop(old_name, 0)
+            for group, owner in self._owners.items():
+                if owner == old_name:
+                    self._owners[group] = new_name
+            pending = self._pending.pop(old_name, None)
+            if pending:
+                self._pending[new_name] = pending
+            for sessions in self._pruned.values():
+                if old_name in sessions:
+                    sessions[sessions.index(old_name)] = new_name
+    
+    def poll(self, session_name: str) -> Tuple[Set[str], List[str]]:
+        """
+        Catch up with the plan file and take this session's new groups
         
-        if plan_type == "STARTER":
-            current_mtime = get_file_modification_time(STARTER_GROUPS_FILE)
-            return current_mtime != self._starter_mtime
-        elif plan_type == "ENTERPRISE":
-            current_mtime = get_file_modification_time(ENTERPRISE_GROUPS_FILE)
-            return current_mtime != self._enterprise_mtime
-        else:
-            return False
+        Returns:
+            (groups removed since the cycle started, groups newly added to this session)
+        """
+        cache = self._cache or get_group_cache()
+        try:
+            snapshot = cache.get_snapshot(self.plan_type)
+        except ValueError:
+            snapshot = None   # File being rewritten with invalid content - keep current state
+        
+        with self._lock:
+            if snapshot is not None and snapshot.version != self.version:
+                self._advance(cache, snapshot.version)
+            return self._removed, self._pending.pop(session_name, [])
+    
+    def _advance(self, cache: "GroupFileCache", version: int) -> None:
+        """Apply diffs up to version (call with lock held)"""
+        diffs = cache.get_diffs_since(self.plan_type, self.version)
+        self.version = version
+        if diffs is None:
+            print(f"WARNING: Group diff history for {self.plan_type} expired - changes apply next cycle")
+            return
+        
+        for diff in diffs:
+            for group in diff["removed"]:
+                self.removed_count += 1
+                # Skipped by sessions that already took it, dropped from queues not yet taken
+                self._removed.add(group)
+                self._shift_load(group, -1)
+                pruned = [name for name, queue in self._pending.items() if group in queue]
+                for session_name in pruned:
+                    self._pending[session_name].remove(group)
+                if pruned:
+                    self._pruned[group] = pruned
+            for group in diff["added"]:
+                if group in self._removed:
+                    # Re-added: still in its session's list unless already passed,
+                    # queued again where it had been dropped
+                    self._removed.discard(group)
+                    self._shift_load(group, 1)
+                    for session_name in self._pruned.pop(group, []):
+                        self._pending.setdefault(session_name, []).append(group)
+                    continue
+                self.added_count += 1
+                if not self._loads:
+                    continue
+                if self.execution_mode == "starter":
+                    for session_name in self._loads:
+                        self._pending.setdefault(session_name, []).append(group)
+                else:
+                    session_name = min(self._loads, key=self._loads.get)
+                    self._loads[session_name] += 1
+                    self._owners[group] = session_name
+                    self._pending.setdefault(session_name, []).append(group)
+    
+    def _shift_load(self, group: str, delta: int) -> None:
+        """Adjust the load of the session holding a group (call with lock held)"""
+        owner = self._owners.get(group)
+        if owner in self._loads:
+            self._loads[owner] += delta
+    
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": self.version, "added": self.added_count, "removed": self.removed_count}
 
 
 # Global cache instance
@@ -164,4 +578,3 @@ _global_cache = GroupFileCache()
 def get_group_cache() -> GroupFileCache:
     """Get the global group file cache"""
     return _global_cache
-
@@ -0,0 +1,342 @@
+"""
+Group Health Index - Global health per group id, shared across ALL sessions and users
+Fed by forward_to_group results; consulted when building each cycle's group list
+
+Failure classes:
+- GROUP failures ("Group not found", WRITE_FORBIDDEN): the group itself is gone or bans writes.
+  Quarantined once confirmed by QUARANTINE_MIN_SESSIONS distinct sessions
+- ACCOUNT failures (ACCOUNT_BANNED, FLOODWAIT, not authorized, ...): the sending account's
+  problem, never counted against the group (per-session ErrorTracker handles those)
+
+Quarantined groups are skipped for everyone. After the quarantine period ONE worker claims a
+re-probe; success restores the group, failure re-quarantines it with exponential backoff.
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+GROUP_HEALTH_FILE = DATA_DIR / "group_health.json"
+
+# Distinct sessions that must report a group failure before quarantine
+QUARANTINE_MIN_SESSIONS = int(os.getenv("GROUP_QUARANTINE_MIN_SESSIONS", "2"))
+
+# First quarantine period (seconds), doubled on each failed re-probe up to the max
+QUARANTINE_SECONDS = int(os.getenv("GROUP_QUARANTINE_SECONDS", str(6 * 3600)))
+MAX_QUARANTINE_SECONDS = int(os.getenv("GROUP_MAX_QUARANTINE_SECONDS", str(7 * 24 * 3600)))
+
+# A claimed re-probe that never reports back is released after this many seconds
+PROBE_TIMEOUT = 2 * 3600
+
+# Failure reports older than this no longer count toward quarantine
+FAILURE_WINDOW_SECONDS = 24 * 3600
+
+# Minimum seconds between automatic checkpoints
+CHECKPOINT_INTERVAL = 60
+
+GROUP_FAILURE_MARKERS = ("group not found", "write_forbidden", "no write permission", "channel_private", "channel_invalid")
+
+
+def classify_failure(error_reason: Optional[str]) -> str:
+    """
+    Classify a forward_to_group error_reason
+
+    Returns:
+        "group" (group is gone / bans writes) | "account" (sending account's problem)
+    """
+    reason = (error_reason or "").lower()
+    for marker in GROUP_FAILURE_MARKERS:
+        if marker in reason:
+            return "group"
+    return "account"
+
+
+def _group_key(group: str) -> str:
+    """Health is tracked per group id (forum topic suffix ignored)"""
+    return group.split('#', 1)[0].strip()
+
+
+class GroupHealthIndex:
+    """
+    Global group health keyed by group id
+    Thread-safe; persisted to data/group_health.json
+    """
+
+    def __init__(self, checkpoint_file: Optional[Path] = None):
+        self._lock = Lock()
+        self._checkpoint_file = checkpoint_file
+        # {group_id: record}
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        self._rpcs_avoided_total = 0
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+
+    def _record(self, key: str) -> Dict[str, Any]:
+        record = self._groups.get(key)
+        if record is None:
+            record = {
+                "status": "healthy",        # healthy | suspect | quarantined
+                "reason": None,
+                "failed_sessions": {},      # {session_name: last_failure_ts}
+                "quarantined_until": None,
+                "quarantine_count": 0,
+                "probe_claimed_at": None,
+                "last_success": None,
+                "last_failure": None,
+                "rpcs_avoided": 0,
+            }
+            self._groups[key] = record
+        return record
+
+    def record_result(self, session_name: str, group: str, success: bool, error_reason: Optional[str] = None) -> Optional[str]:
+        """
+        Feed one forward_to_group result
+
+        Returns:
+            New status if it changed ("healthy" | "suspect" | "quarantined"), else None
+        """
+        key = _group_key(group)
+        now = time.time()
+
+        with self._lock:
+            if success:
+                record = self._groups.get(key)
+                if record is None:
+                    return None
+                previous = record["status"]
+                # Any success proves the group is alive - forget group-level failures
+                if previous == "healthy" and not record["failed_sessions"]:
+                    record["last_success"] = now
+                    return None
+                record.update({
+                    "status": "healthy",
+                    "reason": None,
+                    "failed_sessions": {},
+                    "quarantined_until": None,
+                    "quarantine_count": 0,
+                    "probe_claimed_at": None,
+                    "last_success": now,
+                })
+                self._dirty = True
+                return "healthy" if previous != "healthy" else None
+
+            if classify_failure(error_reason) != "group":
+                return None
+
+            record = self._record(key)
+            previous = record["status"]
+            record["last_failure"] = now
+            record["reason"] = error_reason
+
+            if previous == "quarantined":
+                # Failed re-probe: back to quarantine with backoff. Other reports (e.g. the
+                # rest of a starter cycle that hit the threshold) must not double it again
+                if record["probe_claimed_at"] is not None or now >= record["quarantined_until"]:
+                    self._quarantine(record, now)
+                self._dirty = True
+                return None
+
+            failed = record["failed_sessions"]
+            failed[session_name] = now
+            for name, ts in list(failed.items()):
+                if now - ts > FAILURE_WINDOW_SECONDS:
+                    del failed[name]
+
+            if len(failed) >= QUARANTINE_MIN_SESSIONS:
+                self._quarantine(record, now)
+            else:
+                record["status"] = "suspect"
+            self._dirty = True
+            return record["status"] if record["status"] != previous else None
+
+    def _quarantine(self, record: Dict[str, Any], now: float) -> None:
+        """Quarantine with exponential backoff (call with lock held)"""
+        period = min(MAX_QUARANTINE_SECONDS, QUARANTINE_SECONDS * (2 ** record["quarantine_count"]))
+        record["status"] = "quarantined"
+        record["quarantined_until"] = now + period
+        record["quarantine_count"] += 1
+        record["probe_claimed_at"] = None
+
+    def filter_groups(self, groups: List[str], sends_per_group: int = 1) -> Tuple[List[str], int]:
+        """
+        Drop quarantined groups from a cycle's group list
+
+        Groups whose quarantine expired are kept for exactly one caller (re-probe claim).
+
+        Args:
+            groups: Cycle group list (file order)
+            sends_per_group: Sends each group would cost (starter: num_sessions)
+
+        Returns:
+            (groups to send to, number of quarantined groups dropped)
+        """
+        now = time.time()
+        kept = []
+        dropped = 0
+
+        with self._lock:
+            if not self._groups:
+                return list(groups), 0
+
+            for group in groups:
+                record = self._groups.get(_group_key(group))
+                if record is None or record["status"] != "quarantined":
+                    kept.append(group)
+                    continue
+
+                if now >= record["quarantined_until"]:
+                    claimed_at = record["probe_claimed_at"]
+                    if claimed_at is None or now - claimed_at > PROBE_TIMEOUT:
+                        record["probe_claimed_at"] = now
+                        kept.append(group)
+                        self._dirty = True
+                        continue
+
+                dropped += 1
+                record["rpcs_avoided"] += sends_per_group
+                self._rpcs_avoided_total += sends_per_group
+
+            if dropped:
+                self._dirty = True
+
+        return kept, dropped
+
+    def is_quarantined(self, group: str) -> bool:
+        """Check if a group is currently quarantined"""
+        with self._lock:
+            record = self._groups.get(_group_key(group))
+            return bool(record and record["status"] == "quarantined")
+
+    def get_report(self) -> Dict[str, Any]:
+        """Health report including wasted RPCs avoided"""
+        now = time.time()
+
+        def _iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        with self._lock:
+            quarantined = []
+            suspect = []
+            for key, record in self._groups.items():
+                entry = {
+                    "group_id": key,
+                    "reason": record["reason"],
+                    "failed_sessions": len(record["failed_sessions"]),
+                    "quarantine_count": record["quarantine_count"],
+                    "rpcs_avoided": record["rpcs_avoided"],
+                    "last_failure": _iso(record["last_failure"]),
+                }
+                if record["status"] == "quarantined":
+                    entry["quarantined_until"] = _iso(record["quarantined_until"])
+                    entry["probe_due"] = now >= record["quarantined_until"]
+                    quarantined.append(entry)
+                elif record["status"] == "suspect":
+                    suspect.append(entry)
+
+            quarantined.sort(key=lambda e: e["rpcs_avoided"], reverse=True)
+            return {
+                "tracked_groups": len(self._groups),
+                "quarantined_count": len(quarantined),
+                "suspect_count": len(suspect),
+                "rpcs_avoided_total": self._rpcs_avoided_total,
+                "quarantined": quarantined,
+                "suspect": suspect,
+            }
+
+    def release(self, group: str) -> bool:
+        """Manually clear a group's health record (admin override)"""
+        with self._lock:
+            removed = self._groups.pop(_group_key(group), None) is not None
+            if removed:
+                self._dirty = True
+            return removed
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def checkpoint(self) -> bool:
+        """Write index to disk atomically (temp file + rename)"""
+        if self._checkpoint_file is None:
+            return False
+
+        with self._lock:
+            # Healthy records with no pending evidence carry no information
+            data = {
+                "rpcs_avoided_total": self._rpcs_avoided_total,
+                "groups": {
+                    key: record for key, record in self._groups.items()
+                    if record["status"] != "healthy" or record["rpcs_avoided"]
+                }
+            }
+            data = json.loads(json.dumps(data))
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+
+        temp_file = self._checkpoint_file.with_suffix('.json.tmp')
+        try:
+            self._checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+            temp_file.replace(self._checkpoint_file)
+            return True
+        except Exception as e:
+            print(f"WARNING: Failed to checkpoint group health index: {e}")
+            try:
+                if temp_file.exists():
+                    temp_file.unlink()
+            except Exception:
+                pass
+            return False
+
+    def maybe_checkpoint(self) -> None:
+        """Checkpoint if dirty and CHECKPOINT_INTERVAL elapsed"""
+        if self._dirty and time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def load(self) -> bool:
+        """Load index from the checkpoint file (missing/corrupt file -> empty index)"""
+        if self._checkpoint_file is None or not self._checkpoint_file.exists():
+            return False
+        try:
+            with open(self._checkpoint_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"WARNING: Failed to load group health index: {e}. Starting empty.")
+            return False
+
+        with self._lock:
+            self._rpcs_avoided_total = int(data.get("rpcs_avoided_total", 0))
+            for key, saved in data.get("groups", {}).items():
+                record = self._record(key)
+                record.update({k: saved[k] for k in record if k in saved})
+                # In-flight probe claims don't survive a restart
+                record["probe_claimed_at"] = None
+        return True
+
+
+# Global group health index (loaded lazily from checkpoint)
+_global_group_health: Optional[GroupHealthIndex] = None
+_global_health_lock = Lock()
+
+
+def get_group_health() -> GroupHealthIndex:
+    """Get the global group health index"""
+    global _global_group_health
+
+    if _global_group_health is None:
+        with _global_health_lock:
+            if _global_group_health is None:
+                index = GroupHealthIndex(checkpoint_file=GROUP_HEALTH_FILE)
+                index.load()
+                _global_group_health = index
+    return _global_group_health
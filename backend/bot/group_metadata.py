@@ -0,0 +1,353 @@
+"""
+Group Metadata Store - Title, username, forum topic and member count per group id
+Shared across ALL sessions and users; persisted to data/group_metadata.json
+
+Read by forward_to_group (group name for logs, forum topic when the group file has no
+#topic suffix) and by the admin group list - neither asks Telegram anymore.
+
+Populated by a background refresher that rides on clients already connected for a
+cycle: a group's entity can only be resolved by sessions that have it cached (the same
+constraint as forwarding to a raw -100 id), so a dedicated refresher connection would
+fail on most groups. Fetches run with bounded concurrency and only for groups whose
+record is missing or older than GROUP_METADATA_TTL.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional, Iterable
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+GROUP_METADATA_FILE = DATA_DIR / "group_metadata.json"
+
+# Re-verify a group's metadata after this many seconds
+GROUP_METADATA_TTL = int(os.getenv("GROUP_METADATA_TTL", str(24 * 3600)))
+
+# Retry a group whose last fetch failed after this many seconds
+GROUP_METADATA_RETRY = 3600
+
+# Concurrent metadata fetches (all clients together)
+GROUP_METADATA_CONCURRENCY = int(os.getenv("GROUP_METADATA_CONCURRENCY", "4"))
+
+# Max groups one cycle's client refreshes (keeps the extra RPCs small next to the sends)
+GROUP_METADATA_BATCH = int(os.getenv("GROUP_METADATA_BATCH", "20"))
+
+# Seconds allowed per group fetch
+GROUP_METADATA_TIMEOUT = 15
+
+# Minimum seconds between automatic checkpoints
+CHECKPOINT_INTERVAL = 60
+
+
+def _group_key(group: str) -> str:
+    """Metadata is stored per group id (forum topic suffix ignored)"""
+    return group.split('#', 1)[0].strip()
+
+
+async def get_most_active_topic(client, channel) -> Optional[int]:
+    """Most active forum topic id: highest unread_count, then highest top_message (from the archive's scrapper)"""
+    from telethon.tl.functions.channels import GetForumTopicsRequest
+
+    try:
+        topics_result = await client(GetForumTopicsRequest(
+            channel=channel,
+            offset_date=0,
+            offset_id=0,
+            offset_topic=0,
+            limit=100
+        ))
+    except Exception:
+        return None
+
+    most_active = None
+    max_unread = -1
+    max_top_message = -1
+    for topic in getattr(topics_result, "topics", None) or []:
+        if not (hasattr(topic, 'id') and hasattr(topic, 'unread_count') and hasattr(topic, 'top_message')):
+            continue
+        unread = topic.unread_count if topic.unread_count is not None else 0
+        top_msg = topic.top_message if topic.top_message is not None else 0
+        if unread > max_unread or (unread == max_unread and top_msg > max_top_message):
+            max_unread = unread
+            max_top_message = top_msg
+            most_active = topic.id
+    return most_active
+
+
+async def fetch_group_metadata(client, group_id: str) -> Dict[str, Any]:
+    """
+    Fetch one group's metadata from Telegram
+
+    Returns:
+        {"title", "username", "is_forum", "topic_id", "members"}
+    """
+    from telethon.tl.functions.channels import GetFullChannelRequest
+
+    entity = await client.get_entity(int(group_id))
+    is_forum = bool(getattr(entity, "forum", False))
+
+    members = getattr(entity, "participants_count", None)
+    if members is None:
+        try:
+            full = await client(GetFullChannelRequest(entity))
+            members = getattr(full.full_chat, "participants_count", None)
+        except Exception:
+            members = None
+
+    return {
+        "title": getattr(entity, "title", None),
+        "username": getattr(entity, "username", None),
+        "is_forum": is_forum,
+        "topic_id": await get_most_active_topic(client, entity) if is_forum else None,
+        "members": members,
+    }
+
+
+class GroupMetadataStore:
+    """
+    Group metadata keyed by group id
+    Thread-safe; persisted to data/group_metadata.json
+    """
+
+    def __init__(self, checkpoint_file: Optional[Path] = None):
+        self._lock = Lock()
+        self._checkpoint_file = checkpoint_file
+        # {group_id: record}
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        # Groups being fetched right now (one fetch per group across all clients)
+        self._in_flight: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self._fetched = 0
+        self._failed = 0
+
+    def get(self, group: str) -> Optional[Dict[str, Any]]:
+        """Metadata for a group (copy), None if never fetched"""
+        with self._lock:
+            record = self._groups.get(_group_key(group))
+            return dict(record) if record is not None else None
+
+    def get_many(self, groups: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """{group_id: metadata} for the groups that have a record"""
+        with self._lock:
+            result = {}
+            for group in groups:
+                key = _group_key(group)
+                record = self._groups.get(key)
+                if record is not None:
+                    result[key] = dict(record)
+            return result
+
+    def stale(self, groups: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """Group ids whose metadata is missing, expired, or due for a retry (input order)"""
+        now = now or time.time()
+        due = []
+        with self._lock:
+            for group in groups:
+                key = _group_key(group)
+                record = self._groups.get(key)
+                if key in self._in_flight:
+                    continue
+                if record is None:
+                    due.append(key)
+                elif record.get("error"):
+                    if now - record.get("attempted_ts", 0) > GROUP_METADATA_RETRY:
+                        due.append(key)
+                elif now - record.get("verified_ts", 0) > GROUP_METADATA_TTL:
+                    due.append(key)
+        return due
+
+    def update(self, group: str, metadata: Dict[str, Any]) -> None:
+        """Store freshly fetched metadata"""
+        now = time.time()
+        with self._lock:
+            self._groups[_group_key(group)] = {
+                **metadata,
+                "verified_at": datetime.now().isoformat(),
+                "verified_ts": now,
+                "attempted_ts": now,
+                "error": None,
+            }
+            self._fetched += 1
+            self._dirty = True
+
+    def mark_failed(self, group: str, error: str) -> None:
+        """Record a failed fetch (previous metadata is kept)"""
+        with self._lock:
+            key = _group_key(group)
+            record = self._groups.setdefault(key, {
+                "title": None, "username": None, "is_forum": False, "topic_id": None,
+                "members": None, "verified_at": None, "verified_ts": 0,
+            })
+            record["error"] = error[:100]
+            record["attempted_ts"] = time.time()
+            self._failed += 1
+            self._dirty = True
+
+    def invalidate(self, groups: Optional[Iterable[str]] = None) -> int:
+        """Mark metadata stale so the next cycles re-fetch it (all groups if None)"""
+        with self._lock:
+            keys = list(self._groups) if groups is None else [_group_key(g) for g in groups]
+            count = 0
+            for key in keys:
+                record = self._groups.get(key)
+                if record is not None:
+                    record["verified_ts"] = 0
+                    record["attempted_ts"] = 0
+                    count += 1
+            self._dirty = self._dirty or count > 0
+            return count
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(GROUP_METADATA_CONCURRENCY)
+        return self._semaphore
+
+    async def refresh_with_client(self, client, groups: Iterable[str], limit: int = GROUP_METADATA_BATCH) -> int:
+        """
+        Fetch metadata for stale groups using an already connected client
+
+        Args:
+            client: Connected Telethon client (a cycle's session)
+            groups: Candidate groups (only stale ones are fetched)
+            limit: Max groups fetched
+
+        Returns:
+            Number of groups refreshed
+        """
+        due = self.stale(groups)[:limit]
+        with self._lock:
+            due = [key for key in due if key not in self._in_flight]
+            self._in_flight.update(due)
+
+        semaphore = self._get_semaphore()
+        refreshed = 0
+
+        async def fetch(key: str) -> None:
+            nonlocal refreshed
+            try:
+                async with semaphore:
+                    if not client.is_connected():
+                        return
+                    metadata = await asyncio.wait_for(fetch_group_metadata(client, key), timeout=GROUP_METADATA_TIMEOUT)
+                self.update(key, metadata)
+                refreshed += 1
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                self.mark_failed(key, f"Timed out after {GROUP_METADATA_TIMEOUT}s")
+            except Exception as e:
+                self.mark_failed(key, str(e))
+            finally:
+                with self._lock:
+                    self._in_flight.discard(key)
+
+        try:
+            await asyncio.gather(*(fetch(key) for key in due))
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(due)
+            self.maybe_checkpoint()
+        return refreshed
+
+    def summary(self, groups: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Coverage counts (over the given groups, or everything stored)"""
+        now = time.time()
+        with self._lock:
+            keys = list(self._groups) if groups is None else [_group_key(g) for g in groups]
+            known = fresh = failed = forums = 0
+            for key in keys:
+                record = self._groups.get(key)
+                if record is None:
+                    continue
+                if record.get("verified_ts"):
+                    known += 1
+                    if now - record["verified_ts"] <= GROUP_METADATA_TTL:
+                        fresh += 1
+                if record.get("error"):
+                    failed += 1
+                if record.get("is_forum"):
+                    forums += 1
+            return {
+                "groups": len(keys),
+                "known": known,
+                "fresh": fresh,
+                "failed": failed,
+                "forums": forums,
+                "in_flight": len(self._in_flight),
+                "fetched_total": self._fetched,
+                "failed_total": self._failed,
+            }
+
+    def checkpoint(self) -> bool:
+        """Write the store atomically (temp file + fsync + rename)"""
+        if self._checkpoint_file is None:
+            return False
+
+        with self._lock:
+            data = {"groups": json.loads(json.dumps(self._groups))}
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+
+        temp_file = self._checkpoint_file.with_suffix('.json.tmp')
+        try:
+            self._checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+            temp_file.replace(self._checkpoint_file)
+            return True
+        except Exception as e:
+            print(f"WARNING: Failed to checkpoint group metadata: {e}")
+            try:
+                if temp_file.exists():
+                    temp_file.unlink()
+            except Exception:
+                pass
+            return False
+
+    def maybe_checkpoint(self) -> None:
+        """Checkpoint if dirty and CHECKPOINT_INTERVAL elapsed"""
+        if self._dirty and time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def load(self) -> bool:
+        """Load the store from the checkpoint file (missing/corrupt file -> empty store)"""
+        if self._checkpoint_file is None or not self._checkpoint_file.exists():
+            return False
+        try:
+            with open(self._checkpoint_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"WARNING: Failed to load group metadata: {e}. Starting empty.")
+            return False
+
+        with self._lock:
+            self._groups = dict(data.get("groups", {}))
+        return True
+
+
+# Global group metadata store (loaded lazily from checkpoint)
+_global_metadata: Optional[GroupMetadataStore] = None
+_global_metadata_lock = Lock()
+
+
+def get_group_metadata() -> GroupMetadataStore:
+    """Get the global group metadata store"""
+    global _global_metadata
+
+    if _global_metadata is None:
+        with _global_metadata_lock:
+            if _global_metadata is None:
+                store = GroupMetadataStore(checkpoint_file=GROUP_METADATA_FILE)
+                store.load()
+                _global_metadata = store
+    return _global_metadata
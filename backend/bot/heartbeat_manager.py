@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 from threading import Lock
 import sys
 
+from bot.log_stream import get_log_stream
+
 # Import fcntl only on Unix systems
 if sys.platform != "win32":
     import fcntl
@@ -71,6 +73,8 @@ def emit_heartbeat(
     if worker_pid is not None:
         heartbeat["worker_pid"] = worker_pid
     
+    get_log_stream().publish(adbot_id, "cycle", {"state": cycle_state, "timestamp": timestamp})
+    
     with _heartbeats_lock:
         try:
             # Load existing heartbeats
@@ -1,22 +1,230 @@
 """
 Log Saver - Per-user logging
-Logs stored in logs/{user_id}/YYYY-MM-DD.log
+Logs stored in logs/{user_id}/YYYY-MM-DD.log (one file per day, chosen per record);
+past days are gzipped to YYYY-MM-DD.log.gz and expired after LOG_RETENTION_DAYS
 """
 
+import asyncio
+import gzip
 import logging
+import os
+import shutil
+import sys
+import time
+from collections import deque, OrderedDict
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, List, Dict, Any
-from threading import Lock
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Deque, Tuple
+from threading import Lock, Condition, Thread
+
+from bot.log_stream import get_log_stream
+from bot.state_versions import get_state_versions
 
 LOGS_BASE = Path(__file__).parent.parent / "logs"
 log_lock = Lock()
 
 
+# Max records waiting for the writer thread
+LOG_QUEUE_MAX = int(os.getenv("USER_LOG_QUEUE_MAX", "50000"))
+
+# Above this fill ratio DEBUG records are dropped; at LOG_QUEUE_MAX everything below WARNING
+LOG_DROP_DEBUG_RATIO = 0.5
+
+# Seconds the writer waits to batch records before writing
+LOG_FLUSH_INTERVAL = 0.25
+
+# Per-user logger level
+USER_LOG_LEVEL = os.getenv("USER_LOG_LEVEL", "INFO").upper()
+
+# Days of logs kept (plain + compressed); 0 keeps everything
+LOG_RETENTION_DAYS = int(os.getenv("USER_LOG_RETENTION_DAYS", "30"))
+
+# A past day's log is compressed once it has not been written for this many seconds
+LOG_COMPRESS_GRACE = 600
+
+# Tail reader: block size for backwards reads, lines kept per cached tail, cached tails
+TAIL_BLOCK_SIZE = 64 * 1024
+TAIL_CACHE_LINES = 500
+TAIL_CACHE_ENTRIES = 256
+
+# Max bytes a since= sync returns as appended log text (more falls back to the tail)
+LOG_DELTA_MAX_BYTES = 256 * 1024
+
+# Seconds between compression / retention passes
+LOG_MAINTENANCE_INTERVAL = int(os.getenv("USER_LOG_MAINTENANCE_INTERVAL", "3600"))
+
+
+class AsyncLogWriter:
+    """
+    Single background thread writing every user's log records
+    Callers only append to an in-memory queue (never touch the disk); the writer drains
+    it in batches and does one write per log file per batch
+
+    Back-pressure: past LOG_DROP_DEBUG_RATIO of LOG_QUEUE_MAX, DEBUG records are dropped;
+    at LOG_QUEUE_MAX, INFO records too. WARNING and above are always queued
+    """
+
+    def __init__(self, max_size: int = LOG_QUEUE_MAX, flush_interval: float = LOG_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._queue: Deque[Tuple[str, float, str]] = deque()
+        self._cond = Condition(Lock())
+        self._thread: Optional[Thread] = None
+        self._stopping = False
+        self._processed = 0   # Records taken by the writer (written or failed)
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped_debug": 0,
+            "dropped_info": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "max_depth": 0,
+            "write_errors": 0,
+        }
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = Thread(target=self._run, name="user-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, user_id: str, levelno: int, created: float, line: str) -> bool:
+        """Queue one formatted line (False if dropped by back-pressure)"""
+        with self._cond:
+            depth = len(self._queue)
+            if levelno < logging.WARNING:
+                if depth >= self.max_size:
+                    key = "dropped_debug" if levelno < logging.INFO else "dropped_info"
+                    self._metrics[key] += 1
+                    return False
+                if levelno < logging.INFO and depth >= self.max_size * LOG_DROP_DEBUG_RATIO:
+                    self._metrics["dropped_debug"] += 1
+                    return False
+            self._queue.append((user_id, created, line))
+            self._metrics["enqueued"] += 1
+            if depth + 1 > self._metrics["max_depth"]:
+                self._metrics["max_depth"] = depth + 1
+            self._ensure_thread()
+            self._cond.notify()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue and self._stopping:
+                    self._cond.notify_all()
+                    return
+            # Let a burst accumulate so it is written in one go
+            if not self._stopping:
+                time.sleep(self.flush_interval)
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+            self._write_batch(batch)
+            with self._cond:
+                self._cond.notify_all()
+
+    def _write_batch(self, batch: List[Tuple[str, float, str]]) -> None:
+        by_file: Dict[Path, List[str]] = {}
+        for user_id, created, line in batch:
+            day = datetime.fromtimestamp(created).strftime("%Y-%m-%d")
+            by_file.setdefault(LOGS_BASE / user_id / f"{day}.log", []).append(line)
+
+        stream = get_log_stream()
+        versions = get_state_versions()
+        written = 0
+        for log_file, lines in by_file.items():
+            try:
+                log_file.parent.mkdir(parents=True, exist_ok=True)
+                text = "".join(lines)
+                data = text.encode('utf-8')
+                user_id = log_file.parent.name
+                # Append + version bump are atomic for user_log_version() readers
+                with versions.log_lock:
+                    with open(log_file, 'ab') as f:
+                        start = f.tell()
+                        f.write(data)
+                    versions.bump(user_id, ["logs"], log=(log_file.stem, start, start + len(data)))
+                written += len(lines)
+                # Live dashboards get the lines once they are on disk (offsets let a
+                # stream skip lines its snapshot already contained)
+                if stream.has_subscribers(user_id):
+                    stream.publish(user_id, "log", {
+                        "date": log_file.stem,
+                        "lines": text,
+                        "start": start,
+                        "end": start + len(data),
+                    })
+            except Exception as e:
+                self._metrics["write_errors"] += 1
+                print(f"WARNING: Failed to write user log {log_file}: {e}")
+
+        with self._cond:
+            self._metrics["written"] += written
+            self._metrics["batches"] += 1
+            self._metrics["last_batch_size"] = len(batch)
+            self._processed += len(batch)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written (False on timeout)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._metrics["enqueued"]
+            while self._processed < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write everything queued and stop the writer thread (shutdown)"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, throughput and dropped records"""
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["depth"] = len(self._queue)
+        metrics["max_size"] = self.max_size
+        metrics["dropped"] = metrics["dropped_debug"] + metrics["dropped_info"]
+        metrics["writer_alive"] = self._thread is not None and self._thread.is_alive()
+        return metrics
+
+
+_log_writer = AsyncLogWriter()
+
+
+def get_log_writer() -> AsyncLogWriter:
+    """Get the global user log writer"""
+    return _log_writer
+
+
+class QueuedUserLogHandler(logging.Handler):
+    """Formats records on the caller's thread and hands the line to the log writer (no file I/O)"""
+
+    def __init__(self, user_id: str, writer: Optional[AsyncLogWriter] = None):
+        super().__init__()
+        self.user_id = user_id
+        self.writer = writer or _log_writer
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record) + "\n"
+            self.writer.submit(self.user_id, record.levelno, record.created, line)
+        except Exception:
+            self.handleError(record)
+
+
 def get_user_logger(user_id: str) -> logging.Logger:
-    """Get logger for a specific user"""
-    ensure_user_log_dir(user_id)
-    
+    """Get logger for a specific user (writes go through the background log writer)"""
     logger_name = f"adbot_user_{user_id}"
     logger = logging.getLogger(logger_name)
     
@@ -24,24 +232,20 @@ def get_user_logger(user_id: str) -> logging.Logger:
     if logger.handlers:
         return logger
     
-    logger.setLevel(logging.INFO)
-    
-    # Get today's log file
-    today = datetime.now().strftime("%Y-%m-%d")
-    log_file = LOGS_BASE / user_id / f"{today}.log"
+    ensure_user_log_dir(user_id)
+    logger.setLevel(getattr(logging, USER_LOG_LEVEL, logging.INFO))
     
-    # File handler
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
+    # Queue handler - the log file is chosen per record date by the writer
+    handler = QueuedUserLogHandler(user_id)
     
     # Format
     formatter = logging.Formatter(
         '%(asctime)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
-    file_handler.setFormatter(formatter)
+    handler.setFormatter(formatter)
     
-    logger.addHandler(file_handler)
+    logger.addHandler(handler)
     logger.propagate = False  # Don't propagate to root logger
     
     return logger
@@ -53,41 +257,392 @@ def ensure_user_log_dir(user_id: str):
     user_log_dir.mkdir(parents=True, exist_ok=True)
 
 
+def _log_file_date(path: Path) -> Optional[str]:
+    """YYYY-MM-DD of a log file (plain .log or compressed .log.gz), None if not a daily log"""
+    name = path.name
+    for suffix in (".log.gz", ".log"):
+        if name.endswith(suffix):
+            date = name[:-len(suffix)]
+            try:
+                datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                return None
+            return date
+    return None
+
+
+def _open_log(log_file: Path):
+    """Open a plain or gzip-compressed log file for text reading"""
+    if log_file.name.endswith(".gz"):
+        return gzip.open(log_file, 'rt', encoding='utf-8')
+    return open(log_file, 'r', encoding='utf-8')
+
+
+def find_user_log_file(user_id: str, date: str) -> Optional[Path]:
+    """A user's log file for a date - plain if still being written, compressed once archived"""
+    plain = LOGS_BASE / user_id / f"{date}.log"
+    if plain.exists():
+        return plain
+    compressed = LOGS_BASE / user_id / f"{date}.log.gz"
+    if compressed.exists():
+        return compressed
+    return None
+
+
+def tail_lines(log_file: Path, lines: int, block_size: int = TAIL_BLOCK_SIZE, end: Optional[int] = None) -> List[bytes]:
+    """
+    Last `lines` lines of a file, read backwards from the end (or from byte `end`) in blocks
+    Only the tail is read - cost depends on the lines requested, not the file size
+
+    Returns:
+        Raw lines (each ending in a newline except possibly an unterminated last one)
+    """
+    if lines <= 0:
+        return []
+    with open(log_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell() if end is None else min(end, f.tell())
+        chunks: List[bytes] = []
+        newlines = 0
+        first = True
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size)
+            # A trailing newline terminates the last line, it does not start a new one
+            newlines += chunk.count(b"\n") - (1 if first and chunk.endswith(b"\n") else 0)
+            first = False
+            chunks.append(chunk)
+            if newlines >= lines:
+                break
+    parts = b"".join(reversed(chunks)).split(b"\n")
+    last = parts.pop()
+    result = [part + b"\n" for part in parts[-lines:]]
+    if last:
+        result = (result + [last])[-lines:]
+    return result
+
+
+class LogTailCache:
+    """
+    Cached tails of the logs being polled, keyed by (user_id, date)
+    A repeated poll stats the file and reads only the bytes appended since the last one;
+    an unchanged file costs a single stat(). Truncated / replaced files are re-tailed
+    """
+
+    def __init__(self, max_entries: int = TAIL_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = Lock()
+        # {(user_id, date): {"path", "ino", "offset", "lines": deque, "partial": bytes}}
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._metrics = {"hits": 0, "incremental": 0, "full": 0, "bytes_read": 0}
+
+    def tail(self, user_id: str, date: str, log_file: Path, lines: int) -> str:
+        """Last `lines` lines of a user's plain-text log for a date"""
+        return self.tail_with_offset(user_id, date, log_file, lines)[0]
+
+    def tail_with_offset(self, user_id: str, date: str, log_file: Path, lines: int) -> Tuple[str, int]:
+        """
+        Like tail(), also returning the file size the tail was read up to
+        (bytes past that offset are not in the returned text)
+        """
+        stat = log_file.stat()
+        key = (user_id, date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            usable = (
+                entry is not None
+                and entry["path"] == log_file
+                and entry["ino"] == stat.st_ino
+                and entry["offset"] <= stat.st_size
+                and entry["lines"].maxlen >= lines
+            )
+            if usable and entry["offset"] == stat.st_size:
+                self._metrics["hits"] += 1
+                return self._render(entry, lines), entry["offset"]
+
+        if usable:
+            # Read only what was appended since the last poll
+            start = entry["offset"]
+            with open(log_file, 'rb') as f:
+                f.seek(start)
+                appended = f.read(stat.st_size - start)
+            with self._lock:
+                # A concurrent poll may have consumed these bytes already
+                if entry["offset"] == start:
+                    self._append(entry, appended)
+                    entry["offset"] += len(appended)
+                self._metrics["incremental"] += 1
+                self._metrics["bytes_read"] += len(appended)
+                return self._render(entry, lines), entry["offset"]
+
+        capacity = max(lines, TAIL_CACHE_LINES)
+        raw_lines = tail_lines(log_file, capacity, end=stat.st_size)
+        entry = {
+            "path": log_file,
+            "ino": stat.st_ino,
+            "offset": stat.st_size,
+            "lines": deque(maxlen=capacity),
+            "partial": b"",
+        }
+        # An unterminated last line is kept aside until its newline arrives
+        if raw_lines and not raw_lines[-1].endswith(b"\n"):
+            entry["partial"] = raw_lines.pop()
+        entry["lines"].extend(raw_lines)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._metrics["full"] += 1
+            self._metrics["bytes_read"] += sum(len(line) for line in raw_lines) + len(entry["partial"])
+            return self._render(entry, lines), entry["offset"]
+
+    def _append(self, entry: Dict[str, Any], appended: bytes) -> None:
+        data = entry["partial"] + appended
+        parts = data.split(b"\n")
+        entry["partial"] = parts.pop()
+        entry["lines"].extend(part + b"\n" for part in parts)
+
+    def _render(self, entry: Dict[str, Any], lines: int) -> str:
+        if lines <= 0:
+            return ""
+        cached = entry["lines"]
+        selected = list(cached)[-lines:] if lines < len(cached) else list(cached)
+        if entry["partial"]:
+            selected = (selected + [entry["partial"]])[-lines:]
+        return b"".join(selected).decode('utf-8', errors='replace')
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Forget cached tails (one user, or all)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == user_id]:
+                    del self._entries[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._metrics, "entries": len(self._entries)}
+
+
+_tail_cache = LogTailCache()
+
+
+def get_log_tail_cache() -> LogTailCache:
+    """Get the global log tail cache"""
+    return _tail_cache
+
+
 def get_user_logs(user_id: str, date: Optional[str] = None, lines: int = 100) -> str:
-    """Get user's logs for a specific date (default: today)"""
+    """
+    Get user's logs for a specific date (default: today)
+    Plain logs are tailed backwards from the end (cached per user, repeated polls read only
+    new bytes); archived days are read from .log.gz
+    """
     if date is None:
         date = datetime.now().strftime("%Y-%m-%d")
     
-    log_file = LOGS_BASE / user_id / f"{date}.log"
-    
-    if not log_file.exists():
+    log_file = find_user_log_file(user_id, date)
+    if log_file is None:
         return ""
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-            last_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            return "".join(last_lines)
+        if log_file.name.endswith(".gz"):
+            with _open_log(log_file) as f:
+                return "".join(deque(f, maxlen=lines))
+        return _tail_cache.tail(user_id, date, log_file, lines)
+    except Exception:
+        return ""
+
+
+def get_user_log_tail(user_id: str, lines: int = 100) -> Tuple[str, Optional[str], int]:
+    """
+    Today's last `lines` log lines plus where they end, for live streams
+
+    Returns:
+        (text, date, byte offset of today's log the text ends at) - lines written past
+        that offset reach the stream as published "log" items
+    """
+    date = datetime.now().strftime("%Y-%m-%d")
+    log_file = LOGS_BASE / user_id / f"{date}.log"
+    try:
+        text, offset = _tail_cache.tail_with_offset(user_id, date, log_file, lines)
+        return text, date, offset
     except Exception:
+        return "", date, 0
+
+
+def user_log_version(user_id: str) -> Tuple[int, str, int]:
+    """
+    (state version, today's date, today's log size) read together - the log size is
+    exactly what the log writer had written at that version
+
+    Returns:
+        Tuple for delta sync: log lines up to the size belong to versions <= the version
+    """
+    versions = get_state_versions()
+    date = datetime.now().strftime("%Y-%m-%d")
+    with versions.log_lock:
+        version = versions.version(user_id)
+        try:
+            size = (LOGS_BASE / user_id / f"{date}.log").stat().st_size
+        except OSError:
+            size = 0
+    return version, date, size
+
+
+def read_user_log_tail(user_id: str, date: str, end: int, lines: int = 100) -> str:
+    """Last `lines` lines of a user's log for `date` that end before byte `end`"""
+    try:
+        return b"".join(tail_lines(LOGS_BASE / user_id / f"{date}.log", lines, end=end)).decode('utf-8', errors='replace')
+    except OSError:
         return ""
 
 
+def read_user_log_range(user_id: str, date: str, start: int, end: int, max_bytes: int = LOG_DELTA_MAX_BYTES) -> Optional[str]:
+    """
+    Bytes [start, end) of a user's log for `date` (delta sync - offsets come from the
+    state versions, so they always fall on line boundaries written by the log writer)
+
+    Returns:
+        The text, or None if it cannot be served as a delta (file gone / truncated, or
+        more than max_bytes) - the caller falls back to a full tail
+    """
+    if end - start > max_bytes or end < start:
+        return None
+    log_file = LOGS_BASE / user_id / f"{date}.log"
+    try:
+        with open(log_file, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+    except OSError:
+        return None
+    if len(data) != end - start:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+
 def list_user_log_files(user_id: str) -> List[Dict[str, any]]:
-    """List all log files for a user"""
+    """List all log files for a user (newest day first, compressed archives included)"""
     user_log_dir = LOGS_BASE / user_id
     
     if not user_log_dir.exists():
         return []
     
     log_files = []
-    for log_file in sorted(user_log_dir.glob("*.log"), reverse=True):
+    for log_file in user_log_dir.iterdir():
+        date = _log_file_date(log_file)
+        if date is None:
+            continue
         stat = log_file.stat()
         log_files.append({
             "filename": log_file.name,
+            "date": date,
+            "compressed": log_file.name.endswith(".gz"),
             "size": stat.st_size,
             "modified": stat.st_mtime,
             "path": str(log_file.relative_to(LOGS_BASE))
         })
     
+    log_files.sort(key=lambda entry: (entry["date"], not entry["compressed"]), reverse=True)
     return log_files
 
+
+def compress_log_file(log_file: Path) -> Optional[Path]:
+    """
+    Gzip one past day's log (temp file + fsync + rename, then the original is removed)
+    
+    Returns:
+        Path of the .log.gz, or None on failure
+    """
+    target = log_file.with_name(log_file.name + ".gz")
+    temp_file = log_file.with_name(log_file.name + ".gz.tmp")
+    try:
+        with open(temp_file, 'wb') as raw:
+            # Late records for an archived day: append as another gzip member
+            if target.exists():
+                with open(target, 'rb') as existing:
+                    shutil.copyfileobj(existing, raw, 1024 * 1024)
+            with open(log_file, 'rb') as source, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as out:
+                shutil.copyfileobj(source, out, 1024 * 1024)
+            raw.flush()
+            if sys.platform != "win32":
+                os.fsync(raw.fileno())
+        temp_file.replace(target)
+        log_file.unlink()
+        return target
+    except Exception as e:
+        print(f"WARNING: Failed to compress log {log_file}: {e}")
+        try:
+            temp_file.unlink()
+        except FileNotFoundError:
+            pass
+        return None
+
+
+def archive_user_logs(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    One maintenance pass over every user's logs
+    - Past days' .log files are gzipped (once untouched for LOG_COMPRESS_GRACE seconds,
+      so records queued just before midnight have landed)
+    - Files older than LOG_RETENTION_DAYS are deleted (0 keeps everything)
+    
+    Returns:
+        {"compressed", "deleted", "bytes_saved"}
+    """
+    now = now or datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    cutoff = (now - timedelta(days=LOG_RETENTION_DAYS)).strftime("%Y-%m-%d") if LOG_RETENTION_DAYS > 0 else None
+    result = {"compressed": 0, "deleted": 0, "bytes_saved": 0}
+    
+    if not LOGS_BASE.exists():
+        return result
+    
+    for user_log_dir in LOGS_BASE.iterdir():
+        if not user_log_dir.is_dir():
+            continue
+        for log_file in list(user_log_dir.iterdir()):
+            date = _log_file_date(log_file)
+            if date is None:
+                continue
+            try:
+                if cutoff is not None and date < cutoff:
+                    log_file.unlink()
+                    result["deleted"] += 1
+                    continue
+                if log_file.name.endswith(".log") and date < today:
+                    stat = log_file.stat()
+                    if time.time() - stat.st_mtime < LOG_COMPRESS_GRACE:
+                        continue
+                    archive = log_file.with_name(log_file.name + ".gz")
+                    archived_before = archive.stat().st_size if archive.exists() else 0
+                    compressed = compress_log_file(log_file)
+                    if compressed is not None:
+                        result["compressed"] += 1
+                        result["bytes_saved"] += stat.st_size - (compressed.stat().st_size - archived_before)
+            except FileNotFoundError:
+                continue
+    
+    return result
+
+
+async def run_log_maintenance(interval: int = LOG_MAINTENANCE_INTERVAL) -> None:
+    """Compress and expire per-user logs every interval seconds (runs for the process lifetime)"""
+    while True:
+        try:
+            result = await asyncio.to_thread(archive_user_logs)
+            if result["compressed"] or result["deleted"]:
+                print(
+                    f"INFO: Log maintenance: {result['compressed']} file(s) compressed "
+                    f"({result['bytes_saved'] / 1024 / 1024:.1f}MB saved), {result['deleted']} expired"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WARNING: Log maintenance failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,269 @@
+"""
+Log Stream - Live per-user log lines and cycle events for the dashboard (SSE)
+The log writer publishes each user's freshly written lines, the event log publishes
+send outcomes and heartbeats publish cycle state changes. Subscribers receive them from
+an in-memory ring buffer per user instead of polling /api/sync/state.
+
+Channels exist only while a user has subscribers (plus LOG_STREAM_LINGER seconds so a
+reconnect can resume with Last-Event-ID): publishing for a user nobody watches is one
+dict lookup. Memory is bounded by LOG_STREAM_BUFFER items per watched user; a subscriber
+that falls behind the buffer skips ahead (and is told how many items it missed) rather
+than making the buffer grow.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from threading import Lock
+from typing import Optional, List, Dict, Any, Deque, Tuple, AsyncIterator
+
+# Items kept per watched user (a log item is one writer batch, usually several lines)
+LOG_STREAM_BUFFER = int(os.getenv("LOG_STREAM_BUFFER", "256"))
+
+# Seconds a channel (and its buffer) outlives its last subscriber
+LOG_STREAM_LINGER = 60
+
+# Max concurrent subscribers per user / overall
+LOG_STREAM_MAX_PER_USER = int(os.getenv("LOG_STREAM_MAX_PER_USER", "5"))
+LOG_STREAM_MAX_TOTAL = int(os.getenv("LOG_STREAM_MAX_TOTAL", "1000"))
+
+# Seconds between SSE keep-alive comments on a quiet stream
+LOG_STREAM_KEEPALIVE = 15
+
+
+class _Subscriber:
+    """One stream reader: wakes its own event loop when items are published"""
+
+    def __init__(self, user_id: str, last_seq: int):
+        self.user_id = user_id
+        self.last_seq = last_seq
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.event = asyncio.Event()
+
+    def notify(self) -> None:
+        if threading.get_ident() == self.thread_id:
+            self.event.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.event.set)
+            except RuntimeError:
+                pass  # Loop closed
+
+
+class _Channel:
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.buffer: Deque[Tuple[int, str, Dict[str, Any]]] = deque(maxlen=LOG_STREAM_BUFFER)
+        self.next_seq = 1
+        self.subscribers: set = set()
+        self.idle_since: Optional[float] = None
+
+
+class LogStreamHub:
+    """
+    In-process publisher for per-user live streams
+    publish() is thread-safe (the log writer thread and the event loop both publish)
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._channels: Dict[str, _Channel] = {}
+        self._epoch = int(time.time())
+        self._subscribers = 0
+        self._metrics = {"published": 0, "subscribed": 0, "rejected": 0, "lagged": 0}
+
+    def has_subscribers(self, user_id: str) -> bool:
+        """True if someone watches (or recently watched) this user's stream"""
+        return user_id in self._channels
+
+    def publish(self, user_id: str, kind: str, data: Dict[str, Any]) -> bool:
+        """Append an item to the user's stream (no-op for unwatched users)"""
+        if user_id not in self._channels:
+            return False
+        with self._lock:
+            channel = self._channels.get(user_id)
+            if channel is None:
+                return False
+            if not channel.subscribers and time.monotonic() - channel.idle_since > LOG_STREAM_LINGER:
+                del self._channels[user_id]
+                return False
+            channel.buffer.append((channel.next_seq, kind, data))
+            channel.next_seq += 1
+            self._metrics["published"] += 1
+            subscribers = list(channel.subscribers)
+        for subscriber in subscribers:
+            subscriber.notify()
+        return True
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> Tuple[Optional[_Subscriber], bool]:
+        """
+        Register a reader (must be called on its event loop)
+
+        Args:
+            last_event_id: SSE Last-Event-ID from a reconnect ("<epoch>-<seq>")
+
+        Returns:
+            (subscriber or None if over the limits, resumed) - resumed is True when every
+            item after last_event_id is still buffered, so no snapshot is needed
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            channel = self._channels.get(user_id)
+            if self._subscribers >= LOG_STREAM_MAX_TOTAL or (
+                channel is not None and len(channel.subscribers) >= LOG_STREAM_MAX_PER_USER
+            ):
+                self._metrics["rejected"] += 1
+                return None, False
+            if channel is None:
+                self._epoch += 1
+                channel = _Channel(self._epoch)
+                self._channels[user_id] = channel
+
+            resumed = False
+            last_seq = channel.next_seq - 1
+            resume = _parse_event_id(last_event_id)
+            if resume is not None and resume[0] == channel.epoch:
+                oldest = channel.buffer[0][0] if channel.buffer else channel.next_seq
+                if oldest <= resume[1] + 1 <= channel.next_seq:
+                    last_seq = resume[1]
+                    resumed = True
+
+            subscriber = _Subscriber(user_id, last_seq)
+            channel.subscribers.add(subscriber)
+            channel.idle_since = None
+            self._subscribers += 1
+            self._metrics["subscribed"] += 1
+        return subscriber, resumed
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        """Remove a reader (its channel lingers for LOG_STREAM_LINGER seconds)"""
+        with self._lock:
+            channel = self._channels.get(subscriber.user_id)
+            if channel is None or subscriber not in channel.subscribers:
+                return
+            channel.subscribers.discard(subscriber)
+            self._subscribers -= 1
+            if not channel.subscribers:
+                channel.idle_since = time.monotonic()
+
+    def read(self, subscriber: _Subscriber) -> Tuple[List[Tuple[int, str, Dict[str, Any]]], int]:
+        """
+        Items published since the subscriber's last read
+
+        Returns:
+            (items, missed) - missed counts items that left the buffer before being read
+        """
+        with self._lock:
+            channel = self._channels.get(subscriber.user_id)
+            if channel is None or not channel.buffer:
+                return [], 0
+            oldest = channel.buffer[0][0]
+            missed = max(0, oldest - subscriber.last_seq - 1)
+            if missed:
+                self._metrics["lagged"] += 1
+            items = [item for item in channel.buffer if item[0] > subscriber.last_seq]
+            if items:
+                subscriber.last_seq = items[-1][0]
+            return items, missed
+
+    def event_id(self, subscriber: _Subscriber, seq: int) -> str:
+        """SSE id for an item (channel epoch + sequence)"""
+        channel = self._channels.get(subscriber.user_id)
+        return f"{channel.epoch if channel else 0}-{seq}"
+
+    def _sweep(self, now: float) -> None:
+        """Drop channels idle past LOG_STREAM_LINGER (caller holds the lock)"""
+        expired = [
+            user_id for user_id, channel in self._channels.items()
+            if not channel.subscribers and channel.idle_since is not None and now - channel.idle_since > LOG_STREAM_LINGER
+        ]
+        for user_id in expired:
+            del self._channels[user_id]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Subscribers, watched users and buffered items"""
+        with self._lock:
+            self._sweep(time.monotonic())
+            return {
+                **self._metrics,
+                "subscribers": self._subscribers,
+                "channels": len(self._channels),
+                "buffered_items": sum(len(channel.buffer) for channel in self._channels.values()),
+            }
+
+
+def _parse_event_id(event_id: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not event_id:
+        return None
+    try:
+        epoch, seq = event_id.split("-", 1)
+        return int(epoch), int(seq)
+    except ValueError:
+        return None
+
+
+_log_stream = LogStreamHub()
+
+
+def get_log_stream() -> LogStreamHub:
+    """Get the global log stream hub"""
+    return _log_stream
+
+
+def _sse(kind: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {kind}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_user_events(
+    user_id: str,
+    subscriber: _Subscriber,
+    resumed: bool,
+    lines: int = 100,
+    hub: Optional[LogStreamHub] = None
+) -> AsyncIterator[str]:
+    """
+    SSE body for one subscriber
+    Starts with a "snapshot" event (last `lines` lines of today's log) unless the client
+    resumed from the buffer, then streams "log" / "send" / "cycle" / "stats" events.
+    Log items already contained in the snapshot (by byte offset) are skipped.
+    """
+    from bot.log_saver import get_user_log_tail
+
+    hub = hub or _log_stream
+    try:
+        snapshot_date, snapshot_offset = None, 0
+        if not resumed:
+            text, snapshot_date, snapshot_offset = await asyncio.to_thread(get_user_log_tail, user_id, lines)
+            yield _sse("snapshot", {"logs": text, "date": snapshot_date}, hub.event_id(subscriber, subscriber.last_seq))
+
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.event.wait(), timeout=LOG_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            subscriber.event.clear()
+
+            items, missed = hub.read(subscriber)
+            if missed:
+                yield _sse("lagged", {"missed": missed})
+            for seq, kind, data in items:
+                if kind == "log" and data.get("date") == snapshot_date:
+                    if data["end"] <= snapshot_offset:
+                        continue
+                    if data["start"] < snapshot_offset:
+                        skip = snapshot_offset - data["start"]
+                        data = {**data, "lines": data["lines"].encode('utf-8')[skip:].decode('utf-8', errors='replace')}
+                yield _sse(kind, data, hub.event_id(subscriber, seq))
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,375 @@
+"""
+Notifier - Batched outbound alerts (bans, flood waits, failed cycles)
+Successor of the archive's BatchedTelegramLogSender / check_and_send_critical_alert.
+
+notify() is non-blocking and callable from any thread: alerts are coalesced (the same
+kind + key within NOTIFY_COALESCE_WINDOW becomes one alert with a count) and handed to
+every configured destination. run_notifier() delivers each destination's queue in
+batches, within that destination's rate limit, retrying failed batches with exponential
+backoff. Batches that still fail after NOTIFY_MAX_ATTEMPTS - or that overflow a
+destination's queue - are appended to data/notifications_dead_letter.jsonl.
+
+Destinations (env):
+    NOTIFY_WEBHOOK_URLS                           comma-separated URLs, JSON POST {"alerts": [...]}
+    NOTIFY_TELEGRAM_BOT_TOKEN + NOTIFY_TELEGRAM_CHAT_ID   Telegram Bot API sendMessage
+Anything with name / rate_per_minute / send(alerts) can be added with add_destination().
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Optional, List, Dict, Any, Deque, Tuple
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEAD_LETTER_FILE = DATA_DIR / "notifications_dead_letter.jsonl"
+
+# Same kind + key within this many seconds is delivered as one alert (with a count)
+NOTIFY_COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", "10"))
+
+# Max alerts per delivered batch
+NOTIFY_BATCH_MAX = 20
+
+# Max alerts waiting per destination (overflow goes to the dead-letter file)
+NOTIFY_QUEUE_MAX = 1000
+
+# Delivery attempts per batch before it is dead-lettered
+NOTIFY_MAX_ATTEMPTS = 5
+
+# Retry backoff: NOTIFY_BACKOFF_BASE * 2^attempt seconds (+ jitter), capped
+NOTIFY_BACKOFF_BASE = 2.0
+NOTIFY_BACKOFF_MAX = 300.0
+
+# Default deliveries per minute per destination
+NOTIFY_RATE_PER_MINUTE = int(os.getenv("NOTIFY_RATE_PER_MINUTE", "20"))
+
+# Seconds allowed per HTTP delivery
+NOTIFY_HTTP_TIMEOUT = 10
+
+# A cycle with at least this many attempts and this failure ratio raises an alert
+NOTIFY_FAILURE_RATE_MIN_ATTEMPTS = 10
+NOTIFY_FAILURE_RATE = 0.8
+
+SEVERITY_ICONS = {"critical": "🚨", "warning": "⚠️", "info": "ℹ️"}
+
+
+class DeliveryError(Exception):
+    """A destination rejected a batch (retry_after: seconds the destination asked to wait)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _post_json(url: str, payload: Dict[str, Any]) -> bytes:
+    """POST JSON, raising DeliveryError on HTTP errors (honours Retry-After)"""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=NOTIFY_HTTP_TIMEOUT) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        retry_after = None
+        try:
+            retry_after = float(e.headers.get("Retry-After")) if e.headers.get("Retry-After") else None
+        except (TypeError, ValueError):
+            pass
+        raise DeliveryError(f"HTTP {e.code}", retry_after=retry_after)
+    except (urllib.error.URLError, OSError) as e:
+        raise DeliveryError(str(getattr(e, "reason", e)))
+
+
+def format_alert(alert: Dict[str, Any]) -> str:
+    """One line of text for an alert"""
+    icon = SEVERITY_ICONS.get(alert["severity"], "")
+    repeated = f" (x{alert['count']})" if alert.get("count", 1) > 1 else ""
+    return f"{icon} [{alert['kind']}] {alert['message']}{repeated}"
+
+
+class WebhookDestination:
+    """POSTs {"alerts": [...]} as JSON to a URL"""
+
+    def __init__(self, url: str, rate_per_minute: int = NOTIFY_RATE_PER_MINUTE):
+        self.url = url
+        # Host only - webhook paths often embed a secret
+        self.name = f"webhook:{urllib.parse.urlsplit(url).netloc}"
+        self.rate_per_minute = rate_per_minute
+
+    def send(self, alerts: List[Dict[str, Any]]) -> None:
+        _post_json(self.url, {"alerts": alerts})
+
+
+class TelegramBotDestination:
+    """Sends a batch as one Telegram message through the Bot API"""
+
+    def __init__(self, bot_token: str, chat_id: str, rate_per_minute: int = NOTIFY_RATE_PER_MINUTE):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.name = f"telegram:{chat_id}"
+        self.rate_per_minute = rate_per_minute
+
+    def send(self, alerts: List[Dict[str, Any]]) -> None:
+        text = "\n".join(format_alert(alert) for alert in alerts)
+        # Bot API 429s carry Retry-After, so rate limiting is honoured by the retry backoff
+        _post_json(
+            f"https://api.telegram.org/bot{self.bot_token}/sendMessage",
+            {"chat_id": self.chat_id, "text": text[:4000], "disable_web_page_preview": True}
+        )
+
+
+def destinations_from_env() -> List[Any]:
+    """Destinations configured through the environment"""
+    destinations: List[Any] = []
+    for url in os.getenv("NOTIFY_WEBHOOK_URLS", "").split(","):
+        if url.strip():
+            destinations.append(WebhookDestination(url.strip()))
+    bot_token = os.getenv("NOTIFY_TELEGRAM_BOT_TOKEN")
+    chat_id = os.getenv("NOTIFY_TELEGRAM_CHAT_ID")
+    if bot_token and chat_id:
+        destinations.append(TelegramBotDestination(bot_token, chat_id))
+    return destinations
+
+
+class _DestinationState:
+    def __init__(self, destination: Any):
+        self.destination = destination
+        self.queue: Deque[Dict[str, Any]] = deque()
+        self.rate_per_minute = max(1, int(getattr(destination, "rate_per_minute", NOTIFY_RATE_PER_MINUTE)))
+        self.tokens = float(self.rate_per_minute)
+        self.refilled_at = time.monotonic()
+        self.retry_batch: Optional[List[Dict[str, Any]]] = None
+        self.attempts = 0
+        self.next_attempt_at = 0.0
+        self.metrics = {"sent_batches": 0, "sent_alerts": 0, "failed_attempts": 0, "dead_lettered": 0, "last_error": None}
+
+    def take_token(self, now: float) -> bool:
+        """Token bucket: rate_per_minute deliveries per minute, bursts up to the same number"""
+        self.tokens = min(float(self.rate_per_minute), self.tokens + (now - self.refilled_at) * self.rate_per_minute / 60.0)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Notifier:
+    """
+    Coalescing, batched, rate-limited alert delivery
+    notify() is thread-safe; delivery runs on the event loop (run_notifier)
+    """
+
+    def __init__(self, destinations: Optional[List[Any]] = None, dead_letter_file: Path = DEAD_LETTER_FILE,
+                 coalesce_window: float = NOTIFY_COALESCE_WINDOW):
+        self._lock = Lock()
+        self.dead_letter_file = dead_letter_file
+        self.coalesce_window = coalesce_window
+        self._destinations: List[_DestinationState] = [_DestinationState(d) for d in (destinations or [])]
+        # {(kind, key): alert} waiting for the coalescing window to close
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._metrics = {"notified": 0, "coalesced": 0}
+
+    def add_destination(self, destination: Any) -> None:
+        """Register a destination (name, rate_per_minute, send(alerts))"""
+        with self._lock:
+            self._destinations.append(_DestinationState(destination))
+
+    def notify(self, kind: str, message: str, severity: str = "warning", key: Optional[str] = None, **fields: Any) -> None:
+        """
+        Queue an alert
+
+        Args:
+            kind: Alert type ("session_banned", "flood_wait", "cycle_failed", ...)
+            message: Human-readable text
+            severity: "critical" | "warning" | "info"
+            key: Coalescing key within kind (e.g. the session) - repeats in the window are merged
+            fields: Extra JSON-serializable context
+        """
+        if not self._destinations:
+            return
+        now = time.time()
+        pending_key = (kind, key or message)
+        with self._lock:
+            self._metrics["notified"] += 1
+            alert = self._pending.get(pending_key)
+            if alert is not None:
+                alert["count"] += 1
+                alert["message"] = message
+                alert["last_at"] = datetime.fromtimestamp(now).isoformat()
+                alert["fields"].update(fields)
+                self._metrics["coalesced"] += 1
+                return
+            self._pending[pending_key] = {
+                "kind": kind,
+                "severity": severity,
+                "message": message,
+                "key": key,
+                "count": 1,
+                "first_at": datetime.fromtimestamp(now).isoformat(),
+                "last_at": datetime.fromtimestamp(now).isoformat(),
+                "fields": dict(fields),
+                "_opened": now,
+            }
+
+    def _release_pending(self, now: float, force: bool = False) -> None:
+        """Move alerts whose coalescing window closed to every destination's queue"""
+        overflow: List[Dict[str, Any]] = []
+        with self._lock:
+            ready = [k for k, alert in self._pending.items() if force or now - alert["_opened"] >= self.coalesce_window]
+            for pending_key in ready:
+                alert = self._pending.pop(pending_key)
+                alert.pop("_opened", None)
+                for state in self._destinations:
+                    if len(state.queue) >= NOTIFY_QUEUE_MAX:
+                        state.metrics["dead_lettered"] += 1
+                        overflow.append({"destination": state.destination.name, "reason": "queue full", "alerts": [alert]})
+                        continue
+                    state.queue.append(dict(alert))
+        for entry in overflow:
+            self._dead_letter(entry)
+
+    async def deliver_due(self, now: Optional[float] = None, force: bool = False) -> int:
+        """
+        One delivery pass: release closed coalescing windows, then send at most one batch
+        per destination (rate limit and backoff permitting)
+
+        Returns:
+            Alerts delivered
+        """
+        self._release_pending(time.time() if now is None else now, force=force)
+        delivered = 0
+        for state in list(self._destinations):
+            delivered += await self._deliver_one(state, force=force)
+        return delivered
+
+    async def _deliver_one(self, state: _DestinationState, force: bool = False) -> int:
+        monotonic_now = time.monotonic()
+        if state.retry_batch is None:
+            if not state.queue:
+                return 0
+            batch = [state.queue.popleft() for _ in range(min(NOTIFY_BATCH_MAX, len(state.queue)))]
+            state.retry_batch = batch
+            state.attempts = 0
+        elif not force and monotonic_now < state.next_attempt_at:
+            return 0
+        if not force and not state.take_token(monotonic_now):
+            return 0
+
+        batch = state.retry_batch
+        try:
+            await asyncio.to_thread(state.destination.send, batch)
+        except Exception as e:
+            state.attempts += 1
+            state.metrics["failed_attempts"] += 1
+            state.metrics["last_error"] = str(e)[:200]
+            if state.attempts >= NOTIFY_MAX_ATTEMPTS:
+                print(f"WARNING: Notification batch for {state.destination.name} failed {state.attempts} times, dead-lettered: {e}")
+                self._dead_letter({"destination": state.destination.name, "reason": str(e)[:200], "alerts": batch})
+                state.metrics["dead_lettered"] += len(batch)
+                state.retry_batch = None
+                return 0
+            retry_after = getattr(e, "retry_after", None)
+            backoff = min(NOTIFY_BACKOFF_MAX, NOTIFY_BACKOFF_BASE * (2 ** (state.attempts - 1)))
+            state.next_attempt_at = time.monotonic() + max(retry_after or 0, backoff * random.uniform(0.8, 1.2))
+            return 0
+
+        state.retry_batch = None
+        state.attempts = 0
+        state.metrics["sent_batches"] += 1
+        state.metrics["sent_alerts"] += len(batch)
+        return len(batch)
+
+    def _dead_letter(self, entry: Dict[str, Any]) -> None:
+        """Append an undeliverable batch to the dead-letter file (one JSON object per line)"""
+        try:
+            self.dead_letter_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"at": datetime.now().isoformat(), **entry}, ensure_ascii=False) + "\n")
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+        except Exception as e:
+            print(f"ERROR: Failed to write notification dead letter: {e}")
+
+    async def close(self) -> None:
+        """Shutdown: one last delivery attempt for everything queued, the rest is dead-lettered"""
+        self._release_pending(time.time(), force=True)
+        for state in list(self._destinations):
+            while state.retry_batch is not None or state.queue:
+                if await self._deliver_one(state, force=True) > 0:
+                    continue
+                # Destination failing - don't hold up shutdown, keep the rest in the dead-letter file
+                remaining = (state.retry_batch or []) + list(state.queue)
+                state.retry_batch = None
+                state.queue.clear()
+                if remaining:
+                    self._dead_letter({"destination": state.destination.name, "reason": "shutdown", "alerts": remaining})
+                    state.metrics["dead_lettered"] += len(remaining)
+                break
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per-destination delivery counts, queue depth and last error"""
+        with self._lock:
+            return {
+                **self._metrics,
+                "pending": len(self._pending),
+                "destinations": [
+                    {
+                        "name": state.destination.name,
+                        "queued": len(state.queue) + len(state.retry_batch or []),
+                        "retrying": state.retry_batch is not None,
+                        "attempts": state.attempts,
+                        **state.metrics,
+                    }
+                    for state in self._destinations
+                ],
+            }
+
+
+# Global notifier (destinations from the environment)
+_notifier: Optional[Notifier] = None
+_notifier_lock = Lock()
+
+
+def get_notifier() -> Notifier:
+    """Get the global notifier"""
+    global _notifier
+
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                _notifier = Notifier(destinations_from_env())
+    return _notifier
+
+
+def notify(kind: str, message: str, severity: str = "warning", key: Optional[str] = None, **fields: Any) -> None:
+    """Queue an alert on the global notifier"""
+    get_notifier().notify(kind, message, severity=severity, key=key, **fields)
+
+
+async def run_notifier(interval: float = 1.0) -> None:
+    """Background delivery loop (started on app startup)"""
+    notifier = get_notifier()
+    names = [state["name"] for state in notifier.get_metrics()["destinations"]]
+    if names:
+        print(f"INFO: Notifications enabled: {', '.join(names)}")
+    while True:
+        try:
+            await notifier.deliver_due()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"ERROR: Notifier delivery pass failed: {e}")
+        await asyncio.sleep(interval)
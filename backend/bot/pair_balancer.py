@@ -0,0 +1,305 @@
+"""
+API Pair Balancer - Load-aware pair selection from live telemetry
+Replaces first-fit packing (pair 0 filled first, taking the highest request rate and
+flood risk) with a score per pair built from:
+
+- assigned sessions (registry usage counters)
+- active connections (worker sessions + warm spares, tracked on connect/disconnect)
+- requests per minute and flood-wait rate over a sliding window (fed by the engine)
+
+Used by ApiPairRegistry.reserve for new sessions, and by plan_rebalance /
+apply_rebalance to move existing sessions between pairs while their user is between cycles
+"""
+
+import os
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple, Deque
+
+# Telemetry sliding window (seconds)
+TELEMETRY_WINDOW = int(os.getenv("PAIR_TELEMETRY_WINDOW", "600"))
+
+# Pair selection strategy: "balanced" (telemetry score) or "pack" (legacy first-fit)
+PAIR_STRATEGY = os.getenv("PAIR_BALANCE_STRATEGY", "balanced").lower()
+
+# Score weights (assigned-session load is weight 1.0)
+CONNECTION_WEIGHT = 0.5
+RPM_WEIGHT = 0.5
+FLOOD_WEIGHT = 2.0
+
+# Rebalance only while the hottest and coolest pair differ by more than this score
+REBALANCE_THRESHOLD = 0.3
+
+# Max session moves per rebalance run
+MAX_REBALANCE_MOVES = int(os.getenv("PAIR_MAX_REBALANCE_MOVES", "20"))
+
+
+class PairTelemetry:
+    """
+    Live per-api_id telemetry (thread-safe)
+    Keyed by api_id (int), not pair index, so it survives pair list edits
+    """
+
+    def __init__(self, window: int = TELEMETRY_WINDOW):
+        self.window = window
+        self._lock = Lock()
+        self._connections: Dict[int, int] = {}
+        # {api_id: deque[(ts, flood)]}
+        self._requests: Dict[int, Deque[Tuple[float, bool]]] = {}
+
+    def connection_opened(self, api_id: Optional[int]) -> None:
+        if api_id is None:
+            return
+        with self._lock:
+            self._connections[api_id] = self._connections.get(api_id, 0) + 1
+
+    def connection_closed(self, api_id: Optional[int]) -> None:
+        if api_id is None:
+            return
+        with self._lock:
+            remaining = self._connections.get(api_id, 0) - 1
+            if remaining > 0:
+                self._connections[api_id] = remaining
+            else:
+                self._connections.pop(api_id, None)
+
+    def record_request(self, api_id: Optional[int], flood_wait: bool = False) -> None:
+        """Record one forward RPC (flood_wait=True if it hit FLOODWAIT)"""
+        if api_id is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            events = self._requests.setdefault(api_id, deque())
+            events.append((now, flood_wait))
+            self._prune(events, now)
+
+    def _prune(self, events: Deque[Tuple[float, bool]], now: float) -> None:
+        cutoff = now - self.window
+        while events and events[0][0] < cutoff:
+            events.popleft()
+
+    def snapshot(self) -> Dict[int, Dict[str, float]]:
+        """{api_id: {"connections", "rpm", "flood_rate", "requests", "flood_waits"}}"""
+        now = time.monotonic()
+        with self._lock:
+            api_ids = set(self._connections) | set(self._requests)
+            result = {}
+            for api_id in api_ids:
+                events = self._requests.get(api_id)
+                if events is not None:
+                    self._prune(events, now)
+                requests = len(events) if events else 0
+                floods = sum(1 for _, flood in (events or ()) if flood)
+                result[api_id] = {
+                    "connections": self._connections.get(api_id, 0),
+                    "requests": requests,
+                    "flood_waits": floods,
+                    "rpm": round(requests * 60.0 / self.window, 2),
+                    "flood_rate": round(floods / requests, 4) if requests else 0.0,
+                }
+            return result
+
+
+_telemetry = PairTelemetry()
+
+
+def get_pair_telemetry() -> PairTelemetry:
+    """Get the global pair telemetry"""
+    return _telemetry
+
+
+def score_pairs(pairs: List[Dict[str, str]], usage: Dict[int, int], max_per_pair: int,
+                telemetry: Optional[Dict[int, Dict[str, float]]] = None) -> List[Dict[str, Any]]:
+    """
+    Load score per pair index (lower = cooler)
+
+    Returns:
+        [{"index", "api_id", "sessions", "connections", "rpm", "flood_rate", "score"}, ...]
+    """
+    telemetry = telemetry if telemetry is not None else _telemetry.snapshot()
+    max_rpm = max((t["rpm"] for t in telemetry.values()), default=0.0) or 1.0
+
+    scored = []
+    for idx, pair in enumerate(pairs):
+        try:
+            api_id = int(pair["api_id"])
+        except (KeyError, ValueError):
+            api_id = None
+        t = telemetry.get(api_id, {})
+        sessions = usage.get(idx, 0)
+        score = (
+            sessions / max_per_pair
+            + CONNECTION_WEIGHT * t.get("connections", 0) / max_per_pair
+            + RPM_WEIGHT * t.get("rpm", 0.0) / max_rpm
+            + FLOOD_WEIGHT * t.get("flood_rate", 0.0)
+        )
+        scored.append({
+            "index": idx,
+            "api_id": api_id,
+            "sessions": sessions,
+            "connections": t.get("connections", 0),
+            "rpm": t.get("rpm", 0.0),
+            "flood_rate": t.get("flood_rate", 0.0),
+            "score": round(score, 4),
+        })
+    return scored
+
+
+def choose_pairs(num_sessions: int, pairs: List[Dict[str, str]], usage: Dict[int, int],
+                 max_per_pair: int) -> List[int]:
+    """
+    Pick a pair per new session, coolest first, re-scoring after each pick
+    Never exceeds max_per_pair; returns fewer than num_sessions if capacity runs out
+    """
+    if PAIR_STRATEGY == "pack":
+        chosen: List[int] = []
+        for idx in range(len(pairs)):
+            take = min(max_per_pair - usage.get(idx, 0), num_sessions - len(chosen))
+            if take > 0:
+                chosen.extend([idx] * take)
+        return chosen
+
+    telemetry = _telemetry.snapshot()
+    projected = dict(usage)
+    chosen = []
+    for _ in range(num_sessions):
+        candidates = [
+            entry for entry in score_pairs(pairs, projected, max_per_pair, telemetry)
+            if projected.get(entry["index"], 0) < max_per_pair
+        ]
+        if not candidates:
+            break
+        best = min(candidates, key=lambda e: (e["score"], e["index"]))
+        chosen.append(best["index"])
+        projected[best["index"]] = projected.get(best["index"], 0) + 1
+    return chosen
+
+
+def _between_cycles(progress: Optional[Dict[str, Any]]) -> bool:
+    """True if a user has no cycle in flight (never ran, or the last cycle finished)"""
+    return progress is None or progress["finished"]
+
+
+def plan_rebalance(max_moves: int = MAX_REBALANCE_MOVES) -> Dict[str, Any]:
+    """
+    Plan session moves from the hottest pairs to the coolest (dry run)
+    Only users between cycles (none started, or the last one finished) are considered
+
+    Returns:
+        {"moves": [{"user_id", "position", "from", "to"}], "before": scores, "after": scores}
+    """
+    from bot.api_pairs import get_pair_registry, MAX_SESSIONS_PER_PAIR
+    from bot.cycle_timetable import get_cycle_progress
+
+    registry = get_pair_registry()
+    pairs = registry.get_pairs()
+    usage = registry.get_usage()
+    user_pairs = registry.get_all_user_pairs()
+    telemetry = _telemetry.snapshot()
+    before = score_pairs(pairs, usage, MAX_SESSIONS_PER_PAIR, telemetry)
+
+    idle_users = {uid for uid in user_pairs if _between_cycles(get_cycle_progress(uid))}
+    projected = dict(usage)
+    moves: List[Dict[str, Any]] = []
+
+    while len(moves) < max_moves and len(pairs) > 1:
+        scores = score_pairs(pairs, projected, MAX_SESSIONS_PER_PAIR, telemetry)
+        moved_slots = {(m["user_id"], m["position"]) for m in moves}
+        move = None
+
+        # Hottest pair first; a pair with no movable slot must not block the next ones
+        for hot in sorted(scores, key=lambda e: (-e["score"], e["index"])):
+            cool_candidates = [e for e in scores if projected.get(e["index"], 0) < MAX_SESSIONS_PER_PAIR and e["index"] != hot["index"]]
+            if not cool_candidates:
+                continue
+            cool = min(cool_candidates, key=lambda e: e["score"])
+            if hot["score"] - cool["score"] <= REBALANCE_THRESHOLD:
+                continue
+
+            # A session slot on the hot pair owned by an idle user (not already moved)
+            slot = None
+            for uid in sorted(idle_users):
+                for position, pair_idx in enumerate(user_pairs[uid]):
+                    if pair_idx == hot["index"] and (uid, position) not in moved_slots:
+                        slot = (uid, position)
+                        break
+                if slot:
+                    break
+            if slot is None:
+                continue
+
+            # Would the move actually narrow the gap? (telemetry terms don't move with one session)
+            projected[hot["index"]] -= 1
+            projected[cool["index"]] = projected.get(cool["index"], 0) + 1
+            after_move = {e["index"]: e["score"] for e in score_pairs(pairs, projected, MAX_SESSIONS_PER_PAIR, telemetry)}
+            if after_move[cool["index"]] >= hot["score"]:
+                projected[hot["index"]] += 1
+                projected[cool["index"]] -= 1
+                continue
+
+            move = {"user_id": slot[0], "position": slot[1], "from": hot["index"], "to": cool["index"]}
+            break
+
+        if move is None:
+            break
+        moves.append(move)
+
+    return {
+        "moves": moves,
+        "before": before,
+        "after": score_pairs(pairs, projected, MAX_SESSIONS_PER_PAIR, telemetry),
+        "skipped_users_in_cycle": sorted(set(user_pairs) - idle_users),
+    }
+
+
+def apply_rebalance(max_moves: int = MAX_REBALANCE_MOVES) -> Dict[str, Any]:
+    """
+    Plan and apply session moves (users.json api_pairs + registry counters)
+    Each move is re-checked at apply time: skipped if the user started a cycle or
+    the target pair filled up meanwhile
+
+    Returns:
+        Plan with "applied" / "skipped" move lists
+    """
+    from bot.api_pairs import get_pair_registry
+    from bot.cycle_timetable import get_cycle_progress
+    from bot.data_manager import get_user_data, update_user_data
+    from bot.session_inventory import get_session_inventory
+
+    plan = plan_rebalance(max_moves)
+    registry = get_pair_registry()
+    applied = []
+    skipped = []
+
+    by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for move in plan["moves"]:
+        by_user.setdefault(move["user_id"], []).append(move)
+
+    for user_id, moves in by_user.items():
+        if not _between_cycles(get_cycle_progress(user_id)):
+            skipped.extend(moves)
+            continue
+        done = [m for m in moves if registry.move_slot(user_id, m["position"], m["from"], m["to"])]
+        skipped.extend(m for m in moves if m not in done)
+        if not done:
+            continue
+
+        new_pairs = registry.get_user_pairs(user_id)
+        try:
+            update_user_data(user_id, {"api_pairs": new_pairs})
+        except RuntimeError as e:
+            # Read-only mode - undo the counter moves
+            for m in done:
+                registry.move_slot(user_id, m["position"], m["to"], m["from"])
+            skipped.extend(done)
+            print(f"WARNING: Pair rebalance for {user_id} not saved: {e}")
+            continue
+
+        user_data = get_user_data(user_id) or {}
+        get_session_inventory().set_api_pairs(user_data.get("assigned_sessions", []), new_pairs)
+        applied.extend(done)
+
+    plan["applied"] = applied
+    plan["skipped"] = skipped
+    return plan
@@ -12,6 +12,9 @@ from datetime import datetime, timedelta
 from bot.data_manager import get_active_users, get_user_data
 from bot.worker import execute_user_cycle
 from bot.heartbeat_manager import emit_heartbeat, clear_heartbeat
+from bot.cancellation import create_cancellation_token, cancel_user_run, cancel_all_runs
+from bot.notifier import notify
+from bot.fleet_metrics import get_fleet_metrics
 
 # Per-user concurrency limit
 MAX_CONCURRENT_SESSIONS_PER_USER = 7
@@ -74,6 +77,7 @@ class UserScheduler:
                         user_data = get_user_data(user_id)
                         if not user_data or user_data.get("bot_status") != "running":
                             # User stopped, clean up
+                            cancel_user_run(user_id, "stopped")
                             if user_id in self.active_tasks:
                                 self.active_tasks[user_id].cancel()
                                 del self.active_tasks[user_id]
@@ -96,6 +100,7 @@ class UserScheduler:
                                 print(f"WARNING: Failed to auto-stop bot for user {user_id}: {e}")
                             
                             # Clean up scheduler state
+                            cancel_user_run(user_id, f"plan {stored_plan_status}")
                             if user_id in self.active_tasks:
                                 self.active_tasks[user_id].cancel()
                                 del self.active_tasks[user_id]
@@ -174,11 +179,7 @@ class UserScheduler:
         plan_type = "STARTER" if execution_mode == "starter" else "ENTERPRISE"
         try:
             from bot.group_file_manager import get_group_cache
-            group_cache = get_group_cache()
-            if execution_mode == "starter":
-                groups = group_cache.get_starter_groups()
-            else:
-                groups = group_cache.get_enterprise_groups()
+            groups = get_group_cache().get_snapshot(plan_type).groups
             num_groups = len(groups)
         except Exception as e:
             # Fallback to user_data groups if file loading fails
@@ -230,9 +231,14 @@ class UserScheduler:
         
         try:
             async with lock:
+                # Create the run's cancellation token BEFORE the status check,
+                # so a stop arriving after the check still trips this run
+                cancel_token = create_cancellation_token(user_id)
+                
                 # Check if still running
                 user_data = get_user_data(user_id)
                 if not user_data or user_data.get("bot_status") != "running":
+                    cancel_token.cancel("stopped")
                     # Clear heartbeat if stopped
                     clear_heartbeat(user_id)
                     # Clean up cycle gap cache
@@ -243,13 +249,8 @@ class UserScheduler:
                 # Emit heartbeat: cycle running
                 emit_heartbeat(user_id, cycle_state="running")
                 
-                # Execute cycle
-                def is_running():
-                    try:
-                        user_data = get_user_data(user_id)
-                        return user_data and user_data.get("bot_status") == "running"
-                    except Exception:
-                        return False
+                # Execute cycle (O(1) in-memory stop check instead of reading users.json)
+                is_running = cancel_token.is_running
                 
                 try:
                     # Calculate cycle gap for this user (plan-specific)
@@ -262,13 +263,16 @@ class UserScheduler:
                         user_id, 
                         is_running, 
                         cycle_gap,  # Pass plan-specific gap
-                        self.user_semaphores.get(user_id)
+                        self.user_semaphores.get(user_id),
+                        cancel_token
                     )
                     # Emit heartbeat: cycle completed successfully
                     emit_heartbeat(user_id, cycle_state="idle")
                 except Exception as e:
                     # Log and isolate - do NOT propagate to scheduler loop
                     print(f"ERROR: User {user_id} cycle failed: {e}")
+                    notify("cycle_failed", f"User {user_id} cycle failed: {e}", severity="critical", key=user_id, user_id=user_id)
+                    get_fleet_metrics().record_error("User cycle failed", user_id)
                     import traceback
                     traceback.print_exc()
                     # Emit heartbeat even on error (worker is still alive)
@@ -276,6 +280,8 @@ class UserScheduler:
         except Exception as e:
             # Catch any lock-related or other errors - isolate this user
             print(f"ERROR: User {user_id} execution failed (lock/state error): {e}")
+            notify("worker_crashed", f"User {user_id} worker crashed: {e}", severity="critical", key=user_id, user_id=user_id)
+            get_fleet_metrics().record_error("User worker crashed", user_id)
             import traceback
             traceback.print_exc()
             # Clear heartbeat on fatal error
@@ -288,6 +294,9 @@ class UserScheduler:
         """Stop the scheduler gracefully"""
         self.running = False
         
+        # Trip all run tokens so in-flight sleeps wake immediately
+        cancel_all_runs("shutdown")
+        
         # Clear all heartbeats (all workers stopping)
         for user_id in list(self.active_tasks.keys()):
             clear_heartbeat(user_id)
@@ -306,6 +315,12 @@ class UserScheduler:
         
         self.active_tasks.clear()
         self.next_run_at.clear()
+        
+        # Persist error tracking and group health so skip/quarantine state survives the restart
+        from bot.error_tracker import get_error_tracker
+        from bot.group_health import get_group_health
+        get_error_tracker().checkpoint()
+        get_group_health().checkpoint()
     
     def is_user_active(self, user_id: str) -> bool:
         """Check if user has an active task"""
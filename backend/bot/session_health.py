@@ -0,0 +1,441 @@
+"""
+Session Health Checker - Probes sessions by messaging @SpamBot
+Production version of the archive's check_session_health_spambot /
+check_all_sessions_health_parallel
+
+- Bounded concurrency: a global limit plus a per-API-pair limit, sessions spread across pairs
+- Sessions open in a running bot or the warm spare pool are never probed
+- Results cached with timestamps (data/session_health.json); fresh results are not re-probed
+- Results are yielded as each probe completes (progressive streaming)
+- Telethon is pluggable: set_client_factory() swaps in a local fake for testing
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional, Callable, AsyncIterator, Tuple
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+HEALTH_CACHE_FILE = DATA_DIR / "session_health.json"
+
+# Seconds a cached result stays fresh
+HEALTH_CACHE_TTL = int(os.getenv("SESSION_HEALTH_TTL", "3600"))
+
+# Concurrent probes overall / per API pair
+HEALTH_CONCURRENCY = int(os.getenv("SESSION_HEALTH_CONCURRENCY", "10"))
+HEALTH_PER_PAIR_CONCURRENCY = int(os.getenv("SESSION_HEALTH_PER_PAIR", "3"))
+
+# Seconds allowed for one whole probe (connect + @SpamBot round trip)
+HEALTH_CHECK_TIMEOUT = 30
+
+# Seconds to wait for @SpamBot's reply (polled, not a fixed sleep)
+SPAMBOT_REPLY_WAIT = 6
+SPAMBOT_POLL_INTERVAL = 0.5
+
+# Statuses (matches the admin UI: active, limited, frozen, unauthorized, banned)
+STATUS_ACTIVE = "active"
+STATUS_LIMITED = "limited"
+STATUS_FROZEN = "frozen"
+STATUS_BANNED = "banned"
+STATUS_UNAUTHORIZED = "unauthorized"
+STATUS_UNKNOWN = "unknown"
+STATUS_FAILED = "failed"
+# Not probed: the file is open in a running bot or the spare pool (never cached)
+STATUS_IN_USE = "in_use"
+
+# Readiness of a pool session, derived from its health status
+READINESS_READY = "ready"
+READINESS_DEAD = "dead"
+READINESS_FROZEN = "frozen"
+READINESS_UNCHECKED = "unchecked"
+
+_READINESS = {
+    STATUS_ACTIVE: READINESS_READY,
+    STATUS_UNAUTHORIZED: READINESS_DEAD,
+    STATUS_BANNED: READINESS_DEAD,
+    STATUS_FROZEN: READINESS_FROZEN,
+    STATUS_LIMITED: READINESS_FROZEN,
+}
+
+
+def readiness(status: Optional[str]) -> str:
+    """Map a health status to ready / dead / frozen / unchecked"""
+    return _READINESS.get(status, READINESS_UNCHECKED)
+
+
+def session_in_use(filename: str, record: Optional[Dict[str, Any]]) -> bool:
+    """True if a running user's worker, the spare pool or a background job may have the session file open"""
+    from bot.scheduler import get_scheduler
+    from bot.session_manager import get_reserved_sessions
+
+    if filename in get_reserved_sessions():
+        return True
+    owner = record.get("owner") if record else None
+    scheduler = get_scheduler()
+    return bool(owner and scheduler and scheduler.is_user_active(owner))
+
+
+def classify_spambot_reply(text: Optional[str]) -> Tuple[str, Optional[str]]:
+    """
+    Classify a @SpamBot reply
+
+    Returns:
+        (status, details) - details is the release date / limit type / unknown text
+    """
+    reply = (text or "").lower()
+
+    if "good news" in reply and "no limits" in reply:
+        return (STATUS_ACTIVE, None)
+
+    if "limited until" in reply:
+        date_match = re.search(r'until\s+(\d{1,2}\s+\w+\s+\d{4})', reply)
+        return (STATUS_LIMITED, f"temporary until {date_match.group(1)}" if date_match else "temporary")
+
+    if ("harsh response" in reply and "anti-spam" in reply) or \
+       ("submit a complaint" in reply and "moderators" in reply):
+        return (STATUS_LIMITED, "hard")
+
+    if "account was blocked" in reply and "terms of service" in reply:
+        return (STATUS_FROZEN, None)
+
+    return (STATUS_UNKNOWN, f"Unknown response: {reply[:100]}" if reply else "No response from @SpamBot")
+
+
+def _telethon_client_factory(session_path: str, api_id: int, api_hash: str):
+    """Default client factory (real Telethon)"""
+    from telethon import TelegramClient
+    return TelegramClient(session_path, api_id, api_hash)
+
+
+async def probe_session(client, reply_wait: float = SPAMBOT_REPLY_WAIT) -> Tuple[str, Optional[str]]:
+    """
+    Probe one connected-or-not client via @SpamBot
+
+    The client only needs: connect, is_user_authorized, send_message,
+    get_messages and disconnect (Telethon signatures)
+    """
+    try:
+        await client.connect()
+        if not await client.is_user_authorized():
+            return (STATUS_UNAUTHORIZED, "Not authorized")
+
+        sent = await client.send_message('spambot', '/start')
+        sent_id = getattr(sent, "id", 0) or 0
+
+        # Poll for the reply instead of sleeping a fixed 2s
+        deadline = time.monotonic() + reply_wait
+        while True:
+            messages = await client.get_messages('spambot', limit=5)
+            for msg in messages or []:
+                if not msg.out and (getattr(msg, "id", 0) or 0) > sent_id:
+                    return classify_spambot_reply(msg.message)
+            if time.monotonic() >= deadline:
+                return (STATUS_UNKNOWN, "No response from @SpamBot")
+            await asyncio.sleep(SPAMBOT_POLL_INTERVAL)
+    except Exception as e:
+        error_str = str(e)
+        lowered = error_str.lower()
+        if "deactivated" in lowered or "banned" in lowered:
+            return (STATUS_BANNED, error_str[:100])
+        if "auth key" in lowered or "unregistered" in lowered:
+            return (STATUS_UNAUTHORIZED, error_str[:100])
+        return (STATUS_FAILED, error_str[:100])
+    finally:
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+
+
+class SessionHealthChecker:
+    """
+    Parallel @SpamBot health checker with a timestamped result cache
+    One global instance (get_session_health_checker); safe to call from concurrent requests
+    """
+
+    def __init__(self, client_factory: Optional[Callable] = None, cache_file: Optional[Path] = None):
+        self._client_factory = client_factory or _telethon_client_factory
+        self._cache_file = cache_file
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache_lock = Lock()
+        self._dirty = False
+        # Probes in flight: {filename: Future} (concurrent callers share one probe)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Semaphores are created lazily on the event loop that uses them
+        self._global_sem: Optional[asyncio.Semaphore] = None
+        self._pair_sems: Dict[int, asyncio.Semaphore] = {}
+
+    def set_client_factory(self, factory: Optional[Callable]) -> None:
+        """Swap the Telegram client factory (None restores Telethon)"""
+        self._client_factory = factory or _telethon_client_factory
+
+    def make_client(self, session_path: str, api_id: int, api_hash: str):
+        """Create a Telegram client through the configured factory"""
+        return self._client_factory(session_path, api_id, api_hash)
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def get_cached(self, filename: str, max_age: Optional[float] = HEALTH_CACHE_TTL) -> Optional[Dict[str, Any]]:
+        """Cached result if younger than max_age seconds (None max_age = any age)"""
+        with self._cache_lock:
+            result = self._cache.get(filename)
+            if result is None:
+                return None
+            if max_age is not None and time.time() - result["checked_ts"] > max_age:
+                return None
+            return dict(result)
+
+    def get_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of all cached results"""
+        with self._cache_lock:
+            return {name: dict(result) for name, result in self._cache.items()}
+
+    def _store(self, filename: str, result: Dict[str, Any]) -> None:
+        with self._cache_lock:
+            self._cache[filename] = result
+            self._dirty = True
+
+    def store_result(self, filename: str, status: str, details: Optional[str], location: str,
+                     pair_idx: Optional[int] = None, duration: float = 0.0) -> Dict[str, Any]:
+        """Cache a result probed elsewhere (e.g. bulk import validation)"""
+        now = time.time()
+        result = {
+            "status": status,
+            "details": details,
+            "location": location,
+            "api_pair": pair_idx,
+            "checked_at": datetime.fromtimestamp(now).isoformat(),
+            "checked_ts": now,
+            "duration": round(duration, 2),
+        }
+        if status != STATUS_FAILED:
+            self._store(filename, result)
+        return result
+
+    def save(self) -> bool:
+        """Write cache to disk atomically (temp file + rename)"""
+        if self._cache_file is None:
+            return False
+        with self._cache_lock:
+            if not self._dirty:
+                return True
+            data = {"results": dict(self._cache)}
+            self._dirty = False
+
+        temp_file = self._cache_file.with_suffix('.json.tmp')
+        try:
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                if sys.platform != "win32":
+                    os.fsync(f.fileno())
+            temp_file.replace(self._cache_file)
+            return True
+        except Exception as e:
+            print(f"WARNING: Failed to save session health cache: {e}")
+            try:
+                if temp_file.exists():
+                    temp_file.unlink()
+            except Exception:
+                pass
+            return False
+
+    def load(self) -> bool:
+        """Load cache from disk (missing/corrupt file -> empty cache)"""
+        if self._cache_file is None or not self._cache_file.exists():
+            return False
+        try:
+            with open(self._cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"WARNING: Failed to load session health cache: {e}. Starting empty.")
+            return False
+        with self._cache_lock:
+            self._cache.update(data.get("results", {}))
+        return True
+
+    # ------------------------------------------------------------------
+    # Probing
+    # ------------------------------------------------------------------
+
+    def _pair_semaphore(self, pair_idx: int) -> asyncio.Semaphore:
+        sem = self._pair_sems.get(pair_idx)
+        if sem is None:
+            sem = asyncio.Semaphore(HEALTH_PER_PAIR_CONCURRENCY)
+            self._pair_sems[pair_idx] = sem
+        return sem
+
+    async def _probe(self, filename: str, pair_idx: int, pair: Dict[str, str]) -> Dict[str, Any]:
+        """Probe one session under the global + per-pair limits and cache the result"""
+        from bot.session_inventory import get_session_inventory
+
+        inventory = get_session_inventory()
+        record = inventory.get(filename)
+        location = record["location"] if record else "unknown"
+        session_path = inventory.path_of(filename)
+
+        if self._global_sem is None:
+            self._global_sem = asyncio.Semaphore(HEALTH_CONCURRENCY)
+
+        started = time.monotonic()  # Re-set once semaphores are acquired
+        if session_path is None or not session_path.exists():
+            status, details = (STATUS_UNKNOWN, "File not found")
+        else:
+            # Pair slot first: probes queued on a busy pair must not hold global slots
+            # that other pairs could use
+            async with self._pair_semaphore(pair_idx), self._global_sem:
+                started = time.monotonic()
+                if session_in_use(filename, inventory.get(filename)):
+                    # Became in use while queued - don't open the file from a second client
+                    return {"status": STATUS_IN_USE, "details": "Session in use - not probed", "location": location, "api_pair": pair_idx}
+                try:
+                    client = self._client_factory(str(session_path), int(pair["api_id"]), pair["api_hash"])
+                    status, details = await asyncio.wait_for(probe_session(client), timeout=HEALTH_CHECK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    status, details = (STATUS_FAILED, f"Timed out after {HEALTH_CHECK_TIMEOUT}s")
+                except Exception as e:
+                    status, details = (STATUS_FAILED, str(e)[:100])
+
+        now = time.time()
+        result = {
+            "status": status,
+            "details": details,
+            "location": location,
+            "api_pair": pair_idx,
+            "checked_at": datetime.fromtimestamp(now).isoformat(),
+            "checked_ts": now,
+            "duration": round(time.monotonic() - started, 2),
+        }
+        # Failed probes (network, timeout) say nothing about the session - don't cache them
+        if status != STATUS_FAILED:
+            self._store(filename, result)
+            inventory.set_status(filename, status)
+        return result
+
+    def _assign_pairs(self, filenames: List[str], pairs: List[Dict[str, str]]) -> List[int]:
+        """Assigned sessions reuse their own pair; the rest round-robin across pairs"""
+        from bot.session_inventory import get_session_inventory
+
+        inventory = get_session_inventory()
+        indexes = []
+        next_idx = 0
+        for filename in filenames:
+            record = inventory.get(filename)
+            pair_idx = record.get("api_pair") if record else None
+            if pair_idx is None or pair_idx >= len(pairs):
+                pair_idx = next_idx % len(pairs)
+                next_idx += 1
+            indexes.append(pair_idx)
+        return indexes
+
+    async def check_sessions(
+        self,
+        filenames: List[str],
+        max_age: Optional[float] = HEALTH_CACHE_TTL,
+        force: bool = False
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Check sessions, yielding (filename, result) as each completes
+
+        Cached results younger than max_age are yielded first without probing
+        (force=True re-probes everything). A session already being probed by
+        another caller is awaited rather than probed twice. Sessions assigned to a
+        running user or held as warm spares are not probed (status "in_use", or
+        their last cached result).
+        """
+        from bot.api_pairs import load_api_pairs
+
+        from bot.session_inventory import get_session_inventory
+
+        inventory = get_session_inventory()
+        to_probe = []
+        for filename in dict.fromkeys(filenames):
+            cached = None if force else self.get_cached(filename, max_age)
+            if cached is not None:
+                cached["cached"] = True
+                yield filename, cached
+            elif session_in_use(filename, inventory.get(filename)):
+                # A running bot / warm spare has the file open: last known result, if any
+                cached = self.get_cached(filename, None)
+                if cached is not None:
+                    cached["cached"] = True
+                    yield filename, cached
+                else:
+                    yield filename, {"status": STATUS_IN_USE, "details": "Session in use - not probed", "cached": False}
+            else:
+                to_probe.append(filename)
+
+        if not to_probe:
+            return
+
+        pairs = load_api_pairs()
+        if not pairs:
+            for filename in to_probe:
+                yield filename, {"status": STATUS_FAILED, "details": "No API pairs configured", "cached": False}
+            return
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for filename, pair_idx in zip(to_probe, self._assign_pairs(to_probe, pairs)):
+            future = self._in_flight.get(filename)
+            if future is None:
+                future = loop.create_task(self._probe(filename, pair_idx, pairs[pair_idx]))
+                self._in_flight[filename] = future
+                future.add_done_callback(lambda _f, name=filename: self._in_flight.pop(name, None))
+            futures.append((filename, future))
+
+        async def _wait(filename, future):
+            try:
+                result = dict(await asyncio.shield(future))
+            except Exception as e:
+                result = {"status": STATUS_FAILED, "details": str(e)[:100]}
+            result["cached"] = False
+            return filename, result
+
+        try:
+            for next_done in asyncio.as_completed([_wait(name, fut) for name, fut in futures]):
+                yield await next_done
+        finally:
+            self.save()
+
+    async def check_all(self, filenames: List[str], max_age: Optional[float] = HEALTH_CACHE_TTL,
+                        force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Check sessions and return {filename: result} once all are done"""
+        results = {}
+        async for filename, result in self.check_sessions(filenames, max_age=max_age, force=force):
+            results[filename] = result
+        return results
+
+
+def summarize_health(results: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Counts per status"""
+    counts: Dict[str, int] = {}
+    for result in results.values():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return counts
+
+
+# Global checker instance (cache loaded lazily)
+_health_checker: Optional[SessionHealthChecker] = None
+_health_checker_lock = Lock()
+
+
+def get_session_health_checker() -> SessionHealthChecker:
+    """Get the global session health checker"""
+    global _health_checker
+    if _health_checker is None:
+        with _health_checker_lock:
+            if _health_checker is None:
+                checker = SessionHealthChecker(cache_file=HEALTH_CACHE_FILE)
+                checker.load()
+                _health_checker = checker
+    return _health_checker
@@ -0,0 +1,309 @@
+"""
+Session Import - Bulk import of .session files from a zip archive
+Streaming version of the archive's extract_session_from_zip, with validation
+
+- The upload is streamed to disk in chunks (never held in memory)
+- Zip entries are extracted one at a time into a staging directory
+- Each extracted session is validated concurrently (bounded pool, spread across API pairs):
+  authorization + @SpamBot state via bot/session_health.py
+- Sessions are sorted into unused (active / not checkable right now), banned
+  (unauthorized / deactivated) or frozen (frozen / limited)
+- Progress and per-file results are kept per import job
+"""
+
+import asyncio
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+# Concurrent session validations per import
+IMPORT_CONCURRENCY = int(os.getenv("SESSION_IMPORT_CONCURRENCY", "8"))
+
+# Upload copy chunk size (bytes)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Largest .session entry accepted (zip bomb guard)
+MAX_SESSION_FILE_BYTES = 20 * 1024 * 1024
+
+# Finished jobs kept for progress queries
+MAX_FINISHED_JOBS = 20
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Health status -> destination location
+_DESTINATIONS = {
+    "active": "unused",
+    "unknown": "unused",
+    "failed": "unused",   # Probe could not run (network) - the pool validator retries later
+    "unauthorized": "banned",
+    "banned": "banned",
+    "frozen": "frozen",
+    "limited": "frozen",
+}
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_lock = Lock()
+
+
+def _staging_root() -> Path:
+    from bot.session_manager import SESSIONS_BASE
+    return SESSIONS_BASE / "incoming"
+
+
+def get_import_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Progress and per-file results of an import job (None if unknown)"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = dict(job)
+        snapshot["counts"] = dict(job["counts"])
+        snapshot["results"] = list(job["results"])
+        return snapshot
+
+
+def list_import_jobs() -> List[Dict[str, Any]]:
+    """Summaries of recent import jobs (newest first)"""
+    with _jobs_lock:
+        jobs = [
+            {k: v for k, v in job.items() if k != "results"}
+            for job in _jobs.values()
+        ]
+    return sorted(jobs, key=lambda j: j["created_at"], reverse=True)
+
+
+def _new_job(filename: str) -> Dict[str, Any]:
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "job_id": job_id,
+        "filename": filename,
+        "state": "uploading",   # uploading | processing | done | failed
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "error": None,
+        "entries": 0,           # .session entries found in the archive
+        "extracted": 0,
+        "validated": 0,
+        "counts": {"unused": 0, "banned": 0, "frozen": 0, "skipped": 0},
+        "results": [],
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        finished = [j for j in _jobs.values() if j["state"] in ("done", "failed")]
+        for old in sorted(finished, key=lambda j: j["created_at"])[:-MAX_FINISHED_JOBS]:
+            _jobs.pop(old["job_id"], None)
+    return job
+
+
+def _update_job(job: Dict[str, Any], **fields) -> None:
+    with _jobs_lock:
+        job.update(fields)
+
+
+def _add_result(job: Dict[str, Any], result: Dict[str, Any]) -> None:
+    with _jobs_lock:
+        job["results"].append(result)
+        job["counts"][result["destination"]] += 1
+        if result["destination"] != "skipped":
+            job["validated"] += 1
+
+
+async def save_upload_to_disk(upload, dest: Path, chunk_size: int = UPLOAD_CHUNK_SIZE) -> int:
+    """
+    Stream an UploadFile to disk chunk by chunk
+
+    Returns:
+        Bytes written
+    """
+    written = 0
+    with open(dest, "wb") as out:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            await asyncio.to_thread(out.write, chunk)
+            written += len(chunk)
+    return written
+
+
+def _session_entries(zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Zip entries that look like .session files (macOS metadata skipped)"""
+    return [
+        info for info in zip_ref.infolist()
+        if not info.is_dir()
+        and info.filename.endswith(".session")
+        and not info.filename.startswith("__MACOSX")
+        and not Path(info.filename).name.startswith("._")
+    ]
+
+
+def _extract_entry(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, staging: Path) -> Path:
+    """Extract one entry (streamed copy, flattened name). Raises ValueError if not a session"""
+    if info.file_size > MAX_SESSION_FILE_BYTES:
+        raise ValueError(f"Too large ({info.file_size} bytes)")
+
+    target = staging / Path(info.filename).name
+    with zip_ref.open(info) as source, open(target, "wb") as out:
+        header = source.read(len(SQLITE_HEADER))
+        if header != SQLITE_HEADER:
+            out.close()
+            target.unlink(missing_ok=True)
+            raise ValueError("Not a SQLite session file")
+        out.write(header)
+        shutil.copyfileobj(source, out, UPLOAD_CHUNK_SIZE)
+    return target
+
+
+def _place_session(staged: Path, location: str, status: str) -> bool:
+    """Move a validated session into its pool directory and index it. False if the name is taken"""
+    from bot.session_manager import SESSIONS_BASE, session_lock, ensure_dirs
+    from bot.session_inventory import get_session_inventory
+
+    ensure_dirs()
+    inventory = get_session_inventory()
+    with session_lock:
+        if inventory.get(staged.name) is not None:
+            return False
+        dest_dir = SESSIONS_BASE / location
+        if (dest_dir / staged.name).exists():
+            return False
+        shutil.move(str(staged), str(dest_dir / staged.name))
+        inventory.record_move(staged.name, location)
+        inventory.set_status(staged.name, status)
+    return True
+
+
+async def run_import(job: Dict[str, Any], zip_path: Path) -> None:
+    """
+    Extract and validate every session in a zip (extraction and validation overlap)
+    Cleans up the zip and staging directory when done
+    """
+    from bot.api_pairs import load_api_pairs
+    from bot.session_inventory import get_session_inventory
+    from bot.session_health import get_session_health_checker, probe_session, HEALTH_CHECK_TIMEOUT
+
+    staging = _staging_root() / job["job_id"]
+    staging.mkdir(parents=True, exist_ok=True)
+    checker = get_session_health_checker()
+    inventory = get_session_inventory()
+    pairs = load_api_pairs()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_CONCURRENCY * 2)
+
+    async def validate_worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            try:
+                await _validate_one(*item)
+            except Exception as e:
+                print(f"ERROR: Session import {job['job_id']}: validating {item[0].name} failed: {e}")
+                _add_result(job, {"filename": item[0].name, "status": "failed", "details": str(e)[:100], "destination": "skipped"})
+            finally:
+                queue.task_done()
+
+    async def _validate_one(staged: Path, pair_idx: int) -> None:
+        started = time.monotonic()
+        try:
+            if pairs:
+                pair = pairs[pair_idx]
+                client = checker.make_client(str(staged), int(pair["api_id"]), pair["api_hash"])
+                status, details = await asyncio.wait_for(probe_session(client), timeout=HEALTH_CHECK_TIMEOUT)
+            else:
+                status, details = ("failed", "No API pairs configured")
+        except asyncio.TimeoutError:
+            status, details = ("failed", f"Timed out after {HEALTH_CHECK_TIMEOUT}s")
+        except Exception as e:
+            status, details = ("failed", str(e)[:100])
+
+        location = _DESTINATIONS.get(status, "unused")
+        try:
+            placed = await asyncio.to_thread(_place_session, staged, location, status)
+        except Exception as e:
+            # One bad move must not kill the worker (the queue would block the job forever)
+            print(f"ERROR: Session import {job['job_id']}: failed to place {staged.name}: {e}")
+            _add_result(job, {"filename": staged.name, "status": "failed", "details": f"Failed to place: {str(e)[:100]}", "destination": "skipped"})
+            return
+        if placed:
+            checker.store_result(staged.name, status, details, location, pair_idx, time.monotonic() - started)
+            destination = location
+        else:
+            destination = "skipped"
+            details = "Already in the session pool"
+        _add_result(job, {"filename": staged.name, "status": status, "details": details, "destination": destination})
+
+    workers = [asyncio.create_task(validate_worker()) for _ in range(IMPORT_CONCURRENCY)]
+    try:
+        _update_job(job, state="processing")
+        zip_ref = await asyncio.to_thread(zipfile.ZipFile, zip_path, "r")
+        with zip_ref:
+            entries = _session_entries(zip_ref)
+            _update_job(job, entries=len(entries))
+            seen = set()
+
+            for idx, info in enumerate(entries):
+                name = Path(info.filename).name
+                if name in seen or inventory.get(name) is not None:
+                    _add_result(job, {"filename": name, "status": None, "details": "Duplicate or already in the session pool", "destination": "skipped"})
+                    continue
+                seen.add(name)
+                try:
+                    staged = await asyncio.to_thread(_extract_entry, zip_ref, info, staging)
+                except Exception as e:
+                    _add_result(job, {"filename": name, "status": None, "details": str(e)[:100], "destination": "skipped"})
+                    continue
+                with _jobs_lock:
+                    job["extracted"] += 1
+                # Spread validations across API pairs
+                await queue.put((staged, idx % len(pairs) if pairs else 0))
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        checker.save()
+        _update_job(job, state="done", finished_at=datetime.now().isoformat())
+        print(f"INFO: Session import {job['job_id']} finished: {job['counts']}")
+    except Exception as e:
+        for worker in workers:
+            worker.cancel()
+        _update_job(job, state="failed", error=str(e), finished_at=datetime.now().isoformat())
+        print(f"ERROR: Session import {job['job_id']} failed: {e}")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            zip_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+async def start_import(upload) -> Dict[str, Any]:
+    """
+    Stream an uploaded zip to disk and start processing it in the background
+
+    Returns:
+        Job snapshot (poll get_import_job for progress)
+    """
+    job = _new_job(getattr(upload, "filename", None) or "upload.zip")
+    root = _staging_root()
+    root.mkdir(parents=True, exist_ok=True)
+    zip_path = root / f"{job['job_id']}.zip"
+
+    try:
+        size = await save_upload_to_disk(upload, zip_path)
+        if not await asyncio.to_thread(zipfile.is_zipfile, zip_path):
+            raise ValueError("Uploaded file is not a zip archive")
+    except Exception as e:
+        zip_path.unlink(missing_ok=True)
+        _update_job(job, state="failed", error=str(e), finished_at=datetime.now().isoformat())
+        return get_import_job(job["job_id"])
+
+    _update_job(job, upload_bytes=size, state="processing")
+    asyncio.create_task(run_import(job, zip_path))
+    return get_import_job(job["job_id"])
@@ -0,0 +1,290 @@
+"""
+Session Inventory - In-memory index of every .session file
+Maps filename -> location, owner, API pair and status so lookups are O(1)
+instead of globbing directories / walking every sessions/assigned/<user> folder
+
+- Loaded once from disk (lazy, on first use)
+- Updated by the move functions in bot/session_manager.py (under session_lock)
+- Reconciled against disk by a periodic scanner (files added/removed by hand)
+"""
+
+import os
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from threading import RLock
+from typing import Dict, Any, List, Optional, Set
+
+# Session locations (one directory each, "assigned" has a sub-directory per user)
+LOCATIONS = ("unused", "assigned", "banned", "frozen")
+
+# Seconds between reconcile scans
+RECONCILE_INTERVAL = int(os.getenv("SESSION_RECONCILE_INTERVAL", "60"))
+
+
+def _scan_dir(directory: Path) -> List[str]:
+    """List .session filenames in a directory (os.scandir - no stat per entry)"""
+    try:
+        with os.scandir(directory) as entries:
+            return [e.name for e in entries if e.name.endswith(".session") and e.is_file()]
+    except FileNotFoundError:
+        return []
+
+
+class SessionInventory:
+    """
+    In-memory session index
+    {filename: {"location", "owner", "api_pair", "status", "updated_at"}}
+    plus per-location and per-owner indexes
+    """
+
+    def __init__(self, sessions_base: Path):
+        self._base = sessions_base
+        self._lock = RLock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._by_location: Dict[str, Set[str]] = {loc: set() for loc in LOCATIONS}
+        self._by_owner: Dict[str, Set[str]] = {}
+        self._loaded = False
+        self.last_reconcile: Optional[str] = None
+
+    def _dir(self, location: str, owner: Optional[str] = None) -> Path:
+        if location == "assigned":
+            return self._base / "assigned" / owner
+        return self._base / location
+
+    # ------------------------------------------------------------------
+    # Index maintenance (call with lock held)
+    # ------------------------------------------------------------------
+
+    def _unindex(self, filename: str) -> Optional[Dict[str, Any]]:
+        record = self._records.pop(filename, None)
+        if record is None:
+            return None
+        self._by_location[record["location"]].discard(filename)
+        owner = record.get("owner")
+        if owner:
+            owned = self._by_owner.get(owner)
+            if owned is not None:
+                owned.discard(filename)
+                if not owned:
+                    del self._by_owner[owner]
+        return record
+
+    def _index(self, filename: str, location: str, owner: Optional[str] = None,
+               api_pair: Optional[int] = None, status: Optional[str] = None) -> Dict[str, Any]:
+        previous = self._unindex(filename)
+        record = {
+            "location": location,
+            "owner": owner if location == "assigned" else None,
+            "api_pair": api_pair if location == "assigned" else None,
+            # Status (e.g. health probe result) survives moves unless overridden
+            "status": status if status is not None else (previous or {}).get("status", "unknown"),
+            "updated_at": datetime.now().isoformat(),
+        }
+        self._records[filename] = record
+        self._by_location[location].add(filename)
+        if record["owner"]:
+            self._by_owner.setdefault(record["owner"], set()).add(filename)
+        return record
+
+    def _scan_disk(self) -> Dict[str, tuple]:
+        """Current disk state: {filename: (location, owner)}"""
+        found: Dict[str, tuple] = {}
+        for location in ("unused", "banned", "frozen"):
+            for name in _scan_dir(self._base / location):
+                found[name] = (location, None)
+
+        assigned_dir = self._base / "assigned"
+        try:
+            with os.scandir(assigned_dir) as user_dirs:
+                owners = [d.name for d in user_dirs if d.is_dir()]
+        except FileNotFoundError:
+            owners = []
+        for owner in owners:
+            for name in _scan_dir(assigned_dir / owner):
+                found[name] = ("assigned", owner)
+        return found
+
+    # ------------------------------------------------------------------
+    # Loading / reconcile
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self) -> None:
+        """Load from disk once (first use)"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for filename, (location, owner) in self._scan_disk().items():
+                self._index(filename, location, owner)
+            self._load_api_pairs()
+            self._loaded = True
+            self.last_reconcile = datetime.now().isoformat()
+
+    def _load_api_pairs(self) -> None:
+        """Attach API pair indexes from users.json (same mapping the worker uses)"""
+        try:
+            from bot.data_manager import load_users
+            users = load_users()
+        except Exception as e:
+            print(f"WARNING: Session inventory could not read users.json for API pairs: {e}")
+            return
+        for user_data in users.values():
+            self._apply_api_pairs(user_data.get("assigned_sessions", []), user_data.get("api_pairs", []))
+
+    def _apply_api_pairs(self, sessions: List[str], api_pairs: List[int]) -> None:
+        if not api_pairs:
+            return
+        for idx, filename in enumerate(sessions):
+            record = self._records.get(filename)
+            if record and record["location"] == "assigned":
+                record["api_pair"] = api_pairs[idx % len(api_pairs)]
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        Reconcile the index against disk (files added, removed or moved by hand)
+
+        Returns:
+            Counts of added / removed / moved records
+        """
+        with self._lock:
+            if not self._loaded:
+                self.ensure_loaded()
+                return {"added": 0, "removed": 0, "moved": 0}
+
+            found = self._scan_disk()
+            added = removed = moved = 0
+
+            for filename in list(self._records.keys()):
+                if filename not in found:
+                    self._unindex(filename)
+                    removed += 1
+
+            for filename, (location, owner) in found.items():
+                record = self._records.get(filename)
+                if record is None:
+                    self._index(filename, location, owner)
+                    added += 1
+                elif record["location"] != location or record["owner"] != owner:
+                    self._index(filename, location, owner, api_pair=record.get("api_pair"))
+                    moved += 1
+
+            self.last_reconcile = datetime.now().isoformat()
+            return {"added": added, "removed": removed, "moved": moved}
+
+    # ------------------------------------------------------------------
+    # Updates from session_manager move functions
+    # ------------------------------------------------------------------
+
+    def record_move(self, filename: str, location: str, owner: Optional[str] = None,
+                    api_pair: Optional[int] = None) -> None:
+        """Record that a session file moved to location (owner for "assigned")"""
+        self.ensure_loaded()
+        with self._lock:
+            self._index(filename, location, owner, api_pair)
+
+    def set_api_pairs(self, sessions: List[str], api_pairs: List[int]) -> None:
+        """Attach API pair indexes to a user's assigned sessions"""
+        self.ensure_loaded()
+        with self._lock:
+            self._apply_api_pairs(sessions, api_pairs)
+
+    def set_status(self, filename: str, status: str) -> bool:
+        """Set a session's status (e.g. health result). Returns False if unknown"""
+        self.ensure_loaded()
+        with self._lock:
+            record = self._records.get(filename)
+            if record is None:
+                return False
+            record["status"] = status
+            record["updated_at"] = datetime.now().isoformat()
+            return True
+
+    # ------------------------------------------------------------------
+    # O(1) lookups
+    # ------------------------------------------------------------------
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Get a copy of a session's record (None if unknown)"""
+        self.ensure_loaded()
+        with self._lock:
+            record = self._records.get(filename)
+            return dict(record) if record else None
+
+    def path_of(self, filename: str) -> Optional[Path]:
+        """Path of a session file according to the index"""
+        record = self.get(filename)
+        if record is None:
+            return None
+        return self._dir(record["location"], record["owner"]) / filename
+
+    def in_location(self, location: str) -> Set[str]:
+        """Filenames in a location (copy)"""
+        self.ensure_loaded()
+        with self._lock:
+            return set(self._by_location.get(location, ()))
+
+    def statuses_in(self, location: str) -> Dict[str, str]:
+        """{filename: status} for a location"""
+        self.ensure_loaded()
+        with self._lock:
+            return {name: self._records[name]["status"] for name in self._by_location.get(location, ())}
+
+    def owned_by(self, owner: str) -> Set[str]:
+        """Filenames assigned to a user (copy)"""
+        self.ensure_loaded()
+        with self._lock:
+            return set(self._by_owner.get(owner, ()))
+
+    def counts(self) -> Dict[str, int]:
+        """Number of sessions per location"""
+        self.ensure_loaded()
+        with self._lock:
+            counts = {loc: len(names) for loc, names in self._by_location.items()}
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of all records"""
+        self.ensure_loaded()
+        with self._lock:
+            return {name: dict(record) for name, record in self._records.items()}
+
+
+# Global inventory instance
+_inventory: Optional[SessionInventory] = None
+_inventory_lock = RLock()
+
+
+def get_session_inventory() -> SessionInventory:
+    """Get the global session inventory (loaded lazily from disk)"""
+    global _inventory
+    if _inventory is None:
+        with _inventory_lock:
+            if _inventory is None:
+                from bot.session_manager import SESSIONS_BASE
+                _inventory = SessionInventory(SESSIONS_BASE)
+    _inventory.ensure_loaded()
+    return _inventory
+
+
+async def run_inventory_reconciler(interval: int = RECONCILE_INTERVAL) -> None:
+    """Periodically reconcile the inventory against disk (runs for the process lifetime)"""
+    from bot.session_manager import session_lock
+
+    def _reconcile():
+        # Hold session_lock so a scan never observes a half-finished move
+        with session_lock:
+            return get_session_inventory().reconcile()
+
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            changes = await asyncio.to_thread(_reconcile)
+            if any(changes.values()):
+                print(f"INFO: Session inventory reconciled with disk: {changes}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WARNING: Session inventory reconcile failed: {e}")
@@ -1,20 +1,27 @@
 """
 Session Manager - Handles session pool, assignment, and replacement
 Sessions are exclusive per user
+Lookups go through the in-memory session inventory (bot/session_inventory.py);
+every move updates the inventory under session_lock
 """
 
 import json
 import shutil
 from pathlib import Path
 from typing import List, Dict, Optional, Set
-from threading import Lock
+from threading import RLock
 
 SESSIONS_BASE = Path(__file__).parent.parent / "sessions"
 UNUSED_DIR = SESSIONS_BASE / "unused"
 ASSIGNED_DIR = SESSIONS_BASE / "assigned"
 BANNED_DIR = SESSIONS_BASE / "banned"
+FROZEN_DIR = SESSIONS_BASE / "frozen"
 
-session_lock = Lock()
+# Re-entrant: replace_banned_session calls ban_session / assign_sessions_to_user
+session_lock = RLock()
+
+# Unused sessions held open by background jobs (chatlist imports): {filename: holder}
+_held_sessions: Dict[str, str] = {}
 
 
 def ensure_dirs():
@@ -22,37 +29,102 @@ def ensure_dirs():
     UNUSED_DIR.mkdir(parents=True, exist_ok=True)
     ASSIGNED_DIR.mkdir(parents=True, exist_ok=True)
     BANNED_DIR.mkdir(parents=True, exist_ok=True)
+    FROZEN_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def _inventory():
+    from bot.session_inventory import get_session_inventory
+    return get_session_inventory()
+
+
+def hold_sessions(session_files: List[str], holder: str) -> None:
+    """
+    Hold unused sessions for a background job until release_sessions()
+    Held sessions are never assigned, probed or warmed as spares. Pick and hold under
+    session_lock so assignment cannot take the same files in between
+    """
+    with session_lock:
+        for session_file in session_files:
+            _held_sessions[session_file] = holder
+
+
+def release_sessions(session_files: List[str]) -> None:
+    """Release sessions held by hold_sessions()"""
+    with session_lock:
+        for session_file in session_files:
+            _held_sessions.pop(session_file, None)
+
+
+def get_held_sessions() -> Set[str]:
+    """Sessions held by background jobs"""
+    with session_lock:
+        return set(_held_sessions)
+
+
+def get_reserved_sessions() -> Set[str]:
+    """Unused sessions open elsewhere: warm spares and sessions held by background jobs"""
+    from bot.spare_pool import get_reserved_spares
+    return get_reserved_spares() | get_held_sessions()
+
+
+def _move_session_file(session_file: str, src_dir: Path, dst_dir: Path) -> bool:
+    """Move a session file (and its journal if present). Returns False if source missing"""
+    src = src_dir / session_file
+    if not src.exists():
+        return False
+
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(src), str(dst_dir / session_file))
+
+    # Move journal file if exists
+    journal_src = src_dir / f"{session_file}-journal"
+    if journal_src.exists():
+        shutil.move(str(journal_src), str(dst_dir / f"{session_file}-journal"))
+
+    return True
 
 
 def get_unused_sessions() -> List[str]:
     """Get list of unused session filenames"""
     ensure_dirs()
-    sessions = []
-    for session_file in UNUSED_DIR.glob("*.session"):
-        sessions.append(session_file.name)
-    return sorted(sessions)
+    return sorted(_inventory().in_location("unused"))
+
+
+def get_assignable_sessions() -> List[str]:
+    """
+    Unused sessions that may be handed out, best first
+    Only pre-validated "ready" sessions once a validation pass has finished. Until then
+    never-checked sessions are handed out after the ready ones; probe failures, dead and
+    frozen sessions never (nor warm spares or sessions held by a background job)
+    """
+    from bot.session_health import readiness, READINESS_READY, STATUS_UNKNOWN
+    from bot.session_validator import get_last_validation_pass
+
+    ensure_dirs()
+    reserved = get_reserved_sessions()  # Warm spares go out only via ban swaps
+    validated = bool(get_last_validation_pass())
+    ready = []
+    unchecked = []
+    for session_file, status in _inventory().statuses_in("unused").items():
+        if session_file in reserved:
+            continue
+        if readiness(status) == READINESS_READY:
+            ready.append(session_file)
+        elif not validated and status == STATUS_UNKNOWN:
+            unchecked.append(session_file)
+    return sorted(ready) + sorted(unchecked)
 
 
 def get_assigned_sessions(user_id: str) -> List[str]:
     """Get list of assigned session filenames for a user"""
     ensure_dirs()
-    user_dir = ASSIGNED_DIR / user_id
-    if not user_dir.exists():
-        return []
-    
-    sessions = []
-    for session_file in user_dir.glob("*.session"):
-        sessions.append(session_file.name)
-    return sorted(sessions)
+    return sorted(_inventory().owned_by(user_id))
 
 
 def get_banned_sessions() -> Set[str]:
     """Get set of banned session filenames"""
     ensure_dirs()
-    banned = set()
-    for session_file in BANNED_DIR.glob("*.session"):
-        banned.add(session_file.name)
-    return banned
+    return _inventory().in_location("banned")
 
 
 def assign_sessions_to_user(user_id: str, num_sessions: int, existing_sessions: List[str] = None) -> List[str]:
@@ -63,13 +135,6 @@ def assign_sessions_to_user(user_id: str, num_sessions: int, existing_sessions:
     ensure_dirs()
     existing_sessions = existing_sessions or []
     
-    # Get available unused sessions
-    unused = get_unused_sessions()
-    banned = get_banned_sessions()
-    
-    # Filter out banned sessions
-    available = [s for s in unused if s not in banned]
-    
     # Calculate how many we need
     already_assigned = len(existing_sessions)
     needed = max(0, num_sessions - already_assigned)
@@ -80,27 +145,46 @@ def assign_sessions_to_user(user_id: str, num_sessions: int, existing_sessions:
     # Assign new sessions
     assigned = existing_sessions.copy()
     user_dir = ASSIGNED_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
+    inventory = _inventory()
     
-    for session_file in available[:needed]:
-        src = UNUSED_DIR / session_file
-        dst = user_dir / session_file
+    with session_lock:
+        # Ready (pre-validated) sessions first; dead/frozen ones are never handed out
+        available = get_assignable_sessions()
         
-        # Move session file
-        if src.exists():
-            shutil.move(str(src), str(dst))
-            
-            # Move journal file if exists
-            journal_src = UNUSED_DIR / f"{session_file}-journal"
-            journal_dst = user_dir / f"{session_file}-journal"
-            if journal_src.exists():
-                shutil.move(str(journal_src), str(journal_dst))
-            
-            assigned.append(session_file)
+        for session_file in available[:needed]:
+            if _move_session_file(session_file, UNUSED_DIR, user_dir):
+                inventory.record_move(session_file, "assigned", owner=user_id)
+                assigned.append(session_file)
     
     return assigned
 
 
+class SessionReservedError(Exception):
+    """The session is held open elsewhere (warm spare or background job) and cannot be assigned"""
+
+
+def assign_session_file(user_id: str, session_file: str, allow_reserved: bool = False) -> Optional[Path]:
+    """
+    Move one specific session from unused to a user's assigned folder
+    Reserved sessions are refused (same rule as get_assignable_sessions) unless
+    allow_reserved - used when adopting the spare that took over a banned session
+
+    Returns: New path, or None if the file is not in the unused pool
+    Raises: SessionReservedError if the session is a warm spare or held by a background job
+    """
+    ensure_dirs()
+    user_dir = ASSIGNED_DIR / user_id
+
+    with session_lock:
+        if not allow_reserved and session_file in get_reserved_sessions():
+            raise SessionReservedError(f"Session {session_file} is held open (warm spare or import)")
+        if not _move_session_file(session_file, UNUSED_DIR, user_dir):
+            return None
+        _inventory().record_move(session_file, "assigned", owner=user_id)
+
+    return user_dir / session_file
+
+
 def unassign_sessions_from_user(user_id: str, session_filenames: List[str]) -> bool:
     """Move sessions from user back to unused pool"""
     ensure_dirs()
@@ -110,20 +194,12 @@ def unassign_sessions_from_user(user_id: str, session_filenames: List[str]) -> b
         return False
     
     moved = False
-    for session_file in session_filenames:
-        src = user_dir / session_file
-        dst = UNUSED_DIR / session_file
-        
-        if src.exists():
-            shutil.move(str(src), str(dst))
-            
-            # Move journal file if exists
-            journal_src = user_dir / f"{session_file}-journal"
-            journal_dst = UNUSED_DIR / f"{session_file}-journal"
-            if journal_src.exists():
-                shutil.move(str(journal_src), str(journal_dst))
-            
-            moved = True
+    inventory = _inventory()
+    with session_lock:
+        for session_file in session_filenames:
+            if _move_session_file(session_file, user_dir, UNUSED_DIR):
+                inventory.record_move(session_file, "unused")
+                moved = True
     
     return moved
 
@@ -131,47 +207,37 @@ def unassign_sessions_from_user(user_id: str, session_filenames: List[str]) -> b
 def ban_session(session_filename: str) -> bool:
     """Move session to banned directory"""
     ensure_dirs()
+    inventory = _inventory()
     
-    # Check in unused
-    src = UNUSED_DIR / session_filename
-    if src.exists():
-        dst = BANNED_DIR / session_filename
-        shutil.move(str(src), str(dst))
+    with session_lock:
+        # O(1) location lookup instead of walking every assigned/<user> folder
+        record = inventory.get(session_filename)
+        if record is None:
+            # Unknown to the index - reconcile once in case it was added by hand
+            inventory.reconcile()
+            record = inventory.get(session_filename)
+        if record is None or record["location"] not in ("unused", "assigned"):
+            return False
         
-        # Move journal if exists
-        journal_src = UNUSED_DIR / f"{session_filename}-journal"
-        journal_dst = BANNED_DIR / f"{session_filename}-journal"
-        if journal_src.exists():
-            shutil.move(str(journal_src), str(journal_dst))
+        src_dir = UNUSED_DIR if record["location"] == "unused" else ASSIGNED_DIR / record["owner"]
+        if not _move_session_file(session_filename, src_dir, BANNED_DIR):
+            return False
         
+        inventory.record_move(session_filename, "banned")
         return True
-    
-    # Check in assigned (find which user)
-    for user_dir in ASSIGNED_DIR.iterdir():
-        if user_dir.is_dir():
-            src = user_dir / session_filename
-            if src.exists():
-                dst = BANNED_DIR / session_filename
-                shutil.move(str(src), str(dst))
-                
-                # Move journal if exists
-                journal_src = user_dir / f"{session_filename}-journal"
-                journal_dst = BANNED_DIR / f"{session_filename}-journal"
-                if journal_src.exists():
-                    shutil.move(str(journal_src), str(journal_dst))
-                
-                return True
-    
-    return False
 
 
 def get_session_path(user_id: str, session_filename: str) -> Optional[Path]:
     """Get full path to a session file"""
     ensure_dirs()
-    user_dir = ASSIGNED_DIR / user_id
-    session_path = user_dir / session_filename
+    inventory = _inventory()
+    session_path = ASSIGNED_DIR / user_id / session_filename
     
     if session_path.exists():
+        record = inventory.get(session_filename)
+        if not record or record["location"] != "assigned" or record["owner"] != user_id:
+            # Placed by hand since the last reconcile - fix the index
+            inventory.record_move(session_filename, "assigned", owner=user_id)
         return session_path
     
     return None
@@ -181,26 +247,16 @@ def replace_banned_session(user_id: str, banned_session: str) -> Optional[str]:
     """Replace a banned session with a new one from unused pool"""
     ensure_dirs()
     
-    # Remove banned session from user's assigned
-    user_dir = ASSIGNED_DIR / user_id
-    banned_path = user_dir / banned_session
-    if banned_path.exists():
-        ban_session(banned_session)  # Move to banned
-    
-    # Get a replacement from unused pool
-    unused = get_unused_sessions()
-    banned_set = get_banned_sessions()
-    available = [s for s in unused if s not in banned_set]
-    
-    if not available:
-        return None
-    
-    # Assign replacement
-    replacement = available[0]
-    assigned = assign_sessions_to_user(user_id, 1, [])
+    with session_lock:
+        # Remove banned session from user's assigned
+        record = _inventory().get(banned_session)
+        if record and record["location"] == "assigned" and record["owner"] == user_id:
+            ban_session(banned_session)  # Move to banned
+        
+        # Assign replacement from unused pool
+        assigned = assign_sessions_to_user(user_id, 1, [])
     
-    if assigned and replacement in assigned:
-        return replacement
+    if assigned:
+        return assigned[0]
     
     return None
-
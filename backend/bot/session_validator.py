@@ -0,0 +1,166 @@
+"""
+Session Pool Validator - Background pre-validation of the unused session pool
+Probes unused sessions at low priority (small batches, pauses between them) and marks
+each one ready / dead / frozen in the session inventory, so assignment and banned-session
+replacement only hand out sessions known to work (see get_assignable_sessions)
+
+- Never-checked sessions are probed first
+- Ready sessions are re-probed once their result is older than PREVALIDATE_MAX_AGE
+- Frozen/limited sessions are re-probed after PREVALIDATE_FROZEN_RECHECK (limits expire)
+- Dead sessions (unauthorized / deactivated) are never re-probed
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Enable/disable the background validator
+PREVALIDATION_ENABLED = os.getenv("SESSION_PREVALIDATION", "true").lower() in ("1", "true", "yes")
+
+# Seconds between validation passes
+PREVALIDATE_INTERVAL = int(os.getenv("SESSION_PREVALIDATE_INTERVAL", "300"))
+
+# Sessions probed per batch, and seconds paused between batches (keeps it low priority)
+PREVALIDATE_BATCH = int(os.getenv("SESSION_PREVALIDATE_BATCH", "3"))
+PREVALIDATE_PAUSE = 5
+
+# Re-probe ready sessions after this many seconds
+PREVALIDATE_MAX_AGE = int(os.getenv("SESSION_PREVALIDATE_MAX_AGE", str(6 * 3600)))
+
+# Re-probe frozen/limited sessions after this many seconds
+PREVALIDATE_FROZEN_RECHECK = 24 * 3600
+
+# Last pass summary (served by the admin API)
+_last_pass: Dict[str, Any] = {}
+
+
+def _sync_from_cache() -> None:
+    """Seed inventory statuses from the persisted health cache (statuses are lost on restart)"""
+    from bot.session_inventory import get_session_inventory
+    from bot.session_health import get_session_health_checker
+
+    inventory = get_session_inventory()
+    checker = get_session_health_checker()
+    for filename, status in inventory.statuses_in("unused").items():
+        if status == "unknown":
+            cached = checker.get_cached(filename, max_age=None)
+            if cached:
+                inventory.set_status(filename, cached["status"])
+
+
+def select_candidates(now: Optional[float] = None) -> List[str]:
+    """
+    Unused sessions due for a probe, most urgent first
+
+    Returns:
+        Filenames: never-checked first, then frozen due for recheck, then stale ready ones (oldest first)
+    """
+    from bot.session_inventory import get_session_inventory
+    from bot.session_health import (
+        get_session_health_checker, readiness,
+        READINESS_READY, READINESS_FROZEN, READINESS_UNCHECKED,
+    )
+
+    from bot.session_manager import get_reserved_sessions
+
+    now = now or time.time()
+    checker = get_session_health_checker()
+    reserved = get_reserved_sessions()  # Open as warm spares / in an import - never probe concurrently
+    due = []
+
+    for filename, status in get_session_inventory().statuses_in("unused").items():
+        if filename in reserved:
+            continue
+        state = readiness(status)
+        cached = checker.get_cached(filename, max_age=None)
+        checked_ts = cached["checked_ts"] if cached else 0
+        age = now - checked_ts
+
+        if state == READINESS_UNCHECKED:
+            due.append((0, checked_ts, filename))
+        elif state == READINESS_FROZEN and age > PREVALIDATE_FROZEN_RECHECK:
+            due.append((1, checked_ts, filename))
+        elif state == READINESS_READY and age > PREVALIDATE_MAX_AGE:
+            due.append((2, checked_ts, filename))
+
+    due.sort()
+    return [filename for _, _, filename in due]
+
+
+def get_pool_readiness() -> Dict[str, int]:
+    """Counts of unused sessions per readiness (ready / dead / frozen / unchecked)"""
+    from bot.session_inventory import get_session_inventory
+    from bot.session_health import readiness
+
+    counts = {"ready": 0, "dead": 0, "frozen": 0, "unchecked": 0}
+    for status in get_session_inventory().statuses_in("unused").values():
+        state = readiness(status)
+        counts[state] = counts.get(state, 0) + 1
+    return counts
+
+
+def get_last_validation_pass() -> Dict[str, Any]:
+    """Summary of the last validation pass"""
+    return dict(_last_pass)
+
+
+async def validate_pool_once(max_sessions: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run one validation pass over the unused pool
+
+    Args:
+        max_sessions: Probe at most this many sessions (None = all due)
+
+    Returns:
+        Pass summary with probe counts per status and the pool readiness afterwards
+    """
+    from bot.session_health import get_session_health_checker
+
+    await asyncio.to_thread(_sync_from_cache)
+    candidates = select_candidates()
+    if max_sessions is not None:
+        candidates = candidates[:max_sessions]
+
+    checker = get_session_health_checker()
+    probed: Dict[str, int] = {}
+    started = time.monotonic()
+
+    for start in range(0, len(candidates), PREVALIDATE_BATCH):
+        batch = candidates[start:start + PREVALIDATE_BATCH]
+        # force=True: candidates are due by definition; max_age only guards the cache
+        results = await checker.check_all(batch, force=True)
+        for result in results.values():
+            probed[result["status"]] = probed.get(result["status"], 0) + 1
+        if start + PREVALIDATE_BATCH < len(candidates):
+            await asyncio.sleep(PREVALIDATE_PAUSE)
+
+    summary = {
+        "finished_at": datetime.now().isoformat(),
+        "probed": sum(probed.values()),
+        "results": probed,
+        "duration": round(time.monotonic() - started, 2),
+        "pool": get_pool_readiness(),
+    }
+    _last_pass.clear()
+    _last_pass.update(summary)
+    return summary
+
+
+async def run_pool_validator(interval: int = PREVALIDATE_INTERVAL) -> None:
+    """Validate the unused pool every interval seconds (runs for the process lifetime)"""
+    if not PREVALIDATION_ENABLED:
+        print("INFO: Session pool pre-validation disabled (SESSION_PREVALIDATION=false)")
+        return
+
+    while True:
+        try:
+            summary = await validate_pool_once()
+            if summary["probed"]:
+                print(f"INFO: Session pool validated {summary['probed']} session(s): {summary['results']} - pool {summary['pool']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WARNING: Session pool validation failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,298 @@
+"""
+Spare Pool - Warm-standby Telegram clients for instant ban replacement
+Keeps SPARE_CLIENTS_PER_PAIR pre-connected, pre-authorized clients per API pair, built
+from "ready" sessions in the unused pool (see bot/session_validator.py)
+
+When a session is banned mid-cycle the worker acquires a spare and continues the banned
+session's remaining groups with it immediately; after the cycle the spare's file is
+assigned to the user in place of the banned session
+
+Spare sessions stay in sessions/unused while warm but are reserved in memory, so
+assignment and pool validation never hand them out or probe them concurrently
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Any, List, Optional, Callable, Set
+
+from bot.pair_balancer import get_pair_telemetry
+
+# Warm spare clients kept per API pair (0 disables the pool)
+SPARE_CLIENTS_PER_PAIR = int(os.getenv("SPARE_CLIENTS_PER_PAIR", "1"))
+
+# Seconds between refill / liveness passes
+SPARE_REFILL_INTERVAL = int(os.getenv("SPARE_REFILL_INTERVAL", "60"))
+
+# Seconds allowed to warm one spare (connect + authorization check)
+SPARE_WARM_TIMEOUT = 20
+
+
+def _telethon_client_factory(session_path: str, api_id: int, api_hash: str):
+    """Default client factory (real Telethon)"""
+    from telethon import TelegramClient
+    return TelegramClient(session_path, api_id, api_hash)
+
+
+class SparePool:
+    """
+    Warm spare clients keyed by API pair index
+    Used from the event loop only: list updates never span an await, so acquire()
+    needs no lock and is never blocked by a refill that is busy warming clients
+    """
+
+    def __init__(self, per_pair: int = SPARE_CLIENTS_PER_PAIR, client_factory: Optional[Callable] = None):
+        self.per_pair = per_pair
+        self._client_factory = client_factory or _telethon_client_factory
+        self._refill_lock: Optional[asyncio.Lock] = None
+        # {pair_idx: [spare, ...]}  spare = {"session", "pair", "api_id", "client", "warmed_at"}
+        self._warm: Dict[int, List[Dict[str, Any]]] = {}
+        # Spares handed to a worker: {session: spare}
+        self._in_use: Dict[str, Dict[str, Any]] = {}
+        # Every session the pool holds (warm, in use, or waiting to be assigned)
+        self._reserved: Set[str] = set()
+        self._metrics = {
+            "swaps": 0,
+            "misses": 0,
+            "warmed": 0,
+            "warm_failures": 0,
+            "dropped": 0,
+            "swap_seconds_total": 0.0,
+        }
+
+    def set_client_factory(self, factory: Optional[Callable]) -> None:
+        """Swap the Telegram client factory (None restores Telethon)"""
+        self._client_factory = factory or _telethon_client_factory
+
+    def _get_refill_lock(self) -> asyncio.Lock:
+        if self._refill_lock is None:
+            self._refill_lock = asyncio.Lock()
+        return self._refill_lock
+
+    def reserved_sessions(self) -> Set[str]:
+        """Sessions held by the pool (excluded from assignment and pool validation)"""
+        return set(self._reserved)
+
+    # ------------------------------------------------------------------
+    # Warming
+    # ------------------------------------------------------------------
+
+    def _pick_candidates(self) -> List[str]:
+        """Ready unused sessions not already reserved (nor held by a background job)"""
+        from bot.session_inventory import get_session_inventory
+        from bot.session_health import readiness, READINESS_READY
+        from bot.session_manager import get_held_sessions
+
+        statuses = get_session_inventory().statuses_in("unused")
+        held = get_held_sessions()
+        return sorted(
+            name for name, status in statuses.items()
+            if readiness(status) == READINESS_READY and name not in self._reserved and name not in held
+        )
+
+    async def _warm_one(self, session_file: str, pair_idx: int, pair: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Connect and authorize one spare (None if it is not usable)"""
+        from bot.session_manager import UNUSED_DIR
+        from bot.session_inventory import get_session_inventory
+
+        client = None
+        try:
+            client = self._client_factory(str(UNUSED_DIR / session_file), int(pair["api_id"]), pair["api_hash"])
+            await asyncio.wait_for(client.connect(), timeout=SPARE_WARM_TIMEOUT)
+            if not await asyncio.wait_for(client.is_user_authorized(), timeout=SPARE_WARM_TIMEOUT):
+                get_session_inventory().set_status(session_file, "unauthorized")
+                raise RuntimeError("not authorized")
+            get_pair_telemetry().connection_opened(int(pair["api_id"]))
+            return {
+                "session": session_file,
+                "pair": pair_idx,
+                "api_id": int(pair["api_id"]),
+                "client": client,
+                "warmed_at": time.time(),
+            }
+        except Exception as e:
+            self._metrics["warm_failures"] += 1
+            print(f"WARNING: Could not warm spare session {session_file}: {e}")
+            if client is not None:
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+            return None
+
+    async def refill(self) -> int:
+        """
+        Drop dead spares and top every API pair back up to per_pair warm spares
+
+        Returns:
+            Number of spares warmed
+        """
+        if self.per_pair <= 0:
+            return 0
+
+        from bot.api_pairs import load_api_pairs
+        from bot.session_inventory import get_session_inventory
+        from bot.session_manager import session_lock, get_held_sessions
+
+        pairs = load_api_pairs()
+        warmed = 0
+
+        async with self._get_refill_lock():
+            # Liveness: drop spares whose connection was lost
+            for pair_idx, spares in list(self._warm.items()):
+                dead = [s for s in spares if pair_idx >= len(pairs) or not s["client"].is_connected()]
+                for spare in dead:
+                    spares.remove(spare)
+                for spare in dead:
+                    await self._drop(spare)
+
+            candidates = self._pick_candidates()
+            for pair_idx, pair in enumerate(pairs):
+                spares = self._warm.setdefault(pair_idx, [])
+                while len(spares) < self.per_pair and candidates:
+                    session_file = candidates.pop(0)
+                    # May have been assigned (or held) while an earlier spare was warming
+                    with session_lock:
+                        record = get_session_inventory().get(session_file)
+                        if record is None or record["location"] != "unused" or session_file in self._reserved \
+                                or session_file in get_held_sessions():
+                            continue
+                        self._reserved.add(session_file)
+                    spare = await self._warm_one(session_file, pair_idx, pair)
+                    if spare is None:
+                        self._reserved.discard(session_file)
+                        continue
+                    spares.append(spare)
+                    warmed += 1
+                    self._metrics["warmed"] += 1
+
+        return warmed
+
+    async def _drop(self, spare: Dict[str, Any]) -> None:
+        self._metrics["dropped"] += 1
+        self._reserved.discard(spare["session"])
+        get_pair_telemetry().connection_closed(spare["api_id"])
+        try:
+            await spare["client"].disconnect()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Swap
+    # ------------------------------------------------------------------
+
+    async def acquire(self, preferred_api_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Take a warm spare (same API pair preferred, any pair otherwise)
+
+        Returns:
+            Spare dict with a connected "client", or None if the pool is empty (counted as a miss)
+        """
+        ordered = sorted(
+            self._warm.items(),
+            key=lambda item: 0 if item[1] and item[1][0]["api_id"] == preferred_api_id else 1
+        )
+        for _, spares in ordered:
+            while spares:
+                spare = spares.pop(0)
+                if spare["client"].is_connected():
+                    self._in_use[spare["session"]] = spare
+                    self._metrics["swaps"] += 1
+                    return spare
+                await self._drop(spare)
+
+        self._metrics["misses"] += 1
+        return None
+
+    def record_swap_latency(self, seconds: float) -> None:
+        """Time from ban detection to the spare's first send slot"""
+        self._metrics["swap_seconds_total"] += seconds
+
+    async def retire(self, spare: Dict[str, Any]) -> None:
+        """Disconnect a used spare (stays reserved until release())"""
+        get_pair_telemetry().connection_closed(spare["api_id"])
+        try:
+            await spare["client"].disconnect()
+        except Exception:
+            pass
+
+    def release(self, session_file: str) -> None:
+        """Forget a used spare once its file was assigned (or banned)"""
+        self._in_use.pop(session_file, None)
+        self._reserved.discard(session_file)
+
+    async def close(self) -> None:
+        """Disconnect every warm spare (shutdown)"""
+        spares = [spare for pair_spares in self._warm.values() for spare in pair_spares]
+        self._warm.clear()
+        for spare in spares:
+            await self._drop(spare)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Spare pool utilisation"""
+        warm_per_pair = {idx: len(spares) for idx, spares in self._warm.items()}
+        warm = sum(warm_per_pair.values())
+        in_use = len(self._in_use)
+        capacity = self.per_pair * len(warm_per_pair) if warm_per_pair else 0
+        ban_events = self._metrics["swaps"] + self._metrics["misses"]
+        return {
+            "enabled": self.per_pair > 0,
+            "per_pair": self.per_pair,
+            "warm": warm,
+            "warm_per_pair": warm_per_pair,
+            "in_use": in_use,
+            "fill_ratio": round(warm / capacity, 3) if capacity else 0.0,
+            "utilisation": round(in_use / (warm + in_use), 3) if (warm + in_use) else 0.0,
+            "swaps": self._metrics["swaps"],
+            "misses": self._metrics["misses"],
+            "hit_rate": round(self._metrics["swaps"] / ban_events, 3) if ban_events else None,
+            "avg_swap_seconds": (
+                round(self._metrics["swap_seconds_total"] / self._metrics["swaps"], 2)
+                if self._metrics["swaps"] else None
+            ),
+            "warmed": self._metrics["warmed"],
+            "warm_failures": self._metrics["warm_failures"],
+            "dropped": self._metrics["dropped"],
+        }
+
+
+# Global spare pool
+_spare_pool: Optional[SparePool] = None
+
+
+def get_spare_pool() -> SparePool:
+    """Get the global spare pool"""
+    global _spare_pool
+    if _spare_pool is None:
+        _spare_pool = SparePool()
+    return _spare_pool
+
+
+def get_reserved_spares() -> Set[str]:
+    """Sessions reserved by the spare pool (empty if the pool was never created)"""
+    if _spare_pool is None:
+        return set()
+    return _spare_pool.reserved_sessions()
+
+
+async def run_spare_pool(interval: int = SPARE_REFILL_INTERVAL) -> None:
+    """Keep the spare pool warm (runs for the process lifetime)"""
+    pool = get_spare_pool()
+    if pool.per_pair <= 0:
+        print("INFO: Spare session pool disabled (SPARE_CLIENTS_PER_PAIR=0)")
+        return
+
+    while True:
+        try:
+            warmed = await pool.refill()
+            if warmed:
+                print(f"INFO: Spare pool warmed {warmed} client(s): {pool.get_metrics()['warm_per_pair']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WARNING: Spare pool refill failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,197 @@
+"""
+State Versions - Per-user change versions for conditional / delta dashboard sync
+Every write to a user's record, stats or log bumps that user's version and remembers
+which field changed at which version, so /api/sync/state and /api/bot/state can answer
+If-None-Match with 304 and since=<version> with only the changed fields.
+
+Versions come from one process-wide counter seeded with the start time in microseconds:
+they increase monotonically per user, across users and across restarts. A since= older
+than this process (or older than the remembered log positions) gets a full response.
+
+users.json / stats.json edited outside data_manager are detected by their stat()
+signature and invalidate every user's record / stats.
+"""
+
+import time
+from collections import deque
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Dict, Any, Set, Tuple, Iterable
+
+# Log writes remembered per user (version -> byte range) for since= log deltas
+LOG_POSITIONS_KEPT = 64
+
+# Field marking every key of the user record as changed
+ALL_USER_FIELDS = "user"
+
+
+class StateVersions:
+    """
+    Per-user version counters and field change history (in-memory, thread-safe)
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.started_version = int(time.time() * 1_000_000)
+        self._counter = self.started_version
+        # {user_id: {"version": int, "fields": {field: version}, "logs": deque, "logs_evicted": bool}}
+        self._users: Dict[str, Dict[str, Any]] = {}
+        # Changes that apply to every user (external file edits): {field: version}
+        self._global_fields: Dict[str, int] = {}
+        # {path: (mtime_ns, size)} of the data files as data_manager last wrote them
+        self._file_signatures: Dict[Path, Tuple[int, int]] = {}
+        # Held by the log writer across append + bump, so a reader can take a
+        # (version, log size) pair that matches exactly
+        self.log_lock = Lock()
+
+    def _record(self, user_id: str) -> Dict[str, Any]:
+        record = self._users.get(user_id)
+        if record is None:
+            record = {"version": self.started_version, "fields": {}, "logs": deque(maxlen=LOG_POSITIONS_KEPT), "logs_evicted": False}
+            self._users[user_id] = record
+        return record
+
+    def bump(self, user_id: str, fields: Iterable[str], log: Optional[Tuple[str, int, int]] = None) -> int:
+        """
+        Record a change to a user's state
+
+        Args:
+            fields: Changed fields ("user.<key>", "stats", "logs", ...)
+            log: (date, start offset, end offset) of lines just appended to the user's log
+
+        Returns:
+            The user's new version
+        """
+        with self._lock:
+            self._counter += 1
+            version = self._counter
+            record = self._record(user_id)
+            record["version"] = version
+            for field in fields:
+                record["fields"][field] = version
+            if log is not None:
+                logs = record["logs"]
+                if len(logs) == logs.maxlen:
+                    record["logs_evicted"] = True
+                logs.append((version,) + tuple(log))
+            return version
+
+    def bump_all(self, fields: Iterable[str]) -> int:
+        """Record a change affecting every user (e.g. users.json edited by hand)"""
+        with self._lock:
+            self._counter += 1
+            for field in fields:
+                self._global_fields[field] = self._counter
+            return self._counter
+
+    def version(self, user_id: str) -> int:
+        """Current version of a user's state"""
+        with self._lock:
+            record = self._users.get(user_id)
+            version = record["version"] if record is not None else self.started_version
+            if self._global_fields:
+                version = max(version, max(self._global_fields.values()))
+            return version
+
+    def global_version(self, field: str) -> int:
+        """Version of the last change to `field` affecting every user (0 if none)"""
+        with self._lock:
+            return self._global_fields.get(field, 0)
+
+    def changed_since(self, user_id: str, since: int) -> Optional[Set[str]]:
+        """
+        Fields changed after version `since`
+
+        Returns:
+            Set of fields, or None if `since` predates what this process knows (send everything)
+        """
+        if since < self.started_version:
+            return None
+        with self._lock:
+            record = self._users.get(user_id)
+            fields = {f for f, v in record["fields"].items() if v > since} if record is not None else set()
+            fields.update(f for f, v in self._global_fields.items() if v > since)
+            return fields
+
+    def log_position(self, user_id: str, since: int) -> Optional[Tuple[str, int]]:
+        """
+        (date, byte offset) the user's log had reached at version `since`
+
+        Returns:
+            None if unknown (too old, or no writes remembered) - send the full tail
+        """
+        if since < self.started_version:
+            return None
+        with self._lock:
+            record = self._users.get(user_id)
+            if record is None or not record["logs"]:
+                return None
+            position = None
+            for version, date, start, end in record["logs"]:
+                if version > since:
+                    break
+                position = (date, end)
+            if position is None:
+                # since predates every remembered write: valid only if none was forgotten
+                if record["logs_evicted"]:
+                    return None
+                _, date, start, _ = record["logs"][0]
+                position = (date, start)
+            return position
+
+    def note_file_written(self, path: Path) -> None:
+        """Remember a data file's signature after data_manager wrote it"""
+        try:
+            stat = path.stat()
+        except OSError:
+            return
+        with self._lock:
+            self._file_signatures[path] = (stat.st_mtime_ns, stat.st_size)
+
+    def check_file(self, path: Path, field: str) -> None:
+        """Invalidate `field` for every user if the file changed outside data_manager"""
+        try:
+            stat = path.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = (0, 0)
+        with self._lock:
+            known = self._file_signatures.get(path)
+            if known == signature:
+                return
+            self._file_signatures[path] = signature
+            if known is None:
+                return  # First look at the file (startup) - nothing to invalidate yet
+            self._counter += 1
+            self._global_fields[field] = self._counter
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Tracked users and the current counter"""
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "version": self._counter,
+                "started_version": self.started_version,
+            }
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag from version parts"""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header lists `etag` (or *)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(c == etag or c == bare or c[2:] == bare for c in candidates)
+
+
+_state_versions = StateVersions()
+
+
+def get_state_versions() -> StateVersions:
+    """Get the global state versions"""
+    return _state_versions
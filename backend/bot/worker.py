@@ -6,12 +6,13 @@ With per-user concurrency limits (semaphore)
 
 import asyncio
 import random
+import time
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Callable
 from telethon import TelegramClient
 
 from bot.engine import execute_forwarding_cycle, parse_post_link, distribute_groups
-from bot.session_manager import get_session_path, ban_session, replace_banned_session
+from bot.session_manager import get_session_path, ban_session, replace_banned_session, assign_session_file
 from bot.api_pairs import load_api_pairs
 from bot.data_manager import get_user_data, update_user_stats, update_user_data, get_user_stats
 from bot.log_saver import get_user_logger
@@ -22,14 +23,22 @@ from bot.plan_config import (
     get_plan_timing_constraints
 )
 from bot.error_tracker import get_error_tracker
-from bot.group_file_manager import get_group_cache, get_groups_for_plan
+from bot.group_file_manager import get_group_cache, get_groups_for_plan, CycleGroupFeed
+from bot.cycle_timetable import planned_duration, start_cycle_progress, finish_cycle_progress
+from bot.group_health import get_group_health
+from bot.spare_pool import get_spare_pool
+from bot.pair_balancer import get_pair_telemetry
+from bot.log_stream import get_log_stream
+from bot.notifier import notify, NOTIFY_FAILURE_RATE, NOTIFY_FAILURE_RATE_MIN_ATTEMPTS
+from bot.fleet_metrics import get_fleet_metrics
 
 
 async def execute_user_cycle(
     user_id: str,
     is_running: Callable[[], bool],
     delay_between_cycles: int = 300,
-    user_semaphore: Optional[asyncio.Semaphore] = None
+    user_semaphore: Optional[asyncio.Semaphore] = None,
+    cancel_token=None
 ) -> Dict[str, Any]:
     """
     Execute one cycle for a user
@@ -41,6 +50,7 @@ async def execute_user_cycle(
         is_running: Callable to check if still running
         delay_between_cycles: Estimated delay between cycles (scheduler reference, not enforced)
         user_semaphore: Semaphore for concurrency control
+        cancel_token: CancellationToken for this run (interruptible sleeps)
     
     Returns: cycle stats
     
@@ -79,14 +89,13 @@ async def execute_user_cycle(
     if file_changed:
         logger.info(f"User {user_id}: Group file changed, will reload at cycle completion")
     
-    # Get groups from file (reload if file changed)
-    if execution_mode == "starter":
-        groups = group_cache.get_starter_groups(force_reload=file_changed)
-    else:
-        groups = group_cache.get_enterprise_groups(force_reload=file_changed)
+    # Get groups from file (reload if file changed) - shared snapshot, never copied per user
+    group_snapshot = group_cache.get_snapshot(plan_type, force_reload=file_changed)
+    groups = group_snapshot.groups
     
     # For backward compatibility, also check user_data groups (but file takes precedence)
     if not groups:
+        group_snapshot = None
         groups = user_data.get("groups", [])
         if groups:
             logger.warning(
@@ -94,6 +103,17 @@ async def execute_user_cycle(
                 f"using groups from user_data (legacy mode)"
             )
     
+    # Drop globally quarantined groups (gone / write-banned, confirmed by other sessions or users)
+    quarantined_count = 0
+    if groups and assigned_sessions:
+        sends_per_group = len(assigned_sessions) if execution_mode == "starter" else 1
+        groups, quarantined_count = get_group_health().filter_groups(groups, sends_per_group)
+        if quarantined_count:
+            logger.info(
+                f"User {user_id}: Skipping {quarantined_count} quarantined groups "
+                f"(group health index), {len(groups)} groups remain"
+            )
+    
     # Validate execution_mode
     if execution_mode not in ["starter", "enterprise"]:
         logger.error(f"User {user_id}: Invalid execution_mode: {execution_mode}")
@@ -124,10 +144,10 @@ async def execute_user_cycle(
             logger.error(f"User {user_id}: Starter mode requires at least one session")
             return {"error": "Starter mode requires at least one session", "success": 0, "failures": 0, "flood_waits": 0, "errors": ["Starter mode requires at least one session"], "banned_sessions": []}
         
-        # Calculate session runtime with plan-specific delay
+        # Calculate session runtime from the send timetable (N sends span N-1 intervals)
         total_cycle_seconds = total_cycle_minutes * 60
         per_session_offset = total_cycle_seconds / num_sessions
-        session_runtime = num_groups * delay_between_posts
+        session_runtime = planned_duration(num_groups, delay_between_posts)
         
         # Validate feasibility: session_runtime must be < per_session_offset
         if session_runtime >= per_session_offset:
@@ -167,8 +187,11 @@ async def execute_user_cycle(
     # Get error tracker for per-session error tracking
     error_tracker = get_error_tracker()
     
-    # Distribute groups based on execution mode
-    groups_distribution = distribute_groups(groups, num_sessions, execution_mode)
+    # Distribute groups based on execution mode (snapshot partitions are computed once per version)
+    if group_snapshot is not None and not quarantined_count:
+        groups_distribution = group_snapshot.partition(num_sessions, execution_mode)
+    else:
+        groups_distribution = distribute_groups(list(groups), num_sessions, execution_mode)
     
     # Log group distribution for clarity
     logger.info(
@@ -178,6 +201,11 @@ async def execute_user_cycle(
     for idx, session_groups in enumerate(groups_distribution):
         logger.info(f"  Session {idx + 1}: {len(session_groups)} groups")
     
+    # Plan file edits made during the cycle reach running sessions as diffs
+    group_feed = None
+    if group_snapshot is not None:
+        group_feed = CycleGroupFeed(plan_type, execution_mode, group_snapshot.version, group_cache)
+    
     # Calculate RANDOM start offsets for starter mode (each cycle gets new random offsets)
     cycle_start_time = asyncio.get_event_loop().time()
     session_start_offsets = []
@@ -196,13 +224,22 @@ async def execute_user_cycle(
                 f"offsets: {[f'{o/60:.2f}min' for o in session_start_offsets]}"
             )
     
+    # Live cycle progress / ETA (measured slack is against per_session_offset in starter mode)
+    slack_budget = (total_cycle_minutes * 60 / num_sessions) if execution_mode == "starter" else None
+    cycle_progress = start_cycle_progress(user_id, slack_budget=slack_budget)
+    
     cycle_stats = {
         "success": 0,
         "failures": 0,
         "flood_waits": 0,
         "errors": [],
-        "banned_sessions": []
+        "banned_sessions": [],
+        "late_sends": 0,
+        "moved_earlier": 0,
+        "position_gain": 0.0,
+        "spare_swaps": []
     }
+    weighted_gain = 0.0
     
     # Execute forwarding for each session
     tasks = []
@@ -237,8 +274,20 @@ async def execute_user_cycle(
         # Get current cycle number for this session
         cycle_number = error_tracker.get_current_cycle(session_filename)
         
-        # Create task for this session
-        task = execute_session_cycle(
+        if group_feed is not None:
+            # Slice of the partition this cycle uses (re-partitioned when quarantined groups were dropped)
+            group_feed.register_session(session_filename, assigned_groups)
+        
+        # Register expected sends so ETA covers sessions still waiting for their offset
+        cycle_progress.expect_session(
+            session_filename,
+            len(assigned_groups),
+            delay_between_posts,
+            start_at=cycle_progress.cycle_start_time + (start_offset or 0)
+        )
+        
+        # Create task for this session (a future, so finished results survive cancellation)
+        task = asyncio.ensure_future(execute_session_cycle(
             user_id,
             session_filename,
             str(session_path),
@@ -254,13 +303,25 @@ async def execute_user_cycle(
             start_offset,
             cycle_start_time,
             cycle_number,
-            error_tracker
-        )
+            error_tracker,
+            cycle_progress,
+            cancel_token,
+            group_feed
+        ))
         tasks.append(task)
     
     # Wait for all sessions to complete
     if tasks:
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Stopped: spares already swapped in by finished sessions will not be adopted
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    swap = task.result().get("spare_swap")
+                    if swap is not None:
+                        get_spare_pool().release(swap["replacement"])
+            raise
         
         for result in results:
             if isinstance(result, dict):
@@ -271,38 +332,61 @@ async def execute_user_cycle(
                     cycle_stats["errors"].extend(result["errors"])
                 if result.get("banned_sessions"):
                     cycle_stats["banned_sessions"].extend(result["banned_sessions"])
+                if result.get("spare_swap"):
+                    cycle_stats["spare_swaps"].append(result["spare_swap"])
+                if result.get("timetable"):
+                    cycle_stats["late_sends"] += result["timetable"].get("late_sends", 0)
+                if result.get("ordering"):
+                    cycle_stats["moved_earlier"] += result["ordering"].get("moved_earlier", 0)
+                    weighted_gain += result["ordering"].get("position_gain", 0.0) * result["ordering"].get("successes", 0)
             elif isinstance(result, Exception):
                 cycle_stats["failures"] += 1
                 cycle_stats["errors"].append(str(result))
     
+    finish_cycle_progress(user_id)
+    
+    if group_feed is not None:
+        feed_summary = group_feed.summary()
+        if feed_summary["added"] or feed_summary["removed"]:
+            logger.info(
+                f"User {user_id}: Group file edited mid-cycle (now v{feed_summary['version']}) - "
+                f"{feed_summary['added']} groups added, {feed_summary['removed']} removed in flight"
+            )
+    
+    # Success-probability ordering: average shift of successful deliveries toward cycle start
+    if cycle_stats["success"] > 0:
+        cycle_stats["position_gain"] = round(weighted_gain / cycle_stats["success"], 4)
+        logger.info(
+            f"User {user_id}: Cycle summary - {cycle_stats['success']} delivered, "
+            f"{cycle_stats['moved_earlier']} moved earlier by ordering "
+            f"(avg gain {cycle_stats['position_gain']:.0%} of cycle), "
+            f"{cycle_stats['late_sends']} late sends"
+        )
+    
+    # Outbound alerts for the cycle (coalesced per user by the notifier)
+    attempts = cycle_stats["success"] + cycle_stats["failures"]
+    if cycle_stats["flood_waits"]:
+        notify(
+            "flood_wait",
+            f"User {user_id}: {cycle_stats['flood_waits']} flood waits this cycle",
+            key=user_id, user_id=user_id, flood_waits=cycle_stats["flood_waits"]
+        )
+    if attempts >= NOTIFY_FAILURE_RATE_MIN_ATTEMPTS and cycle_stats["failures"] / attempts >= NOTIFY_FAILURE_RATE:
+        notify(
+            "high_failure_rate",
+            f"User {user_id}: {cycle_stats['failures']}/{attempts} sends failed this cycle",
+            key=user_id, user_id=user_id, failures=cycle_stats["failures"], attempts=attempts
+        )
+    
     # Handle banned sessions (automatic replacement)
-    if cycle_stats["banned_sessions"]:
-        for banned_session in cycle_stats["banned_sessions"]:
-            # Move to banned directory
-            ban_session(banned_session)
-            
-            # Remove from user's assigned sessions
-            user_data = get_user_data(user_id)
-            assigned_sessions = user_data.get("assigned_sessions", [])
-            if banned_session in assigned_sessions:
-                assigned_sessions.remove(banned_session)
-                banned_list = user_data.get("banned_sessions", [])
-                if banned_session not in banned_list:
-                    banned_list.append(banned_session)
-                
-                update_user_data(user_id, {
-                    "assigned_sessions": assigned_sessions,
-                    "banned_sessions": banned_list
-                })
-            
-            # Attempt replacement
-            replacement = replace_banned_session(user_id, banned_session)
-            if replacement:
-                assigned_sessions.append(replacement)
-                update_user_data(user_id, {"assigned_sessions": assigned_sessions})
-                logger.info(f"Replaced banned session {banned_session} with {replacement}")
-            else:
-                logger.warning(f"No replacement available for banned session {banned_session}")
+    # Sessions already replaced mid-cycle by a hot spare keep that spare
+    spare_swaps = {swap["banned"]: swap for swap in cycle_stats["spare_swaps"]}
+    try:
+        _handle_banned_sessions(user_id, cycle_stats["banned_sessions"], spare_swaps, logger)
+    finally:
+        # Swaps not adopted (e.g. a ban handling error) give their reservation back
+        for swap in spare_swaps.values():
+            get_spare_pool().release(swap["replacement"])
     
     # Update stats
     stats = get_user_stats(user_id)
@@ -313,6 +397,14 @@ async def execute_user_cycle(
     stats["total_messages_sent"] = stats.get("total_messages_sent", 0) + cycle_stats["success"]
     
     update_user_stats(user_id, stats)
+    fleet_metrics = get_fleet_metrics()
+    fleet_metrics.record_cycle(user_id)
+    if cycle_stats["errors"]:
+        fleet_metrics.record_error("Cycle completed with errors", user_id)
+    get_log_stream().publish(user_id, "stats", {
+        "cycle": {key: cycle_stats[key] for key in ("success", "failures", "flood_waits")},
+        "totals": {key: value for key, value in stats.items() if key.startswith("total_")},
+    })
     
     # Reload groups from file at cycle completion (if file changed)
     # This ensures file changes are applied at the next cycle start
@@ -320,10 +412,7 @@ async def execute_user_cycle(
     plan_type = "STARTER" if execution_mode == "starter" else "ENTERPRISE"
     if group_cache.check_file_changed(plan_type):
         logger.info(f"User {user_id}: Reloading groups from file after cycle completion")
-        if execution_mode == "starter":
-            group_cache.get_starter_groups(force_reload=True)
-        else:
-            group_cache.get_enterprise_groups(force_reload=True)
+        group_cache.get_snapshot(plan_type, force_reload=True)
     
     # Emit heartbeat: cycle completed
     emit_heartbeat(user_id, cycle_state="idle")
@@ -331,6 +420,71 @@ async def execute_user_cycle(
     return cycle_stats
 
 
+def _handle_banned_sessions(user_id: str, banned_sessions: List[str], spare_swaps: Dict[str, Dict[str, Any]], logger) -> None:
+    """
+    Ban, unassign and replace sessions banned this cycle
+    Adopted hot spares are popped from spare_swaps
+    """
+    for banned_session in dict.fromkeys(banned_sessions):
+        # Move to banned directory
+        ban_session(banned_session)
+        notify(
+            "session_banned",
+            f"Session {banned_session} of user {user_id} banned",
+            severity="critical", key=banned_session, user_id=user_id, session=banned_session
+        )
+        
+        # Remove from user's assigned sessions
+        user_data = get_user_data(user_id)
+        assigned_sessions = user_data.get("assigned_sessions", [])
+        if banned_session in assigned_sessions:
+            assigned_sessions.remove(banned_session)
+            banned_list = user_data.get("banned_sessions", [])
+            if banned_session not in banned_list:
+                banned_list.append(banned_session)
+            
+            update_user_data(user_id, {
+                "assigned_sessions": assigned_sessions,
+                "banned_sessions": banned_list
+            })
+        
+        # Attempt replacement (hot spare used this cycle first, then the unused pool)
+        replacement = _adopt_spare(user_id, spare_swaps.pop(banned_session, None), logger)
+        if replacement is None:
+            replacement = replace_banned_session(user_id, banned_session)
+        if replacement:
+            assigned_sessions.append(replacement)
+            update_user_data(user_id, {"assigned_sessions": assigned_sessions})
+            logger.info(f"Replaced banned session {banned_session} with {replacement}")
+        else:
+            logger.warning(f"No replacement available for banned session {banned_session}")
+            notify(
+                "no_replacement",
+                f"No replacement session for user {user_id} (banned {banned_session}) - unused pool empty",
+                severity="critical", key=user_id, user_id=user_id, session=banned_session
+            )
+
+
+def _adopt_spare(user_id: str, swap: Optional[Dict[str, Any]], logger) -> Optional[str]:
+    """Assign the spare that took over a banned session this cycle. Returns its filename"""
+    if swap is None:
+        return None
+    
+    spare_session = swap["replacement"]
+    spare_pool = get_spare_pool()
+    try:
+        if swap["replacement_banned"]:
+            ban_session(spare_session)
+            logger.warning(f"Hot spare {spare_session} was banned too - not assigning it")
+            return None
+        if assign_session_file(user_id, spare_session, allow_reserved=True) is None:
+            logger.warning(f"Hot spare {spare_session} is no longer in the unused pool")
+            return None
+        return spare_session
+    finally:
+        spare_pool.release(spare_session)
+
+
 async def execute_session_cycle(
     user_id: str,
     session_filename: str,
@@ -347,7 +501,10 @@ async def execute_session_cycle(
     start_offset: Optional[float] = None,
     cycle_start_time: Optional[float] = None,
     cycle_number: int = 0,
-    error_tracker=None
+    error_tracker=None,
+    cycle_progress=None,
+    cancel_token=None,
+    group_feed=None
 ) -> Dict[str, Any]:
     """
     Execute forwarding cycle for a single session
@@ -359,6 +516,9 @@ async def execute_session_cycle(
         cycle_start_time: Absolute cycle start time (for alignment)
         cycle_number: Current cycle number for this session
         error_tracker: ErrorTracker instance for per-session error tracking
+        cycle_progress: CycleProgress for the user's cycle (live progress / ETA)
+        cancel_token: CancellationToken for this run (stop wakes offset waits immediately)
+        group_feed: CycleGroupFeed for the user's cycle (plan file edits applied in flight)
     """
     from bot.error_tracker import get_error_tracker
     
@@ -384,15 +544,30 @@ async def execute_session_cycle(
                         f"Session {session_filename}: Starter mode RANDOM offset (cycle #{cycle_number}) - "
                         f"waiting {wait_time/60:.2f} minutes before starting"
                     )
-                    await asyncio.sleep(wait_time)
+                    if cancel_token is not None:
+                        await cancel_token.sleep(wait_time)
+                    else:
+                        await asyncio.sleep(wait_time)
+        
+        # Stopped while waiting for the offset - don't connect at all
+        if not is_running():
+            if cycle_progress is not None:
+                cycle_progress.discard_session(session_filename)
+            return {"success": 0, "failures": 0, "flood_waits": 0, "errors": [], "banned_sessions": [], "skipped_groups": 0}
         
         client = TelegramClient(str(session_path), api_id, api_hash)
+        pair_telemetry = get_pair_telemetry()
+        connected = False
         
         try:
             await client.connect()
+            pair_telemetry.connection_opened(api_id)
+            connected = True
             
             if not await client.is_user_authorized():
                 logger.error(f"Session {session_filename} not authorized")
+                if cycle_progress is not None:
+                    cycle_progress.discard_session(session_filename)
                 return {"success": 0, "failures": 0, "flood_waits": 0, "errors": ["Session not authorized"], "banned_sessions": [], "skipped_groups": 0}
             
             # Execute forwarding cycle with plan-specific behavior
@@ -406,7 +581,11 @@ async def execute_session_cycle(
                 is_running,
                 execution_mode,
                 cycle_number,
-                error_tracker
+                error_tracker,
+                cycle_progress=cycle_progress,
+                cancel_token=cancel_token,
+                group_feed=group_feed,
+                user_id=user_id
             )
             
             # Increment cycle number after completion
@@ -420,21 +599,146 @@ async def execute_session_cycle(
                         banned_sessions.append(session_filename)
             
             stats["banned_sessions"] = banned_sessions
-            return stats
+            result = stats
             
         except Exception as e:
             logger.error(f"Error in session {session_filename} cycle #{cycle_number}: {e}")
+            if cycle_progress is not None:
+                cycle_progress.discard_session(session_filename)
             banned_sessions = []
+            result = {"success": 0, "failures": 0, "flood_waits": 0, "errors": [str(e)], "banned_sessions": banned_sessions, "skipped_groups": 0}
             if "banned" in str(e).lower():
                 banned_sessions.append(session_filename)
-            return {"success": 0, "failures": 0, "flood_waits": 0, "errors": [str(e)], "banned_sessions": banned_sessions, "skipped_groups": 0}
+                result["remaining_groups"] = list(assigned_groups)
         finally:
+            if connected:
+                pair_telemetry.connection_closed(api_id)
             try:
                 if client.is_connected():
                     await client.disconnect()
             except:
                 pass
+        
+        # Banned mid-cycle: a warm spare continues the remaining groups right away
+        remaining_groups = result.pop("remaining_groups", None)
+        if result["banned_sessions"] and remaining_groups and is_running():
+            swap = await continue_with_spare(
+                session_filename,
+                api_id,
+                post_link,
+                remaining_groups,
+                delay_between_posts,
+                logger,
+                is_running,
+                execution_mode,
+                error_tracker,
+                cycle_progress,
+                cancel_token,
+                group_feed,
+                user_id
+            )
+            if swap is not None:
+                spare_stats = swap.pop("stats")
+                result["success"] += spare_stats.get("success", 0)
+                result["failures"] += spare_stats.get("failures", 0)
+                result["flood_waits"] += spare_stats.get("flood_waits", 0)
+                result["errors"].extend(spare_stats.get("errors", []))
+                result["spare_swap"] = swap
+        
+        return result
     finally:
         # Release semaphore
         if user_semaphore:
             user_semaphore.release()
+
+
+async def continue_with_spare(
+    banned_session: str,
+    api_id: int,
+    post_link: str,
+    remaining_groups: List[str],
+    delay_between_posts: float,
+    logger,
+    is_running: Callable[[], bool],
+    execution_mode: str = "enterprise",
+    error_tracker=None,
+    cycle_progress=None,
+    cancel_token=None,
+    group_feed=None,
+    user_id: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Continue a banned session's remaining groups with a warm spare client
+    The spare's file stays in sessions/unused (reserved) until execute_user_cycle
+    assigns it to the user in place of the banned session
+    
+    Returns:
+        {"banned": ..., "replacement": ..., "replacement_banned": bool, "groups": n,
+         "swap_seconds": s, "stats": spare cycle stats}, or None if no spare was warm
+    """
+    if error_tracker is None:
+        error_tracker = get_error_tracker()
+    
+    spare_pool = get_spare_pool()
+    if spare_pool.per_pair <= 0:
+        return None
+    
+    swap_started = time.monotonic()
+    spare = await spare_pool.acquire(preferred_api_id=api_id)
+    if spare is None:
+        logger.warning(f"Session {banned_session} banned mid-cycle - no warm spare available, {len(remaining_groups)} groups wait for next cycle")
+        return None
+    
+    spare_session = spare["session"]
+    swap_seconds = time.monotonic() - swap_started
+    spare_pool.record_swap_latency(swap_seconds)
+    logger.info(
+        f"Session {banned_session} banned mid-cycle - hot spare {spare_session} continues "
+        f"{len(remaining_groups)} remaining groups (swap {swap_seconds:.2f}s)"
+    )
+    
+    if group_feed is not None:
+        group_feed.transfer_session(banned_session, spare_session)
+    
+    cycle_number = error_tracker.get_current_cycle(spare_session)
+    try:
+        try:
+            stats = await execute_forwarding_cycle(
+                spare["client"],
+                spare_session,
+                post_link,
+                remaining_groups,
+                delay_between_posts,
+                logger,
+                is_running,
+                execution_mode,
+                cycle_number,
+                error_tracker,
+                cycle_progress=cycle_progress,
+                cancel_token=cancel_token,
+                group_feed=group_feed,
+                user_id=user_id
+            )
+            error_tracker.increment_cycle(spare_session)
+        except Exception as e:
+            # Still report the swap: the original session's ban must be recorded and a
+            # banned spare banned instead of assigned
+            logger.error(f"Hot spare {spare_session} failed continuing {banned_session}: {e}")
+            if cycle_progress is not None:
+                cycle_progress.discard_session(spare_session)
+            stats = {"success": 0, "failures": 0, "flood_waits": 0, "errors": [str(e)]}
+        finally:
+            await spare_pool.retire(spare)
+    except BaseException:
+        # Cancelled (stop / plan expiry): nobody will adopt the spare
+        spare_pool.release(spare_session)
+        raise
+    
+    return {
+        "banned": banned_session,
+        "replacement": spare_session,
+        "replacement_banned": any("banned" in str(error).lower() for error in stats.get("errors", [])),
+        "groups": len(remaining_groups),
+        "swap_seconds": round(swap_seconds, 3),
+        "stats": stats
+    }
@@ -36,7 +36,15 @@ from api.health import router as health_router
 from api.admin_sessions import router as admin_sessions_router
 from api.admin_api_pairs import router as admin_api_pairs_router
 from api.admin_groups import router as admin_groups_router
+from api.admin_events import router as admin_events_router
 from bot.scheduler import start_scheduler, stop_scheduler
+from bot.session_inventory import get_session_inventory, run_inventory_reconciler
+from bot.session_validator import run_pool_validator
+from bot.spare_pool import get_spare_pool, run_spare_pool
+from bot.group_metadata import get_group_metadata
+from bot.log_saver import get_log_writer, run_log_maintenance
+from bot.event_log import get_event_log
+from bot.notifier import get_notifier, run_notifier
 
 
 app = FastAPI(
@@ -65,6 +73,7 @@ app.include_router(health_router, prefix="/api/health", tags=["Health"])
 app.include_router(admin_sessions_router, prefix="/api/admin/sessions", tags=["Admin - Sessions"])
 app.include_router(admin_api_pairs_router, prefix="/api/admin/api-pairs", tags=["Admin - API Pairs"])
 app.include_router(admin_groups_router, prefix="/api/admin/groups", tags=["Admin - Groups"])
+app.include_router(admin_events_router, prefix="/api/admin/events", tags=["Admin - Events"])
 
 
 @app.on_event("startup")
@@ -93,6 +102,22 @@ async def startup():
         save_users(users)
         print(f"INFO: Backend restart - reset {bots_reset} bot(s) to stopped state")
     
+    # Build the in-memory session inventory once, then keep it in sync with disk
+    print(f"INFO: Session inventory loaded: {get_session_inventory().counts()}")
+    asyncio.create_task(run_inventory_reconciler())
+    
+    # Pre-validate the unused pool in the background so assignment only hands out working sessions
+    asyncio.create_task(run_pool_validator())
+    
+    # Keep warm spare clients per API pair for instant mid-cycle ban replacement
+    asyncio.create_task(run_spare_pool())
+    
+    # Gzip past days' user logs and expire old ones
+    asyncio.create_task(run_log_maintenance())
+    
+    # Deliver outbound alerts (bans, flood waits, failed cycles) in batches
+    asyncio.create_task(run_notifier())
+    
     # Start scheduler with clean slate (no active bots)
     delay_between_cycles = int(os.getenv("DELAY_BETWEEN_CYCLES", "300"))
     asyncio.create_task(start_scheduler(delay_between_cycles))
@@ -102,6 +127,11 @@ async def startup():
 async def shutdown():
     """Stop scheduler on shutdown"""
     await stop_scheduler()
+    await get_spare_pool().close()
+    get_group_metadata().checkpoint()
+    get_log_writer().stop()
+    get_event_log().stop()
+    await get_notifier().close()
 
 
 @app.get("/")